@@ -1,12 +1,29 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from datetime import date, datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional
+import asyncio
+import csv
+import hashlib
+import hmac
+import io
+import json
 import os
 from dotenv import load_dotenv
-from services.sheets_service import GoogleSheetsService
+from services.storage import create_storage_service
 from services.ai_service import AIAnalysisService
-from models.schemas import Habit, HabitEntry, TelegramUser, UserStats, AIInsight
+from services.data_context import UserDataContext
+from services.async_service import AsyncStorageService, AsyncAIService
+from services.change_broker import ChangeBroker
+from utils.config import (
+    DEFAULT_STORAGE_MAX_WORKERS, DEFAULT_AI_MAX_WORKERS, DEFAULT_PUSH_DEBOUNCE,
+    DEFAULT_PUSH_HEARTBEAT_INTERVAL, DEFAULT_PUSH_VERSION_CHECK_INTERVAL, MAX_ENTRIES_PER_REQUEST,
+    MAX_STATS_DAYS, SHEET_HEADERS
+)
+from models.schemas import Habit, HabitAnalytics, HabitEntry, TelegramUser, UserStats, AIInsight
 
 load_dotenv()
 
@@ -23,15 +40,56 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
-# Servicios
-sheets_service = GoogleSheetsService(
-    credentials_file=os.getenv("GOOGLE_SHEETS_CREDENTIALS_FILE"),
-    spreadsheet_id=os.getenv("SPREADSHEET_ID")
+# Servicios (STORAGE_BACKEND elige Google Sheets o SQLite)
+storage_service = create_storage_service()
+
+ai_service = AIAnalysisService(os.getenv("GEMINI_API_KEY"), shared_cache=storage_service.shared_cache)
+storage_service.add_change_listener(ai_service.insight_cache.on_storage_change)
+
+# Variantes async: gspread y Gemini bloquean, así que se ejecutan en pools
+# acotados y separados para que un /insights lento no frene al resto
+async_storage = AsyncStorageService(
+    storage_service,
+    max_workers=int(os.getenv("STORAGE_MAX_WORKERS", DEFAULT_STORAGE_MAX_WORKERS))
+)
+async_ai = AsyncAIService(
+    ai_service,
+    max_workers=int(os.getenv("AI_MAX_WORKERS", DEFAULT_AI_MAX_WORKERS))
 )
 
-ai_service = AIAnalysisService(os.getenv("GEMINI_API_KEY"))
+# Avisos en vivo al dashboard: cada escritura llega a los clientes suscritos
+change_broker = ChangeBroker(
+    storage_service.get_data_version,
+    poll_interval=float(os.getenv("PUSH_VERSION_CHECK_INTERVAL", DEFAULT_PUSH_VERSION_CHECK_INTERVAL))
+)
+storage_service.add_change_listener(change_broker.on_storage_change)
+# Insights del modelo generados en segundo plano (motor hybrid)
+ai_service.enrichment_listeners.append(
+    lambda user_id: change_broker.on_storage_change(user_id, "insights")
+)
+PUSH_HEARTBEAT_INTERVAL = float(os.getenv("PUSH_HEARTBEAT_INTERVAL", DEFAULT_PUSH_HEARTBEAT_INTERVAL))
+PUSH_DEBOUNCE = float(os.getenv("PUSH_DEBOUNCE", DEFAULT_PUSH_DEBOUNCE))
+# Exportar las entradas de todos los usuarios exige este token (sin él, desactivado)
+EXPORT_ADMIN_TOKEN = os.getenv("EXPORT_ADMIN_TOKEN", "")
+
+
+@app.on_event("startup")
+async def startup():
+    """Arrancar los servicios que necesitan el bucle de eventos"""
+    await change_broker.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Liberar recursos de los servicios"""
+    await change_broker.stop()
+    async_ai.shutdown()
+    ai_service.shutdown()
+    async_storage.shutdown()
+    storage_service.close()
 
 
 # Modelos de request/response
@@ -48,6 +106,7 @@ class TrackHabitRequest(BaseModel):
     completed: bool
     notes: Optional[str] = None
     rating: Optional[int] = None
+    wait_for_durability: bool = False  # Esperar a que la entrada quede guardada
 
 
 class UserResponse(BaseModel):
@@ -56,6 +115,42 @@ class UserResponse(BaseModel):
     last_activity: str
 
 
+# Peticiones condicionales
+async def _etag(user_id: str, *parts: Any) -> Optional[str]:
+    """ETag de una respuesta según la versión de los datos del usuario
+
+    Incluye el día: las ventanas de "últimos N días" y las rachas cambian
+    con la fecha aunque no haya escrituras. La versión puede leerse de la
+    base de datos, así que se lee fuera del event loop.
+    """
+    version = await async_storage.run(storage_service.get_data_version, user_id)
+    if version is None:
+        return None
+    key = ":".join(str(part) for part in (user_id, version, date.today().isoformat()) + parts)
+    return f'W/"{hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]}"'
+
+
+async def _not_modified(request: Request, response: Response, user_id: str, *parts: Any) -> Optional[Response]:
+    """Respuesta 304 si el cliente ya tiene la versión vigente
+
+    Se comprueba antes de leer nada del almacenamiento, así que un sondeo
+    sin cambios no descarga ni serializa datos. Si hay que responder, deja
+    la ETag puesta en la respuesta.
+    """
+    etag = await _etag(user_id, *parts)
+    if etag is None:
+        return None
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    
+    # Comparación débil: W/"x" y "x" son la misma versión
+    candidates = [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]
+    opaque = [tag[2:] if tag.startswith("W/") else tag for tag in candidates]
+    if "*" in candidates or etag[2:] in opaque:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
 # Endpoints
 
 @app.get("/")
@@ -74,11 +169,26 @@ async def health_check():
     return {"status": "healthy", "timestamp": "2024-01-01T00:00:00Z"}
 
 
+@app.get("/metrics/ai")
+async def get_ai_metrics():
+    """Tokens por llamada, eventos del cliente del modelo y estado del circuito"""
+    return dict(ai_service.metrics.snapshot(), client=ai_service.client.snapshot())
+
+
+@app.get("/metrics/sheets")
+async def get_sheets_metrics():
+    """Cola de llamadas a Google Sheets: esperando por tipo y prioridad, 429 y pausas"""
+    quota = getattr(storage_service, "quota", None)
+    if quota is None:
+        return {"enabled": False}
+    return dict(quota.snapshot(), enabled=True)
+
+
 @app.post("/users", response_model=dict)
 async def create_user(user: TelegramUser):
     """Crear un nuevo usuario"""
     try:
-        success = sheets_service.create_user(user)
+        success = await async_storage.create_user(user)
         if success:
             return {"message": "Usuario creado exitosamente", "user_id": user.user_id}
         else:
@@ -98,7 +208,7 @@ async def create_habit(request: CreateHabitRequest):
             user_id=request.user_id
         )
         
-        success = sheets_service.create_habit(habit)
+        success = await async_storage.create_habit(habit)
         if success:
             return {"message": "Hábito creado exitosamente", "habit_name": habit.name}
         else:
@@ -108,10 +218,14 @@ async def create_habit(request: CreateHabitRequest):
 
 
 @app.get("/habits/{user_id}", response_model=List[dict])
-async def get_user_habits(user_id: str):
+async def get_user_habits(user_id: str, request: Request, response: Response):
     """Obtener hábitos de un usuario"""
+    not_modified = await _not_modified(request, response, user_id, "habits")
+    if not_modified:
+        return not_modified
+    
     try:
-        habits = sheets_service.get_user_habits(user_id)
+        habits = await async_storage.get_user_habits(user_id)
         return habits
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -129,12 +243,15 @@ async def track_habit(request: TrackHabitRequest):
             rating=request.rating
         )
         
-        success = sheets_service.add_habit_entry(entry)
+        success = await async_storage.add_habit_entry(
+            entry, wait=request.wait_for_durability
+        )
         if success:
             return {
                 "message": "Progreso registrado exitosamente",
                 "habit_name": entry.habit_name,
-                "completed": entry.completed
+                "completed": entry.completed,
+                "durable": request.wait_for_durability
             }
         else:
             raise HTTPException(status_code=400, detail="Error registrando progreso")
@@ -143,30 +260,140 @@ async def track_habit(request: TrackHabitRequest):
 
 
 @app.get("/stats/{user_id}", response_model=UserStats)
-async def get_user_stats(user_id: str):
+async def get_user_stats(user_id: str, request: Request, response: Response):
     """Obtener estadísticas de un usuario"""
+    not_modified = await _not_modified(request, response, user_id, "stats")
+    if not_modified:
+        return not_modified
+    
     try:
-        stats = sheets_service.get_user_stats(user_id)
+        stats = await async_storage.get_user_stats(user_id)
         return stats
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/analytics/{user_id}", response_model=HabitAnalytics)
+async def get_user_analytics(user_id: str, days: int = 30):
+    """Obtener tasas por día y por hábito, tasas recientes y rachas"""
+    try:
+        days = max(1, min(days, MAX_STATS_DAYS))
+        return await async_storage.get_user_analytics(user_id, days)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/entries/{user_id}", response_model=List[dict])
-async def get_user_entries(user_id: str, days: int = 30):
-    """Obtener entradas de un usuario"""
+async def get_user_entries(
+    user_id: str,
+    request: Request,
+    response: Response,
+    days: int = Query(30, ge=1, le=MAX_STATS_DAYS),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    habit: Optional[str] = None,
+    limit: int = Query(MAX_ENTRIES_PER_REQUEST, ge=1, le=MAX_ENTRIES_PER_REQUEST),
+    cursor: Optional[str] = None
+):
+    """Obtener entradas de un usuario por páginas, ordenadas por fecha
+
+    Sin since se usan los últimos `days` días. Si hay más entradas, el
+    cursor de la página siguiente va en la cabecera X-Next-Cursor.
+    """
+    # Cada página y cada filtro es una respuesta distinta
+    etag_parts = ("entries", days, since, until, habit, limit, cursor)
+    
+    # Las fechas de las hojas no tienen zona horaria
+    since = since.replace(tzinfo=None) if since else datetime.now() - timedelta(days=days)
+    until = until.replace(tzinfo=None) if until else None
+    if (until or datetime.now()) - since > timedelta(days=MAX_STATS_DAYS):
+        raise HTTPException(
+            status_code=400,
+            detail=f"El rango de fechas no puede superar {MAX_STATS_DAYS} días"
+        )
+    
+    not_modified = await _not_modified(request, response, user_id, *etag_parts)
+    if not_modified:
+        return not_modified
+    
     try:
-        entries = sheets_service.get_user_entries(user_id, days)
-        return entries
+        entries, next_cursor = await async_storage.get_user_entries_page(
+            user_id, since, until, habit, limit, cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return entries
+
+
+# Exportación de entradas
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _format_entries(entries: List[Dict[str, Any]], export_format: str) -> str:
+    """Serializar un bloque de entradas como NDJSON o filas CSV"""
+    if export_format == "ndjson":
+        return "".join(json.dumps(entry, ensure_ascii=False, default=str) + "\n" for entry in entries)
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    headers = SHEET_HEADERS["entries"]
+    for entry in entries:
+        writer.writerow([entry.get(header, "") for header in headers])
+    return buffer.getvalue()
+
+
+async def _stream_entries(user_id: Optional[str], export_format: str) -> AsyncIterator[str]:
+    """Leer las entradas por bloques en el pool de almacenamiento y emitirlas"""
+    if export_format == "csv":
+        yield ",".join(SHEET_HEADERS["entries"]) + "\r\n"
+    
+    chunks = storage_service.iter_entries(user_id)
+    while True:
+        chunk = await async_storage.run(next, chunks, None)
+        if chunk is None:
+            break
+        yield _format_entries(chunk, export_format)
+
+
+@app.get("/export/entries")
+async def export_entries(
+    user_id: Optional[str] = None,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Exportar las entradas de un usuario (o de todos) como NDJSON o CSV en streaming
+
+    Sin user_id se exportan todos los usuarios: solo con EXPORT_ADMIN_TOKEN
+    configurado y la cabecera X-Admin-Token con ese valor.
+    """
+    if user_id is None:
+        if not EXPORT_ADMIN_TOKEN:
+            raise HTTPException(status_code=400, detail="Indica el user_id a exportar")
+        if not x_admin_token or not hmac.compare_digest(x_admin_token, EXPORT_ADMIN_TOKEN):
+            raise HTTPException(status_code=403, detail="Token de administración no válido")
+    
+    filename = f"entries-{user_id or 'all'}.{format}"
+    return StreamingResponse(
+        _stream_entries(user_id, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 
 @app.get("/insights/{user_id}", response_model=List[AIInsight])
 async def get_user_insights(user_id: str):
     """Obtener insights personalizados con IA"""
     try:
-        insights = ai_service.generate_insights(user_id, sheets_service)
+        # Si el dashboard ya los está generando, esperar a ese resultado
+        pending = _pending_insights.get(user_id)
+        if pending:
+            await asyncio.shield(pending)
+        insights = await async_ai.generate_insights(user_id, storage_service)
         return insights
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -176,10 +403,10 @@ async def get_user_insights(user_id: str):
 async def get_habit_recommendations(user_id: str):
     """Obtener recomendaciones de nuevos hábitos"""
     try:
-        habits = sheets_service.get_user_habits(user_id)
+        habits = await async_storage.get_user_habits(user_id)
         habit_names = [h['name'] for h in habits]
         
-        recommendation = ai_service.get_habit_recommendation(habit_names)
+        recommendation = await async_ai.get_habit_recommendation(habit_names)
         
         return {
             "user_id": user_id,
@@ -191,27 +418,161 @@ async def get_habit_recommendations(user_id: str):
 
 
 # Endpoint para dashboard web
+
+# Insights que se generan en segundo plano por un dashboard con insights=pending
+_pending_insights: Dict[str, asyncio.Task] = {}
+
+
+async def _load_dashboard_data(context: UserDataContext):
+    """Hábitos, entradas, estadísticas y analíticas en paralelo
+
+    El contexto hace que cada hoja se descargue una sola vez aunque varias
+    partes la necesiten a la vez.
+    """
+    return await asyncio.gather(
+        async_storage.run(context.habits),
+        async_storage.run(context.entries, 30),
+        async_storage.run(context.stats),
+        async_storage.run(storage_service.get_user_analytics, context.user_id, context=context)
+    )
+
+
+async def _generate_insights_later(user_id: str, context: UserDataContext):
+    """Generar los insights y avisar a los clientes suscritos cuando estén"""
+    try:
+        await async_ai.generate_insights(user_id, storage_service, context=context)
+        change_broker.publish(user_id, ("insights",))
+    except Exception as e:
+        print(f"Error generando insights en segundo plano: {e}")
+    finally:
+        _pending_insights.pop(user_id, None)
+
+
 @app.get("/dashboard/{user_id}")
-async def get_dashboard_data(user_id: str):
-    """Obtener todos los datos para el dashboard"""
+async def get_dashboard_data(
+    user_id: str,
+    request: Request,
+    response: Response,
+    insights: str = Query("wait", pattern="^(wait|pending)$")
+):
+    """Obtener todos los datos para el dashboard
+
+    Con insights=pending no se espera al modelo: si los insights no están ya
+    en caché se devuelven vacíos con insights_status "pending" y se generan
+    en segundo plano. Llegan después por /events o con GET /insights.
+
+    La ETag solo se envía si los insights salen de la caché o del almacén:
+    los de las reglas o los de error no se revalidan como definitivos.
+    """
+    not_modified = await _not_modified(request, response, user_id, "dashboard", insights)
+    if not_modified:
+        return not_modified
+    
     try:
-        habits = sheets_service.get_user_habits(user_id)
-        entries = sheets_service.get_user_entries(user_id, days=30)
-        stats = sheets_service.get_user_stats(user_id)
-        insights = ai_service.generate_insights(user_id, sheets_service)
+        # Cada hoja se descarga una sola vez y se comparte con la IA
+        context = UserDataContext(storage_service, user_id)
+        user_insights = await async_storage.run(
+            ai_service.get_generated_insights, user_id, storage_service, context=context
+        )
+        generated = user_insights is not None
+        if generated or insights == "pending" and ai_service.engine == "llm":
+            habits, entries, stats, analytics = await _load_dashboard_data(context)
+            if not generated and user_id not in _pending_insights:
+                _pending_insights[user_id] = asyncio.create_task(
+                    _generate_insights_later(user_id, context)
+                )
+        else:
+            # Con los motores rules y hybrid generate_insights nunca espera al modelo
+            (habits, entries, stats, analytics), user_insights = await asyncio.gather(
+                _load_dashboard_data(context),
+                async_ai.generate_insights(user_id, storage_service, context=context)
+            )
+        
+        # En hybrid, insights de las reglas mientras el modelo genera los suyos
+        pending = user_insights is None or ai_service.is_enriching(user_id)
+        if not generated and "etag" in response.headers:
+            # Reglas, error o pendientes: que el cliente no la revalide como definitiva
+            del response.headers["etag"]
         
         return {
             "user_id": user_id,
             "habits": habits,
             "entries": entries,
             "stats": stats,
-            "insights": insights,
+            "analytics": analytics,
+            "insights": user_insights or [],
+            "insights_status": "pending" if pending else "ready",
             "last_updated": "2024-01-01T00:00:00Z"
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Eventos en vivo para el dashboard (Server-Sent Events)
+def _load_delta(user_id: str, kinds: set) -> Dict[str, Any]:
+    """Partes del dashboard afectadas por los cambios (bloqueante)"""
+    context = UserDataContext(storage_service, user_id)
+    delta: Dict[str, Any] = {"user_id": user_id, "changed": sorted(kinds)}
+    if kinds & {"user", "habit"}:
+        delta["habits"] = context.habits()
+    if "entry" in kinds:
+        delta["entries"] = context.entries(days=30)
+        delta["analytics"] = storage_service.get_user_analytics(user_id, context=context)
+    if "insights" in kinds or (kinds & {"habit", "entry"} and ai_service.engine != "llm"):
+        # Solo los ya generados o los de las reglas: aquí nunca se llama al modelo
+        insights = ai_service.get_cached_insights(user_id, storage_service, context=context)
+        if insights is None and ai_service.engine == "hybrid":
+            insights = ai_service.generate_insights(user_id, storage_service, context=context, engine="rules")
+        delta["insights"] = insights or []
+        delta["insights_status"] = "unavailable" if insights is None else "ready"
+    delta["stats"] = context.stats()
+    return delta
+
+
+def _sse(event: str, data: Any) -> str:
+    """Mensaje SSE con datos JSON"""
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data), ensure_ascii=False)}\n\n"
+
+
+async def _user_events(user_id: str) -> AsyncIterator[str]:
+    """Enviar un delta por cada tanda de cambios y un keep-alive mientras no haya"""
+    subscription = change_broker.subscribe(user_id)
+    try:
+        subscription.version = await async_storage.run(storage_service.get_data_version, user_id)
+        yield "retry: 5000\n\n"
+        while True:
+            kinds = await subscription.wait(PUSH_HEARTBEAT_INTERVAL, PUSH_DEBOUNCE)
+            if not kinds:
+                yield ": keep-alive\n\n"
+                continue
+            # La versión se fija antes de leer: un cambio durante la lectura vuelve a avisar
+            subscription.version = await async_storage.run(storage_service.get_data_version, user_id)
+            try:
+                delta = await async_storage.run(_load_delta, user_id, kinds)
+            except Exception as e:
+                print(f"Error preparando eventos del usuario {user_id}: {e}")
+                subscription.version = None  # El vigilante lo reintentará
+                continue
+            yield _sse("update", delta)
+    finally:
+        change_broker.unsubscribe(subscription)
+
+
+@app.get("/events/{user_id}")
+async def stream_user_events(user_id: str):
+    """Cambios de hábitos, entradas, estadísticas e insights de un usuario en vivo
+
+    Un cliente conectado no genera carga mientras no haya escrituras. Los
+    insights se envían cuando cambian los de las reglas o llegan los del
+    modelo; nunca se llama al modelo para un evento.
+    """
+    return StreamingResponse(
+        _user_events(user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -1,10 +1,17 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
 from datetime import datetime
+from typing import Optional
 import os
 from dotenv import load_dotenv
-from services.sheets_service import GoogleSheetsService
+from services.storage import StorageBackend, create_storage_service
 from services.ai_service import AIAnalysisService
+from services.data_context import UserDataContext
+from services.async_service import AsyncStorageService, AsyncAIService
+from utils.config import (
+    DEFAULT_STORAGE_MAX_WORKERS, DEFAULT_AI_MAX_WORKERS,
+    DEFAULT_BOT_MAX_CONCURRENT_UPDATES, DEFAULT_BOT_MAX_CONCURRENT_AI
+)
 from models.schemas import TelegramUser, Habit, HabitEntry
 import asyncio
 
@@ -14,13 +21,44 @@ load_dotenv()
 class HabitFlowBot:
     """Bot de Telegram para HabitFlow AI"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        storage_service: Optional[StorageBackend] = None,
+        ai_service: Optional[AIAnalysisService] = None
+    ):
+        """storage_service y ai_service permiten compartirlos con la API (--mode both)"""
         self.token = os.getenv("TELEGRAM_BOT_TOKEN")
-        self.sheets_service = GoogleSheetsService(
-            credentials_file=os.getenv("GOOGLE_SHEETS_CREDENTIALS_FILE"),
-            spreadsheet_id=os.getenv("SPREADSHEET_ID")
+        self.storage_service = storage_service or create_storage_service()
+        self.ai_service = ai_service
+        if self.ai_service is None:
+            self.ai_service = AIAnalysisService(
+                os.getenv("GEMINI_API_KEY"), shared_cache=self.storage_service.shared_cache
+            )
+            self.storage_service.add_change_listener(self.ai_service.insight_cache.on_storage_change)
+        # Por defecto se responde al encolar la entrada, sin esperar a Sheets
+        self.wait_for_durable_writes = os.getenv(
+            "BOT_WAIT_FOR_DURABLE_WRITES", "false"
+        ).lower() == "true"
+        
+        # Sheets y Gemini son bloqueantes: se ejecutan fuera del event loop
+        self.async_storage = AsyncStorageService(
+            self.storage_service,
+            max_workers=int(os.getenv("STORAGE_MAX_WORKERS", DEFAULT_STORAGE_MAX_WORKERS))
+        )
+        self.async_ai = AsyncAIService(
+            self.ai_service,
+            max_workers=int(os.getenv("AI_MAX_WORKERS", DEFAULT_AI_MAX_WORKERS))
         )
-        self.ai_service = AIAnalysisService(os.getenv("GEMINI_API_KEY"))
+        
+        # Límites de concurrencia: updates en paralelo, análisis de IA en total
+        # y un análisis a la vez por chat
+        self.max_concurrent_updates = int(os.getenv(
+            "BOT_MAX_CONCURRENT_UPDATES", DEFAULT_BOT_MAX_CONCURRENT_UPDATES
+        ))
+        self.ai_semaphore = asyncio.Semaphore(int(os.getenv(
+            "BOT_MAX_CONCURRENT_AI", DEFAULT_BOT_MAX_CONCURRENT_AI
+        )))
+        self.chats_analyzing = set()
         
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Comando /start"""
@@ -34,7 +72,7 @@ class HabitFlowBot:
             last_name=user.last_name
         )
         
-        self.sheets_service.create_user(telegram_user)
+        await self.async_storage.create_user(telegram_user)
         
         welcome_text = f"""
 Welcome {user.first_name}! Welcome to HabitFlow AI
@@ -117,7 +155,7 @@ Let's start your journey to better habits!
             target_frequency="daily"
         )
         
-        success = self.sheets_service.create_habit(habit)
+        success = await self.async_storage.create_habit(habit)
         
         if success:
             await update.message.reply_text(
@@ -134,7 +172,7 @@ Let's start your journey to better habits!
     async def my_habits(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Comando /my_habits"""
         user_id = str(update.effective_user.id)
-        habits = self.sheets_service.get_user_habits(user_id)
+        habits = await self.async_storage.get_user_habits(user_id)
         
         if not habits:
             await update.message.reply_text(
@@ -182,7 +220,9 @@ Let's start your journey to better habits!
             notes=f"Estado: {status}"
         )
         
-        success = self.sheets_service.add_habit_entry(entry)
+        success = await self.async_storage.add_habit_entry(
+            entry, wait=self.wait_for_durable_writes
+        )
         
         if success:
             status_emoji = "✅" if completed else "❌"
@@ -198,17 +238,26 @@ Let's start your journey to better habits!
     async def stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Comando /stats"""
         user_id = str(update.effective_user.id)
-        stats = self.sheets_service.get_user_stats(user_id)
+        data_context = UserDataContext(self.storage_service, user_id)
+        stats = await self.async_storage.get_user_stats(user_id, context=data_context)
+        analytics = await self.async_storage.get_user_analytics(user_id, context=data_context)
+        
+        habit_lines = "\n".join(
+            f"  • {name}: {rate:.0%}" for name, rate in analytics.habit_rates.items()
+        ) or "  • Sin registros"
         
         stats_text = f"""
 📊 **Tus estadísticas (últimos 30 días)**
 
 🎯 Hábitos totales: **{stats.total_habits}**
 ✅ Hábitos activos: **{stats.active_habits}**
-📈 Tasa de éxito: **{stats.completion_rate:.1%}**
-🔥 Racha actual: **{stats.streak_days} días**
+📈 Tasa de éxito: **{stats.completion_rate:.1%}** (últimos 7 días: **{analytics.rolling_7d_rate:.1%}**)
+🔥 Racha actual: **{stats.streak_days} días** (mejor racha: **{analytics.longest_streak}**)
 🕐 Última actividad: **{stats.last_activity.strftime('%d/%m/%Y')}**
 
+📋 Por hábito:
+{habit_lines}
+
 {'🏆 ¡Excelente trabajo!' if stats.completion_rate > 0.8 else 
  '💪 ¡Sigue así, vas por buen camino!' if stats.completion_rate > 0.5 else 
  '🚀 ¡Cada día es una nueva oportunidad!'}
@@ -221,11 +270,32 @@ Let's start your journey to better habits!
     async def insights(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Comando /insights"""
         user_id = str(update.effective_user.id)
+        chat_id = update.effective_chat.id
         
-        await update.message.reply_text("AI analyzing your habits... Please wait...")
+        if chat_id in self.chats_analyzing:
+            await update.message.reply_text(
+                "⏳ Ya estoy analizando tus hábitos. Te respondo en unos segundos."
+            )
+            return
         
+        self.chats_analyzing.add(chat_id)
+        try:
+            await update.message.reply_text("AI analyzing your habits... Please wait...")
+            
+            async with self.ai_semaphore:
+                await self._send_insights(update, user_id)
+        finally:
+            self.chats_analyzing.discard(chat_id)
+    
+    async def _send_insights(self, update: Update, user_id: str):
+        """Generar y enviar los insights de un usuario"""
         try:
-            insights = self.ai_service.generate_insights(user_id, self.sheets_service)
+            # Los datos se cargan en el pool de almacenamiento y la IA los reutiliza
+            data_context = UserDataContext(self.storage_service, user_id)
+            await self.async_storage.run(data_context.stats)
+            insights = await self.async_ai.generate_insights(
+                user_id, self.storage_service, context=data_context
+            )
             
             insights_text = "🧠 **Insights personalizados con IA:**\n\n"
             
@@ -241,11 +311,10 @@ Let's start your journey to better habits!
                 insights_text += f"{insight.insight}\n\n"
             
             # Agregar recomendación de nuevo hábito
-            user_habits = self.sheets_service.get_user_habits(user_id)
-            habit_names = [h['name'] for h in user_habits]
+            habit_names = [h['name'] for h in data_context.habits()]
             
             if habit_names:
-                recommendation = self.ai_service.get_habit_recommendation(habit_names)
+                recommendation = await self.async_ai.get_habit_recommendation(habit_names)
                 insights_text += f"🎯 **Recomendación de nuevo hábito:**\n{recommendation}"
             
             await update.message.reply_text(insights_text)
@@ -259,7 +328,7 @@ Let's start your journey to better habits!
     async def quick_track(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Registro rápido de todos los hábitos"""
         user_id = str(update.effective_user.id)
-        habits = self.sheets_service.get_user_habits(user_id)
+        habits = await self.async_storage.get_user_habits(user_id)
         
         if not habits:
             await update.message.reply_text(
@@ -305,7 +374,9 @@ Let's start your journey to better habits!
                 notes="Registro rápido"
             )
             
-            success = self.sheets_service.add_habit_entry(entry)
+            success = await self.async_storage.add_habit_entry(
+                entry, wait=self.wait_for_durable_writes
+            )
             
             if success:
                 emoji = "✅" if completed else "❌"
@@ -318,9 +389,22 @@ Let's start your journey to better habits!
                     "❌ Error registrando el hábito. Inténtalo de nuevo."
                 )
     
+    async def shutdown(self, application: Application):
+        """Vaciar escrituras pendientes al detener el bot"""
+        self.async_ai.shutdown()
+        self.ai_service.shutdown()
+        self.async_storage.shutdown()
+        self.storage_service.close()
+    
     def run(self):
         """Ejecutar el bot"""
-        application = Application.builder().token(self.token).build()
+        application = (
+            Application.builder()
+            .token(self.token)
+            .concurrent_updates(self.max_concurrent_updates)
+            .post_shutdown(self.shutdown)
+            .build()
+        )
         
         # Comandos
         application.add_handler(CommandHandler("start", self.start))
@@ -9,40 +9,82 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 load_dotenv()
 
 
-def run_api():
-    """Ejecutar la API de FastAPI"""
+def run_api(reload=None):
+    """Ejecutar la API de FastAPI (reload por defecto según DEBUG)"""
     import uvicorn
-    from api.main import app
+    
+    if reload is None:
+        reload = os.getenv("DEBUG", "True").lower() == "true"
+    # Con reload uvicorn necesita la ruta de la app para reimportarla
+    if reload:
+        app = "api.main:app"
+    else:
+        from api.main import app
     
     uvicorn.run(
         app,
         host=os.getenv("API_HOST", "0.0.0.0"),
         port=int(os.getenv("API_PORT", 8000)),
-        reload=os.getenv("DEBUG", "True").lower() == "true"
+        reload=reload
     )
 
 
-def run_bot():
+def run_bot(storage_service=None, ai_service=None):
     """Ejecutar el bot de Telegram"""
     from bot.telegram_bot import HabitFlowBot
     
-    bot = HabitFlowBot()
+    bot = HabitFlowBot(storage_service, ai_service)
     bot.run()
 
 
+def run_scheduler():
+    """Ejecutar el planificador de insights"""
+    from services.storage import create_storage_service
+    from services.ai_service import AIAnalysisService
+    from services.insight_scheduler import InsightScheduler, parse_window
+    from utils.config import (
+        DEFAULT_INSIGHT_SCHEDULER_WINDOW, DEFAULT_INSIGHT_SCHEDULER_CONCURRENCY,
+        DEFAULT_INSIGHT_SCHEDULER_RATE_PER_MINUTE, DEFAULT_INSIGHT_SCHEDULER_INTERVAL
+    )
+    
+    storage = create_storage_service()
+    ai_service = AIAnalysisService(os.getenv("GEMINI_API_KEY"), shared_cache=storage.shared_cache)
+    scheduler = InsightScheduler(
+        storage,
+        ai_service,
+        window=parse_window(os.getenv("INSIGHT_SCHEDULER_WINDOW", DEFAULT_INSIGHT_SCHEDULER_WINDOW)),
+        concurrency=int(os.getenv("INSIGHT_SCHEDULER_CONCURRENCY", DEFAULT_INSIGHT_SCHEDULER_CONCURRENCY)),
+        rate_per_minute=float(os.getenv(
+            "INSIGHT_SCHEDULER_RATE_PER_MINUTE", DEFAULT_INSIGHT_SCHEDULER_RATE_PER_MINUTE
+        )),
+        interval=float(os.getenv("INSIGHT_SCHEDULER_INTERVAL", DEFAULT_INSIGHT_SCHEDULER_INTERVAL))
+    )
+    
+    print("Starting insight scheduler...")
+    try:
+        scheduler.run_forever()
+    finally:
+        scheduler.stop()
+        storage.close()
+
+
 def run_both():
     """Ejecutar tanto la API como el bot"""
     import threading
+    # Un solo almacenamiento (réplica, buffer de escrituras y cuota de Sheets)
+    # y un solo servicio de IA para los dos
+    from api.main import ai_service, storage_service
     
     # Ejecutar API en un hilo separado
-    api_thread = threading.Thread(target=run_api, daemon=True)
+    # (sin reload: reimportaría la app en otro proceso, con su propio almacenamiento)
+    api_thread = threading.Thread(target=run_api, kwargs={"reload": False}, daemon=True)
     api_thread.start()
     
     print("API started in background...")
     print("Starting Telegram bot...")
     
     # Ejecutar bot en el hilo principal
-    run_bot()
+    run_bot(storage_service, ai_service)
 
 
 if __name__ == "__main__":
@@ -51,9 +93,9 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="HabitFlow AI - MVP")
     parser.add_argument(
         "--mode",
-        choices=["api", "bot", "both"],
+        choices=["api", "bot", "both", "scheduler"],
         default="both",
-        help="Modo de ejecución: api, bot, o both (default: both)"
+        help="Modo de ejecución: api, bot, both o scheduler (default: both)"
     )
     
     args = parser.parse_args()
@@ -63,12 +105,18 @@ if __name__ == "__main__":
     print(f"Mode: {args.mode}")
     
     # Verificar variables de entorno
-    required_env_vars = [
-        "TELEGRAM_BOT_TOKEN",
-        "GOOGLE_SHEETS_CREDENTIALS_FILE", 
-        "SPREADSHEET_ID",
-        "GEMINI_API_KEY"
-    ]
+    from utils.config import DEFAULT_INSIGHTS_ENGINE, DEFAULT_STORAGE_BACKEND
+    use_sheets = os.getenv("STORAGE_BACKEND", DEFAULT_STORAGE_BACKEND).lower() == "sheets"
+    
+    required_env_vars = ["TELEGRAM_BOT_TOKEN"]
+    if os.getenv("INSIGHTS_ENGINE", DEFAULT_INSIGHTS_ENGINE).lower() != "rules":
+        # Con el motor rules los insights no llaman al modelo
+        required_env_vars.append("GEMINI_API_KEY")
+    if args.mode == "scheduler":
+        # El planificador no usa el bot, pero necesita dónde guardar los insights
+        required_env_vars = ["GEMINI_API_KEY", "INSIGHT_STORE_PATH"]
+    if use_sheets:
+        required_env_vars += ["GOOGLE_SHEETS_CREDENTIALS_FILE", "SPREADSHEET_ID"]
     
     missing_vars = [var for var in required_env_vars if not os.getenv(var)]
     
@@ -81,7 +129,7 @@ if __name__ == "__main__":
     
     # Verificar archivo de credenciales
     creds_file = os.getenv("GOOGLE_SHEETS_CREDENTIALS_FILE")
-    if not os.path.exists(creds_file):
+    if use_sheets and not os.path.exists(creds_file):
         print(f"Credentials file not found: {creds_file}")
         print("Download credentials.json from Google Cloud Console")
         sys.exit(1)
@@ -94,6 +142,8 @@ if __name__ == "__main__":
             run_api()
         elif args.mode == "bot":
             run_bot()
+        elif args.mode == "scheduler":
+            run_scheduler()
         else:
             run_both()
     except KeyboardInterrupt:
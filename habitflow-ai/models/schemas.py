@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict
 from pydantic import BaseModel, Field
 
 
@@ -32,6 +32,19 @@ class UserStats(BaseModel):
     last_activity: datetime
 
 
+class HabitAnalytics(BaseModel):
+    """Analíticas de hábitos de un usuario sobre una ventana de días"""
+    user_id: str
+    total_entries: int
+    completion_rate: float
+    weekday_rates: Dict[str, float] = Field(default_factory=dict, description="Tasa de éxito por día de la semana")
+    habit_rates: Dict[str, float] = Field(default_factory=dict, description="Tasa de éxito por hábito")
+    rolling_7d_rate: float
+    rolling_30d_rate: float
+    current_streak: int
+    longest_streak: int
+
+
 class AIInsight(BaseModel):
     """Insight generado por IA"""
     user_id: str
@@ -0,0 +1,91 @@
+"""
+Servidor falso con la API REST de Gemini para probar el cliente del modelo
+Responde a generateContent con retardo y errores configurables, para ver
+los plazos, reintentos, el circuito y los insights de respaldo sin llamar
+al modelo real.
+
+    python scripts/fake_model_server.py --port 8090 --delay 8 --error-rate 0.5
+    GEMINI_API_ENDPOINT=http://127.0.0.1:8090 GEMINI_API_KEY=fake python main.py --mode api
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import random
+import time
+
+
+INSIGHTS = [
+    {"insight": "Respuesta del servidor falso 🤖", "category": "pattern", "confidence": 0.8},
+]
+
+
+class FakeModelHandler(BaseHTTPRequestHandler):
+    """generateContent con el retardo y la tasa de errores del servidor"""
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(self.server.delay)
+
+        if random.random() < self.server.error_rate:
+            self._send(self.server.error_status, {"error": {
+                "code": self.server.error_status,
+                "message": "Error simulado",
+                "status": "UNAVAILABLE",
+            }})
+            return
+
+        # Varios usuarios en el prompt: un objeto con la lista de cada uno
+        prompt = "".join(
+            part.get("text", "")
+            for content in request.get("contents", [])
+            for part in content.get("parts", [])
+        )
+        keys = [line[4:].strip() for line in prompt.splitlines() if line.startswith("### ")]
+        text = json.dumps({key: INSIGHTS for key in keys} if keys else INSIGHTS)
+        self._send(200, {
+            "candidates": [{
+                "content": {"parts": [{"text": text}], "role": "model"},
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+            "usageMetadata": {
+                "promptTokenCount": max(1, len(prompt) // 4),
+                "candidatesTokenCount": max(1, len(text) // 4),
+            },
+        })
+
+    def _send(self, status: int, body: dict):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        print(f"🤖 {self.address_string()} {format % args}")
+
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Servidor falso de Gemini")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--delay", type=float, default=0.0, help="segundos antes de responder")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fracción de respuestas con error")
+    parser.add_argument("--error-status", type=int, default=503, help="código HTTP de los errores")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), FakeModelHandler)
+    server.delay = args.delay
+    server.error_rate = args.error_rate
+    server.error_status = args.error_status
+    print(f"🌟 Servidor falso de Gemini en http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
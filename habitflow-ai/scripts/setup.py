@@ -1,6 +1,6 @@
 """
-Setup inicial para Google Sheets
-Este script ayuda a configurar la hoja de cálculo inicial
+Setup inicial del almacenamiento (Google Sheets o SQLite)
+Este script ayuda a configurar la hoja de cálculo o la base de datos inicial
 """
 import os
 import sys
@@ -11,8 +11,8 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 load_dotenv()
 
-from services.sheets_service import GoogleSheetsService
-from utils.config import SHEET_HEADERS, SHEET_NAMES
+from services.storage import create_storage_service
+from utils.config import SHEET_HEADERS, SHEET_NAMES, DEFAULT_STORAGE_BACKEND
 
 
 def setup_google_sheets():
@@ -21,10 +21,7 @@ def setup_google_sheets():
     
     try:
         # Crear servicio
-        sheets_service = GoogleSheetsService(
-            credentials_file=os.getenv("GOOGLE_SHEETS_CREDENTIALS_FILE"),
-            spreadsheet_id=os.getenv("SPREADSHEET_ID")
-        )
+        sheets_service = create_storage_service()
         
         print("✅ Conexión a Google Sheets exitosa")
         print("✅ Hojas inicializadas correctamente")
@@ -32,8 +29,9 @@ def setup_google_sheets():
         # Verificar hojas
         for sheet_name in SHEET_NAMES.values():
             try:
-                sheet = sheets_service.spreadsheet.worksheet(sheet_name)
-                row_count = len(sheet.get_values())
+                # Por la cola con cuota, como el resto de llamadas a Sheets del proceso
+                sheet = sheets_service.quota.read(sheets_service.spreadsheet.worksheet, sheet_name)
+                row_count = len(sheets_service.quota.read(sheet.get_values))
                 print(f"📄 Hoja '{sheet_name}': {row_count} filas")
             except Exception as e:
                 print(f"❌ Error con hoja '{sheet_name}': {e}")
@@ -46,6 +44,27 @@ def setup_google_sheets():
         return False
 
 
+def setup_sqlite():
+    """Configurar la base de datos SQLite inicial"""
+    print("🔧 Configurando SQLite...")
+    
+    try:
+        storage_service = create_storage_service()
+        storage_service.initialize_schema()
+        print(f"✅ Base de datos lista: {storage_service.db_path}")
+        
+        # Verificar tablas
+        for table_name, row_count in storage_service.table_counts().items():
+            print(f"📄 Tabla '{table_name}': {row_count} filas")
+        
+        print("\n🎉 SQLite configurado correctamente!")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error configurando SQLite: {e}")
+        return False
+
+
 def create_sample_data():
     """Crear datos de ejemplo para testing"""
     print("\n📊 ¿Quieres crear datos de ejemplo? (y/n): ", end="")
@@ -58,10 +77,7 @@ def create_sample_data():
         from models.schemas import TelegramUser, Habit, HabitEntry
         from datetime import datetime, timedelta
         
-        sheets_service = GoogleSheetsService(
-            credentials_file=os.getenv("GOOGLE_SHEETS_CREDENTIALS_FILE"),
-            spreadsheet_id=os.getenv("SPREADSHEET_ID")
-        )
+        storage_service = create_storage_service()
         
         # Usuario de ejemplo
         sample_user = TelegramUser(
@@ -71,7 +87,7 @@ def create_sample_data():
             last_name="Prueba"
         )
         
-        sheets_service.create_user(sample_user)
+        storage_service.create_user(sample_user)
         print("✅ Usuario de ejemplo creado")
         
         # Hábitos de ejemplo
@@ -82,7 +98,7 @@ def create_sample_data():
         ]
         
         for habit in sample_habits:
-            sheets_service.create_habit(habit)
+            storage_service.create_habit(habit)
             print(f"✅ Hábito '{habit.name}' creado")
         
         # Entradas de ejemplo (últimos 7 días)
@@ -97,7 +113,7 @@ def create_sample_data():
                     date=date,
                     notes=f"Registro del día {date.strftime('%d/%m')}"
                 )
-                sheets_service.add_habit_entry(entry)
+                storage_service.add_habit_entry(entry)
         
         print("✅ Entradas de ejemplo creadas")
         print("\n🎉 Datos de ejemplo listos!")
@@ -112,6 +128,15 @@ def main():
     print("🌟 HabitFlow AI - Setup")
     print("=" * 40)
     
+    backend = os.getenv("STORAGE_BACKEND", DEFAULT_STORAGE_BACKEND).lower()
+    if backend == "sqlite":
+        if setup_sqlite():
+            create_sample_data()
+        
+        print("\n👍 Setup completado!")
+        print("🚀 Ahora puedes ejecutar: python main.py")
+        return
+    
     # Verificar variables de entorno
     required_vars = [
         "GOOGLE_SHEETS_CREDENTIALS_FILE",
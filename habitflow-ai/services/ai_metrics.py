@@ -0,0 +1,79 @@
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict
+import threading
+
+
+class AIUsageMetrics:
+    """Tokens de cada llamada al modelo y totales acumulados
+
+    Cuando la respuesta no trae usage_metadata se usa una estimación y la
+    llamada queda marcada como estimated. También lleva contadores de
+    eventos del cliente del modelo (reintentos, timeouts, circuito,
+    respuestas de respaldo) y la latencia de los últimos intentos.
+    """
+
+    def __init__(self, recent_calls: int = 100, recent_latencies: int = 500):
+        self._lock = threading.Lock()
+        self._recent: Deque[Dict[str, Any]] = deque(maxlen=recent_calls)
+        self._totals: Dict[str, Dict[str, int]] = {}
+        self._events: Dict[str, int] = {}
+        self._latencies: Deque[float] = deque(maxlen=recent_latencies)
+
+    def record_call(self, kind: str, prompt_tokens: int, output_tokens: int, users: int = 1, estimated: bool = False):
+        """Anotar una llamada (kind: insights, batch, recommendation...)"""
+        call = {
+            "kind": kind,
+            "at": datetime.now().isoformat(timespec="seconds"),
+            "prompt_tokens": prompt_tokens,
+            "output_tokens": output_tokens,
+            "users": users,
+            "estimated": estimated,
+        }
+        with self._lock:
+            self._recent.append(call)
+            totals = self._totals.setdefault(
+                kind, {"calls": 0, "users": 0, "prompt_tokens": 0, "output_tokens": 0}
+            )
+            totals["calls"] += 1
+            totals["users"] += users
+            totals["prompt_tokens"] += prompt_tokens
+            totals["output_tokens"] += output_tokens
+
+    def increment(self, event: str, count: int = 1):
+        """Sumar a un contador de eventos (retries, timeouts, fallback_rules...)"""
+        with self._lock:
+            self._events[event] = self._events.get(event, 0) + count
+
+    def record_latency(self, seconds: float):
+        """Anotar la duración de un intento de llamada al modelo"""
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def _latency_percentiles(self) -> Dict[str, float]:
+        """Percentiles en milisegundos de los últimos intentos"""
+        values = sorted(self._latencies)
+        if not values:
+            return {}
+        def percentile(q: float) -> float:
+            return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 1)
+        return {"p50": percentile(0.5), "p95": percentile(0.95), "p99": percentile(0.99), "max": percentile(1.0)}
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Totales por tipo de llamada, tokens por usuario y últimas llamadas"""
+        with self._lock:
+            totals = {
+                kind: dict(
+                    values,
+                    tokens_per_user=round(
+                        (values["prompt_tokens"] + values["output_tokens"]) / max(1, values["users"]), 1
+                    )
+                )
+                for kind, values in self._totals.items()
+            }
+            return {
+                "totals": totals,
+                "events": dict(self._events),
+                "latency_ms": self._latency_percentiles(),
+                "recent_calls": list(self._recent),
+            }
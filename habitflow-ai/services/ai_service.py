@@ -1,27 +1,148 @@
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Optional, Set, Tuple
 import google.generativeai as genai
 from datetime import datetime, timedelta
+import hashlib
 import json
+import os
+import threading
+import numpy as np
+from pydantic import ValidationError
 from models.schemas import AIInsight, UserStats
-from services.sheets_service import GoogleSheetsService
+from services.ai_metrics import AIUsageMetrics
+from services.storage import StorageBackend
+from services.data_context import UserDataContext
+from services.entry_store import EntryColumns
+from services.insight_cache import InsightCache
+from services.insight_store import InsightStore
+from services.model_client import RETRYABLE_ERRORS, CircuitBreaker, ModelUnavailableError, ResilientModelClient
+from services.prompt_builder import INSIGHT_INSTRUCTIONS, InsightPromptBuilder, estimate_tokens
+from services.rate_limit import TokenBucket
+from services.rule_insights import RuleInsightEngine
+from services.shared_cache import SharedCache
+from utils.analytics import analyze_all
+from utils.config import (
+    DEFAULT_INSIGHT_CACHE_TTL, DEFAULT_INSIGHT_CACHE_MAX_ENTRIES, DEFAULT_INSIGHT_STORE_PATH,
+    DEFAULT_INSIGHT_MAX_STALENESS, DEFAULT_INSIGHT_BATCH_SIZE, DEFAULT_INSIGHT_PROMPT_TOKEN_BUDGET,
+    DEFAULT_AI_CALL_TIMEOUT, DEFAULT_AI_CALL_DEADLINE, DEFAULT_AI_MAX_ATTEMPTS, DEFAULT_AI_BACKOFF_BASE,
+    DEFAULT_AI_BACKOFF_MAX, DEFAULT_AI_BREAKER_FAILURES, DEFAULT_AI_BREAKER_RESET,
+    DEFAULT_GEMINI_API_ENDPOINT, DEFAULT_INSIGHTS_ENGINE, INSIGHT_ENGINES
+)
+
 
 
 class AIAnalysisService:
     """Servicio para análisis de IA y generación de insights usando Google Gemini"""
     
-    def __init__(self, gemini_api_key: str):
-        genai.configure(api_key=gemini_api_key)
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
+    def __init__(
+        self,
+        gemini_api_key: str,
+        insight_cache: Optional[InsightCache] = None,
+        shared_cache: Optional[SharedCache] = None,
+        insight_store: Optional[InsightStore] = None
+    ):
+        endpoint = os.getenv("GEMINI_API_ENDPOINT", DEFAULT_GEMINI_API_ENDPOINT)
+        if endpoint:
+            # Otro servidor compatible con la API REST (p. ej. uno falso para pruebas)
+            genai.configure(api_key=gemini_api_key, transport="rest", client_options={"api_endpoint": endpoint})
+        else:
+            genai.configure(api_key=gemini_api_key)
+        # Las instrucciones fijas de los insights van como system_instruction:
+        # se envían aparte del prompt y no se repiten en el texto de cada usuario
+        self.model = genai.GenerativeModel(
+            'gemini-1.5-flash',
+            system_instruction=INSIGHT_INSTRUCTIONS,
+            generation_config={"response_mime_type": "application/json"}
+        )
+        self.chat_model = genai.GenerativeModel('gemini-1.5-flash')
+        self.prompt_builder = InsightPromptBuilder(token_budget=int(
+            os.getenv("INSIGHT_PROMPT_TOKEN_BUDGET", DEFAULT_INSIGHT_PROMPT_TOKEN_BUDGET)
+        ))
+        self.metrics = AIUsageMetrics()
+        # Plazos, reintentos y circuito de todas las llamadas al modelo
+        self.client = ResilientModelClient(
+            timeout=float(os.getenv("AI_CALL_TIMEOUT", DEFAULT_AI_CALL_TIMEOUT)),
+            deadline=float(os.getenv("AI_CALL_DEADLINE", DEFAULT_AI_CALL_DEADLINE)),
+            max_attempts=int(os.getenv("AI_MAX_ATTEMPTS", DEFAULT_AI_MAX_ATTEMPTS)),
+            backoff_base=float(os.getenv("AI_BACKOFF_BASE", DEFAULT_AI_BACKOFF_BASE)),
+            backoff_max=float(os.getenv("AI_BACKOFF_MAX", DEFAULT_AI_BACKOFF_MAX)),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv("AI_BREAKER_FAILURES", DEFAULT_AI_BREAKER_FAILURES)),
+                reset_timeout=float(os.getenv("AI_BREAKER_RESET", DEFAULT_AI_BREAKER_RESET))
+            ),
+            metrics=self.metrics
+        )
+        
+        # Caché de insights: se registra como listener del almacenamiento
+        # (storage.add_change_listener(ai_service.insight_cache.on_storage_change))
+        self.insight_cache = insight_cache or InsightCache(
+            max_entries=int(os.getenv("INSIGHT_CACHE_MAX_ENTRIES", DEFAULT_INSIGHT_CACHE_MAX_ENTRIES)),
+            ttl=float(os.getenv("INSIGHT_CACHE_TTL", DEFAULT_INSIGHT_CACHE_TTL))
+        )
+        # Segundo nivel compartido con los demás workers (storage.shared_cache)
+        self.shared_cache = shared_cache
+        
+        # Insights persistidos (los precalcula el planificador, --mode scheduler)
+        if insight_store is None:
+            insight_store_path = os.getenv("INSIGHT_STORE_PATH", DEFAULT_INSIGHT_STORE_PATH)
+            if insight_store_path:
+                insight_store = InsightStore(insight_store_path)
+        self.insight_store = insight_store
+        # Antigüedad máxima de insights guardados que se sirven aunque los datos cambiaran
+        self.max_staleness = timedelta(seconds=float(
+            os.getenv("INSIGHT_MAX_STALENESS", DEFAULT_INSIGHT_MAX_STALENESS)
+        ))
+        
+        # Usuarios por llamada en generate_insights_batch
+        self.batch_size = max(1, int(os.getenv("INSIGHT_BATCH_SIZE", DEFAULT_INSIGHT_BATCH_SIZE)))
+        # Presupuesto opcional de llamadas al modelo (lo fija el planificador)
+        self.call_budget: Optional[TokenBucket] = None
+        
+        # Primer nivel de insights: reglas locales (INSIGHTS_ENGINE)
+        self.engine = os.getenv("INSIGHTS_ENGINE", DEFAULT_INSIGHTS_ENGINE).lower()
+        if self.engine not in INSIGHT_ENGINES:
+            raise ValueError(
+                f"INSIGHTS_ENGINE inválido: {self.engine!r} (opciones: {', '.join(INSIGHT_ENGINES)})"
+            )
+        self.rule_engine = RuleInsightEngine()
+        # En hybrid, los insights del modelo se generan aquí en segundo plano;
+        # cada listener recibe el user_id cuando están listos
+        self.enrichment_listeners: List[Callable[[str], None]] = []
+        self._enriching: Set[str] = set()
+        self._enriching_lock = threading.Lock()
+        self._enrichment_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="enrich")
     
-    def generate_insights(self, user_id: str, sheets_service: GoogleSheetsService) -> List[AIInsight]:
-        """Generar insights personalizados para un usuario"""
+    def generate_insights(
+        self,
+        user_id: str,
+        storage: StorageBackend,
+        context: Optional[UserDataContext] = None,
+        allow_stale: bool = True,
+        engine: Optional[str] = None
+    ) -> List[AIInsight]:
+        """Generar insights personalizados para un usuario
+
+        Con cualquier motor se sirven primero los insights del modelo ya
+        generados (cachés o los precalculados por el planificador). Si no los
+        hay, rules usa las reglas locales sin llamar al modelo; hybrid devuelve
+        los de las reglas mientras el modelo los genera en segundo plano; llm
+        espera al modelo. engine sustituye a INSIGHTS_ENGINE en esta llamada.
+
+        Con allow_stale se aceptan los últimos insights guardados aunque los
+        datos hayan cambiado después (hasta INSIGHT_MAX_STALENESS); el
+        planificador los regenera.
+        """
+        engine = engine or self.engine
         try:
-            # Obtener datos del usuario
-            habits = sheets_service.get_user_habits(user_id)
-            entries = sheets_service.get_user_entries(user_id, days=30)
-            stats = sheets_service.get_user_stats(user_id)
+            # Obtener datos del usuario (reutilizando los del request si existen)
+            if context is None:
+                context = UserDataContext(storage, user_id)
             
-            if not entries:
+            habits = context.habits()
+            columns = context.columns(days=30)
+            stats = context.stats()
+            
+            if not len(columns):
                 return [AIInsight(
                     user_id=user_id,
                     insight="¡Comienza a registrar tus hábitos para obtener insights personalizados! 🚀",
@@ -29,13 +150,28 @@ class AIAnalysisService:
                     confidence=1.0
                 )]
             
-            # Preparar contexto para la IA
-            context = self._prepare_context(habits, entries, stats)
+            # Si los datos no cambiaron desde la última generación, no llamar al modelo
+            fingerprint = self._data_fingerprint(habits, columns, stats)
+            cached = self._lookup_cached(user_id, fingerprint, allow_stale)
+            if cached is not None:
+                return cached
             
-            # Generar insights con Gemini
-            insights = self._call_gemini_for_insights(context, user_id)
+            if engine == "rules":
+                return self.rule_engine.insights(user_id, habits, columns, stats)
             
-            return insights
+            if engine == "hybrid":
+                self._enrich_later(user_id, habits, columns, stats, fingerprint)
+                return self.rule_engine.insights(user_id, habits, columns, stats)
+            
+            # Generar insights con Gemini
+            try:
+                return self._model_insights(user_id, habits, columns, stats, fingerprint)
+            except Exception as e:
+                # Modelo degradado o sin respuesta a tiempo: insights de las reglas
+                # (no se guardan, para volver al modelo en cuanto se recupere)
+                print(f"Error llamando a Gemini: {e}")
+                self.metrics.increment("fallback_rules")
+                return self.rule_engine.insights(user_id, habits, columns, stats)
             
         except Exception as e:
             print(f"Error generando insights: {e}")
@@ -46,150 +182,315 @@ class AIAnalysisService:
                 confidence=0.5
             )]
     
-    def _prepare_context(self, habits: List[Dict], entries: List[Dict], stats: UserStats) -> str:
-        """Preparar contexto para el análisis de IA"""
-        
-        # Resumen de hábitos
-        habit_names = [h['name'] for h in habits]
-        
-        # Análisis de entradas recientes
-        completed_count = len([e for e in entries if e.get('completed', '').lower() == 'true'])
-        total_entries = len(entries)
-        
-        # Patrones por día de la semana
-        weekly_pattern = self._analyze_weekly_pattern(entries)
-        
-        # Contexto estructurado
-        context = f"""
-Datos del usuario (últimos 30 días):
-- Hábitos activos: {', '.join(habit_names)}
-- Total de registros: {total_entries}
-- Registros completados: {completed_count}
-- Tasa de éxito: {stats.completion_rate:.1%}
-- Racha actual: {stats.streak_days} días
-- Patrón semanal: {weekly_pattern}
-
-Por favor, analiza estos datos y proporciona 3-4 insights útiles y motivadores.
-Cada insight debe ser:
-1. Específico y personal
-2. Accionable
-3. Motivador pero realista
-4. Basado en los patrones observados
-
-Formato de respuesta (JSON):
-[
-    {{
-        "insight": "mensaje del insight",
-        "category": "motivation|improvement|pattern|achievement",
-        "confidence": 0.8
-    }}
-]
-"""
-        return context
+    def _model_insights(
+        self,
+        user_id: str,
+        habits: List[Dict],
+        columns: EntryColumns,
+        stats: UserStats,
+        fingerprint: str
+    ) -> List[AIInsight]:
+        """Generar con el modelo y recordar el resultado (los errores se propagan)"""
+        summary = self.prompt_builder.user_summary(habits, columns, stats)
+        insights = self._call_gemini_for_insights(summary, user_id)
+        self._remember(user_id, fingerprint, insights)
+        return insights
     
-    def _analyze_weekly_pattern(self, entries: List[Dict]) -> str:
-        """Analizar patrones por día de la semana"""
+    def _enrich_later(
+        self,
+        user_id: str,
+        habits: List[Dict],
+        columns: EntryColumns,
+        stats: UserStats,
+        fingerprint: str
+    ):
+        """Generar los insights del modelo en segundo plano (uno por usuario a la vez)"""
+        with self._enriching_lock:
+            if user_id in self._enriching:
+                return
+            self._enriching.add(user_id)
         try:
-            if not entries:
-                return "Sin datos suficientes"
-            
-            from collections import defaultdict
-            import datetime
-            
-            day_counts = defaultdict(int)
-            day_completed = defaultdict(int)
+            self._enrichment_executor.submit(self._enrich, user_id, habits, columns, stats, fingerprint)
+        except RuntimeError:
+            # Pool detenido (cerrando el proceso)
+            with self._enriching_lock:
+                self._enriching.discard(user_id)
+    
+    def _enrich(self, user_id: str, habits: List[Dict], columns: EntryColumns, stats: UserStats, fingerprint: str):
+        try:
+            self._model_insights(user_id, habits, columns, stats, fingerprint)
+        except Exception as e:
+            print(f"Error enriqueciendo insights con Gemini: {e}")
+            return
+        finally:
+            with self._enriching_lock:
+                self._enriching.discard(user_id)
+        self.metrics.increment("enriched")
+        for listener in self.enrichment_listeners:
+            try:
+                listener(user_id)
+            except Exception as e:
+                print(f"Error avisando de insights nuevos: {e}")
+    
+    def is_enriching(self, user_id: str) -> bool:
+        """Si el modelo está generando en segundo plano los insights de un usuario"""
+        with self._enriching_lock:
+            return user_id in self._enriching
+    
+    def generate_insights_batch(
+        self,
+        user_ids: List[str],
+        storage: StorageBackend,
+        allow_stale: bool = False
+    ) -> Dict[str, List[AIInsight]]:
+        """Generar insights de varios usuarios con una llamada al modelo por lote
+
+        Los datos de hasta batch_size usuarios van en un mismo prompt y la
+        respuesta es un JSON con una clave por usuario. Los usuarios cuya
+        sección falte o no se pueda leer se generan con una llamada propia.
+        """
+        results: Dict[str, List[AIInsight]] = {}
+        contexts: Dict[str, Tuple[str, UserDataContext]] = {}
+        for user_id in user_ids:
+            try:
+                context = UserDataContext(storage, user_id)
+                fingerprint = self.insights_fingerprint(context)
+                cached = None
+                if fingerprint is not None:
+                    cached = self._lookup_cached(user_id, fingerprint, allow_stale)
+                if fingerprint is None or cached is not None:
+                    results[user_id] = cached or self.generate_insights(
+                        user_id, storage, context=context, engine="llm"
+                    )
+                    continue
+                contexts[user_id] = (fingerprint, context)
+            except Exception as e:
+                print(f"Error preparando insights del usuario {user_id}: {e}")
+        
+        # Las analíticas de todos los usuarios del lote en una sola pasada
+        analytics = analyze_all({
+            user_id: context.columns(days=30) for user_id, (_, context) in contexts.items()
+        })
+        pending: List[Tuple[str, str, str]] = []
+        for user_id, (fingerprint, context) in contexts.items():
+            try:
+                summary = self.prompt_builder.user_summary(
+                    context.habits(), context.columns(days=30), context.stats(),
+                    analytics=analytics[user_id]
+                )
+                pending.append((user_id, fingerprint, summary))
+            except Exception as e:
+                print(f"Error preparando insights del usuario {user_id}: {e}")
+        
+        for start in range(0, len(pending), self.batch_size):
+            batch = pending[start:start + self.batch_size]
+            try:
+                sections = self._call_gemini_for_batch([summary for _, _, summary in batch])
+            except (ModelUnavailableError, *RETRYABLE_ERRORS) as e:
+                # Modelo degradado: estos usuarios quedan pendientes para la siguiente pasada
+                print(f"Modelo no disponible para el lote: {e}")
+                continue
+            except Exception as e:
+                print(f"Error llamando a Gemini en lote: {e}")
+                sections = {}
             
-            for entry in entries:
+            for position, (user_id, fingerprint, _) in enumerate(batch):
                 try:
-                    date = datetime.datetime.fromisoformat(entry['date'])
-                    day_name = date.strftime('%A')
-                    day_counts[day_name] += 1
-                    if entry.get('completed', '').lower() == 'true':
-                        day_completed[day_name] += 1
+                    insights = self._parse_insight_items(sections.get(f"u{position + 1}"), user_id)
                 except ValueError:
+                    # Sección ausente o malformada: llamada individual
+                    results[user_id] = self.generate_insights(
+                        user_id, storage, allow_stale=False, engine="llm"
+                    )
                     continue
-            
-            # Encontrar el mejor y peor día
-            best_day = max(day_completed, key=day_completed.get) if day_completed else "Sin datos"
-            worst_day = min(day_completed, key=day_completed.get) if day_completed else "Sin datos"
-            
-            return f"Mejor día: {best_day}, Día más difícil: {worst_day}"
-            
-        except Exception:
-            return "Patrón no disponible"
+                self._remember(user_id, fingerprint, insights)
+                results[user_id] = insights
+        return results
     
-    def _call_gemini_for_insights(self, context: str, user_id: str) -> List[AIInsight]:
-        """Llamar a Google Gemini para generar insights"""
-        try:
-            prompt = f"""
-Eres un coach experto en hábitos que ayuda a las personas a mejorar sus rutinas. 
-Tu trabajo es analizar los datos de hábitos y proporcionar insights valiosos, motivadores y accionables.
-Siempre mantén un tono positivo y constructivo. Usa emojis apropiados.
-
-{context}
+    def _remember(self, user_id: str, fingerprint: str, insights: List[AIInsight]):
+        """Guardar insights generados en las cachés y en el almacén"""
+        self.insight_cache.set(user_id, fingerprint, insights)
+        if self.shared_cache:
+            self.shared_cache.set(
+                f"insights:{user_id}", fingerprint, insights, ttl=self.insight_cache.ttl
+            )
+        if self.insight_store:
+            self.insight_store.save(user_id, fingerprint, insights)
+    
+    def get_cached_insights(
+        self,
+        user_id: str,
+        storage: StorageBackend,
+        context: Optional[UserDataContext] = None,
+        allow_stale: bool = True
+    ) -> Optional[List[AIInsight]]:
+        """Insights ya generados para los datos actuales, sin llamar al modelo
 
-Responde SOLO con un JSON válido en este formato:
-[
-    {{
-        "insight": "mensaje del insight específico y motivador",
-        "category": "motivation",
-        "confidence": 0.8
-    }},
-    {{
-        "insight": "otro insight accionable",
-        "category": "improvement", 
-        "confidence": 0.9
-    }}
-]
+        None si habría que llamar al modelo. Con el motor rules, si no hay
+        insights generados, devuelve los de las reglas.
+        """
+        if context is None:
+            context = UserDataContext(storage, user_id)
+        cached = self.get_generated_insights(user_id, storage, context=context, allow_stale=allow_stale)
+        if cached is None and (self.engine == "rules" or self.insights_fingerprint(context) is None):
+            return self.generate_insights(user_id, storage, context=context)
+        return cached
+    
+    def get_generated_insights(
+        self,
+        user_id: str,
+        storage: StorageBackend,
+        context: Optional[UserDataContext] = None,
+        allow_stale: bool = True
+    ) -> Optional[List[AIInsight]]:
+        """Insights del modelo ya generados para los datos actuales (cachés o almacén)
 
-Categorías válidas: motivation, improvement, pattern, achievement
-"""
-            
-            response = self.model.generate_content(prompt)
-            content = response.text.strip()
-            
-            # Limpiar el contenido si tiene markdown
-            if content.startswith("```json"):
-                content = content.replace("```json", "").replace("```", "").strip()
-            
-            # Intentar parsear como JSON
-            try:
-                insights_data = json.loads(content)
-                insights = []
-                
-                for insight_data in insights_data:
-                    insights.append(AIInsight(
-                        user_id=user_id,
-                        insight=insight_data.get('insight', ''),
-                        category=insight_data.get('category', 'motivation'),
-                        confidence=float(insight_data.get('confidence', 0.7))
-                    ))
-                
-                return insights
-                
-            except json.JSONDecodeError:
-                # Si no es JSON válido, usar el contenido como un solo insight
-                return [AIInsight(
-                    user_id=user_id,
-                    insight=content,
-                    category="motivation",
-                    confidence=0.7
-                )]
-            
-        except Exception as e:
-            print(f"Error llamando a Gemini: {e}")
+        None si no los hay, sea cual sea el motor: nunca usa las reglas.
+        """
+        if context is None:
+            context = UserDataContext(storage, user_id)
+        fingerprint = self.insights_fingerprint(context)
+        if fingerprint is None:
+            return None
+        return self._lookup_cached(user_id, fingerprint, allow_stale)
+    
+    def insights_fingerprint(self, context: UserDataContext) -> Optional[str]:
+        """Huella de los datos de los que salen los insights (None si no hay entradas)"""
+        columns = context.columns(days=30)
+        if not len(columns):
+            return None
+        return self._data_fingerprint(context.habits(), columns, context.stats())
+    
+    def _lookup_cached(self, user_id: str, fingerprint: str, allow_stale: bool = True) -> Optional[List[AIInsight]]:
+        """Buscar insights en la caché local, la compartida y el almacén persistente"""
+        cached = self.insight_cache.get(user_id, fingerprint)
+        if cached is None and self.shared_cache:
+            cached = self.shared_cache.get(f"insights:{user_id}", fingerprint)
+            if cached is not None:
+                self.insight_cache.set(user_id, fingerprint, cached)
+        if cached is not None or not self.insight_store:
+            return cached
+        
+        stored = self.insight_store.get(user_id)
+        if stored is None:
+            return None
+        if stored.fingerprint == fingerprint:
+            self.insight_cache.set(user_id, fingerprint, stored.insights)
+            return stored.insights
+        if allow_stale and datetime.now() - stored.generated_at <= self.max_staleness:
+            return stored.insights
+        return None
+    
+    def _data_fingerprint(self, habits: List[Dict], columns: EntryColumns, stats: UserStats) -> str:
+        """Huella de los datos que alimentan los insights de un usuario"""
+        digest = hashlib.sha1()
+        digest.update(json.dumps({
+            'habits': sorted(str(h.get('name', '')) for h in habits),
+            'habit_names': columns.habit_names,
+            'streak': stats.streak_days
+        }, sort_keys=True).encode('utf-8'))
+        for column in (columns.days, columns.seconds, columns.completed, columns.ratings, columns.habits):
+            digest.update(np.ascontiguousarray(column).tobytes())
+        return digest.hexdigest()
+    
+    def _call_gemini_for_insights(self, summary: str, user_id: str) -> List[AIInsight]:
+        """Llamar a Google Gemini para generar insights (los errores se propagan)"""
+        content = self._generate(self.prompt_builder.single_prompt(summary), kind="insights")
+        
+        # Intentar parsear como JSON
+        try:
+            return self._parse_insight_items(json.loads(content), user_id)
+        except ValueError:
+            # Si no es JSON válido, usar el contenido como un solo insight
             return [AIInsight(
                 user_id=user_id,
-                insight="¡Sigue así! Cada día que registras tus hábitos es un paso hacia una mejor versión de ti mismo. 🌟",
+                insight=content,
                 category="motivation",
-                confidence=0.5
+                confidence=0.7
             )]
     
+    def _call_gemini_for_batch(self, summaries: List[str]) -> Dict[str, Any]:
+        """Una llamada con los datos de varios usuarios (claves u1, u2...)
+
+        Devuelve el objeto JSON de la respuesta sin validar cada sección.
+        """
+        prompt = self.prompt_builder.batch_prompt(summaries)
+        data = json.loads(self._generate(prompt, kind="batch", users=len(summaries)))
+        if not isinstance(data, dict):
+            raise ValueError("La respuesta del lote no es un objeto JSON")
+        return data
+    
+    def _generate(self, prompt: str, kind: str, users: int = 1) -> str:
+        """Llamar al modelo y devolver el texto sin bloques de markdown
+
+        Los insights usan el modelo con las instrucciones fijas; el resto,
+        el modelo sin ellas. La llamada pasa por el cliente con plazos,
+        reintentos y circuito, y sus tokens quedan en metrics.
+        """
+        if self.call_budget:
+            self.call_budget.acquire()
+        model = self.model if kind in ("insights", "batch") else self.chat_model
+        response = self.client.generate(model, prompt)
+        content = response.text.strip()
+        self._record_usage(kind, model is self.model, prompt, content, response, users)
+        
+        # Limpiar el contenido si tiene markdown
+        if content.startswith("```"):
+            content = content.split("\n", 1)[1] if "\n" in content else ""
+            content = content.rsplit("```", 1)[0].strip()
+        return content
+    
+    def _record_usage(self, kind: str, with_instructions: bool, prompt: str, content: str, response: Any, users: int):
+        """Anotar los tokens de una llamada (estimados si la respuesta no los trae)"""
+        usage = getattr(response, "usage_metadata", None)
+        prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+        output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+        estimated = not prompt_tokens
+        if estimated:
+            prompt_tokens = estimate_tokens(prompt)
+            if with_instructions:
+                prompt_tokens += estimate_tokens(INSIGHT_INSTRUCTIONS)
+            output_tokens = estimate_tokens(content)
+        self.metrics.record_call(kind, prompt_tokens, output_tokens, users=users, estimated=estimated)
+    
+    @staticmethod
+    def _parse_insight_items(items: Any, user_id: str) -> List[AIInsight]:
+        """Convertir la lista de insights de la respuesta (ValueError si no es válida)"""
+        if not isinstance(items, list) or not items:
+            raise ValueError("Se esperaba una lista de insights")
+        insights = []
+        for item in items:
+            if not isinstance(item, dict) or not item.get('insight'):
+                continue  # Ignorar elementos sin texto
+            try:
+                insights.append(AIInsight(
+                    user_id=user_id,
+                    insight=str(item['insight']),
+                    category=item.get('category', 'motivation'),
+                    confidence=float(item.get('confidence', 0.7))
+                ))
+            except (TypeError, ValueError, ValidationError):
+                continue  # Confianza fuera de rango o no numérica
+        if not insights:
+            raise ValueError("Ningún insight válido")
+        return insights
+    
+    def shutdown(self):
+        """Detener los pools de las llamadas al modelo"""
+        self._enrichment_executor.shutdown(wait=False)
+        self.client.shutdown()
+    
     def get_habit_recommendation(self, user_habits: List[str]) -> str:
-        """Recomendar nuevos hábitos basado en los actuales"""
+        """Recomendar nuevos hábitos basado en los actuales
+
+        Con INSIGHTS_ENGINE=rules la recomendación sale del catálogo local,
+        sin llamar al modelo.
+        """
         try:
             if not user_habits:
                 return "Empieza con hábitos simples como beber 8 vasos de agua al día o caminar 10 minutos. 💧🚶‍♂️"
+            if self.engine == "rules":
+                return self.rule_engine.recommendation(user_habits)
             
             habits_text = ", ".join(user_habits)
             
@@ -201,10 +502,9 @@ Respuesta corta y motivadora (máximo 2 líneas).
 Incluye emojis apropiados.
 """
             
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
+            return self._generate(prompt, kind="recommendation")
             
         except Exception as e:
             print(f"Error obteniendo recomendación: {e}")
-            return "Considera agregar un hábito de mindfulness como 5 minutos de meditación diaria. 🧘‍♂️"
+            return self.rule_engine.recommendation(user_habits)
 
@@ -61,6 +61,19 @@ export interface UserStats {
   last_activity: string
 }
 
+export interface EntriesQuery {
+  since?: string
+  until?: string
+  habit?: string
+  limit?: number
+  cursor?: string
+}
+
+export interface EntriesPage {
+  entries: HabitEntry[]
+  nextCursor: string | null
+}
+
 export interface AIInsight {
   insight: string
   category: string
@@ -107,6 +120,15 @@ export const apiService = {
     return response.data
   },
 
+  // Paginated entries: pass nextCursor back as `cursor` to get the next page
+  async getUserEntriesPage(userId: string, query: EntriesQuery = {}): Promise<EntriesPage> {
+    const response = await api.get(`/entries/${userId}`, { params: query })
+    return {
+      entries: response.data,
+      nextCursor: response.headers['x-next-cursor'] ?? null,
+    }
+  },
+
   async getUserInsights(userId: string): Promise<AIInsight[]> {
     const response = await api.get(`/insights/${userId}`)
     return response.data
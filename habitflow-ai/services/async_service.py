@@ -0,0 +1,108 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from models.schemas import AIInsight, Habit, HabitAnalytics, HabitEntry, TelegramUser, UserStats
+from services.data_context import UserDataContext
+import asyncio
+import functools
+
+
+class _ExecutorRunner:
+    """Ejecuta funciones bloqueantes en un pool de hilos acotado"""
+
+    def __init__(self, max_workers: int, thread_name_prefix: str):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix=thread_name_prefix
+        )
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Ejecutar fn fuera del event loop y esperar su resultado"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(fn, *args, **kwargs)
+        )
+
+    def shutdown(self):
+        """Detener el pool de hilos"""
+        self._executor.shutdown(wait=False)
+
+
+class AsyncStorageService(_ExecutorRunner):
+    """Variante async del almacenamiento (gspread / SQLite son síncronos)"""
+
+    def __init__(self, storage, max_workers: int = 16):
+        super().__init__(max_workers, "storage")
+        self.storage = storage
+
+    async def create_user(self, user: TelegramUser) -> bool:
+        """Crear un nuevo usuario"""
+        return await self.run(self.storage.create_user, user)
+
+    async def create_habit(self, habit: Habit) -> bool:
+        """Crear un nuevo hábito"""
+        return await self.run(self.storage.create_habit, habit)
+
+    async def add_habit_entry(self, entry: HabitEntry, wait: bool = False) -> bool:
+        """Agregar una entrada de hábito"""
+        return await self.run(self.storage.add_habit_entry, entry, wait=wait)
+
+    async def get_user_habits(self, user_id: str) -> List[Dict[str, Any]]:
+        """Obtener todos los hábitos de un usuario"""
+        return await self.run(self.storage.get_user_habits, user_id)
+
+    async def get_user_entries(self, user_id: str, days: int = 30) -> List[Dict[str, Any]]:
+        """Obtener entradas de un usuario de los últimos N días"""
+        return await self.run(self.storage.get_user_entries, user_id, days)
+
+    async def get_user_entries_page(
+        self,
+        user_id: str,
+        since: datetime,
+        until: Optional[datetime] = None,
+        habit_name: Optional[str] = None,
+        limit: int = 1000,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Obtener una página de entradas de un usuario"""
+        return await self.run(
+            self.storage.get_user_entries_page, user_id, since, until, habit_name, limit, cursor
+        )
+
+    async def get_user_stats(self, user_id: str, context: Optional[UserDataContext] = None) -> UserStats:
+        """Calcular estadísticas de un usuario"""
+        return await self.run(self.storage.get_user_stats, user_id, context=context)
+
+    async def get_user_analytics(
+        self,
+        user_id: str,
+        days: int = 30,
+        context: Optional[UserDataContext] = None
+    ) -> HabitAnalytics:
+        """Calcular analíticas de hábitos de un usuario"""
+        return await self.run(self.storage.get_user_analytics, user_id, days, context=context)
+
+
+class AsyncAIService(_ExecutorRunner):
+    """Variante async del servicio de IA, con su propio pool
+
+    Un pool separado evita que las llamadas lentas a Gemini ocupen los hilos
+    que necesitan los endpoints baratos de almacenamiento.
+    """
+
+    def __init__(self, ai_service, max_workers: int = 4):
+        super().__init__(max_workers, "ai")
+        self.ai_service = ai_service
+
+    async def generate_insights(
+        self,
+        user_id: str,
+        storage,
+        context: Optional[UserDataContext] = None
+    ) -> List[AIInsight]:
+        """Generar insights personalizados para un usuario"""
+        return await self.run(self.ai_service.generate_insights, user_id, storage, context=context)
+
+    async def get_habit_recommendation(self, user_habits: List[str]) -> str:
+        """Recomendar nuevos hábitos basado en los actuales"""
+        return await self.run(self.ai_service.get_habit_recommendation, user_habits)
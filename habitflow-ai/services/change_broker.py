@@ -0,0 +1,128 @@
+from typing import Callable, Dict, Iterable, List, Optional, Set
+import asyncio
+
+
+# Todo lo que puede cambiar cuando no se sabe qué escritura hubo
+ALL_KINDS = frozenset({"user", "habit", "entry"})
+
+
+class Subscription:
+    """Cambios pendientes de enviar a un cliente suscrito a un usuario"""
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        # Versión de datos de lo último enviado (la fija quien consume)
+        self.version: Optional[str] = None
+        self._kinds: Set[str] = set()
+        self._event = asyncio.Event()
+
+    def notify(self, kinds: Iterable[str]):
+        """Anotar cambios (solo desde el bucle de eventos)"""
+        self._kinds.update(kinds)
+        self._event.set()
+
+    async def wait(self, timeout: float, debounce: float = 0) -> Set[str]:
+        """Esperar cambios hasta timeout segundos (vacío si no hubo ninguno)
+
+        Tras el primer aviso espera debounce segundos para juntar en un solo
+        envío las escrituras que llegan en ráfaga.
+        """
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return set()
+        if debounce:
+            await asyncio.sleep(debounce)
+        self._event.clear()
+        kinds, self._kinds = self._kinds, set()
+        return kinds
+
+
+class ChangeBroker:
+    """Reparte los cambios de datos de cada usuario a sus clientes suscritos
+
+    Los listeners del almacenamiento se llaman desde hilos (pools, buffer de
+    escrituras), así que los avisos pasan al bucle de eventos con
+    call_soon_threadsafe. Las escrituras de otros procesos (otros workers,
+    el bot) o hechas a mano en la hoja no llegan por ahí: un vigilante
+    compara cada poll_interval segundos la versión de datos de los usuarios
+    con suscriptores, sin leer nada de Sheets. version_fn debe ver esas
+    escrituras: con SQLite es la versión guardada en la base y con Sheets,
+    la de la caché compartida o la de las recargas de la hoja.
+    """
+
+    def __init__(self, version_fn: Callable[[str], Optional[str]], poll_interval: float = 5):
+        self.version_fn = version_fn
+        self.poll_interval = poll_interval
+        self._subscribers: Dict[str, List[Subscription]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._watcher: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Enlazar con el bucle de eventos actual y arrancar el vigilante"""
+        self._loop = asyncio.get_running_loop()
+        if self.poll_interval > 0:
+            self._watcher = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        """Parar el vigilante"""
+        if self._watcher:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+        self._loop = None
+
+    def subscribe(self, user_id: str) -> Subscription:
+        """Suscribirse a los cambios de un usuario"""
+        subscription = Subscription(str(user_id))
+        self._subscribers.setdefault(subscription.user_id, []).append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Cancelar una suscripción"""
+        subscriptions = self._subscribers.get(subscription.user_id, [])
+        if subscription in subscriptions:
+            subscriptions.remove(subscription)
+        if not subscriptions:
+            self._subscribers.pop(subscription.user_id, None)
+
+    def subscriber_count(self) -> int:
+        """Número de clientes conectados"""
+        return sum(len(subscriptions) for subscriptions in self._subscribers.values())
+
+    def on_storage_change(self, user_id: str, kind: str):
+        """Listener del almacenamiento (se puede llamar desde cualquier hilo)"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self.publish, str(user_id), (kind,))
+
+    def publish(self, user_id: str, kinds: Iterable[str]):
+        """Avisar a los suscriptores de un usuario (solo desde el bucle de eventos)"""
+        for subscription in self._subscribers.get(user_id, ()):
+            subscription.notify(kinds)
+
+    def _versions(self, user_ids: List[str]) -> Dict[str, Optional[str]]:
+        return {user_id: self.version_fn(user_id) for user_id in user_ids}
+
+    async def _watch(self):
+        """Avisar a los suscriptores cuya versión de datos cambió por otra vía"""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            user_ids = list(self._subscribers.keys())
+            if not user_ids:
+                continue
+            try:
+                # La versión se lee del almacén o de la caché compartida
+                versions = await asyncio.to_thread(self._versions, user_ids)
+            except Exception as e:
+                print(f"Error comprobando versiones de datos: {e}")
+                continue
+
+            for user_id, version in versions.items():
+                for subscription in self._subscribers.get(user_id, ()):
+                    if version is not None and version != subscription.version:
+                        subscription.notify(ALL_KINDS)
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import threading
+from models.schemas import UserStats
+from services.entry_store import EntryColumns
+from utils.config import MAX_STATS_DAYS
+
+
+class UserDataContext:
+    """Datos de un usuario compartidos por todos los consumidores de un request
+
+    Cada hoja se consulta como máximo una vez: las entradas se piden para la
+    ventana más amplia que se necesite y las ventanas menores se filtran en
+    memoria. Es seguro usarlo desde varios hilos a la vez: cada dato se
+    carga una sola vez aunque lo pidan en paralelo.
+    """
+
+    def __init__(self, storage, user_id: str, max_days: int = MAX_STATS_DAYS):
+        self.storage = storage
+        self.user_id = user_id
+        self.max_days = max_days
+        self._habits: Optional[List[Dict[str, Any]]] = None
+        self._entries: Optional[List[Tuple[Optional[datetime], Dict[str, Any]]]] = None
+        self._columns: Optional[EntryColumns] = None
+        self._columns_days = 0
+        self._stats: Optional[UserStats] = None
+        # Un lock por dato: las cargas distintas sí van en paralelo
+        self._locks = {name: threading.RLock() for name in ("habits", "entries", "columns", "stats")}
+
+    def habits(self) -> List[Dict[str, Any]]:
+        """Hábitos del usuario (una sola consulta por request)"""
+        with self._locks["habits"]:
+            if self._habits is None:
+                self._habits = self.storage.get_user_habits(self.user_id)
+            return self._habits
+
+    def entries(self, days: int = 30) -> List[Dict[str, Any]]:
+        """Entradas de los últimos N días, filtradas desde la ventana cargada"""
+        with self._locks["entries"]:
+            if self._entries is None or days > self.max_days:
+                self.max_days = max(self.max_days, days)
+                records = self.storage.get_user_entries(self.user_id, days=self.max_days)
+                self._entries = [(self._parse_date(r.get('date')), r) for r in records]
+            entries, max_days = self._entries, self.max_days
+
+        if days >= max_days:
+            return [record for _, record in entries]
+
+        cutoff_date = datetime.now() - timedelta(days=days)
+        return [
+            record for entry_date, record in entries
+            if entry_date is not None and entry_date >= cutoff_date
+        ]
+
+    def columns(self, days: int = 30) -> EntryColumns:
+        """Entradas de los últimos N días en columnas, desde la ventana cargada"""
+        with self._locks["columns"]:
+            if self._columns is None or days > self._columns_days:
+                self._columns_days = max(self.max_days, days)
+                self._columns = self.storage.get_user_entry_columns(self.user_id, days=self._columns_days)
+            columns, columns_days = self._columns, self._columns_days
+
+        if days >= columns_days:
+            return columns
+        return columns.since(datetime.now() - timedelta(days=days))
+
+    def stats(self) -> UserStats:
+        """Estadísticas del usuario calculadas sobre los datos ya cargados"""
+        with self._locks["stats"]:
+            if self._stats is None:
+                self._stats = self.storage.get_user_stats(self.user_id, context=self)
+            return self._stats
+
+    @staticmethod
+    def _parse_date(value: Any) -> Optional[datetime]:
+        """Parsear una fecha ISO (None si está malformada)"""
+        try:
+            return datetime.fromisoformat(str(value))
+        except ValueError:
+            return None
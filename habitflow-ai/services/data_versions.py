@@ -0,0 +1,52 @@
+from collections import defaultdict
+from typing import Callable, Dict, Optional
+import threading
+import uuid
+from services.shared_cache import SharedCache
+
+
+class DataVersions:
+    """Versión de los datos de cada usuario, para validar respuestas cacheadas
+
+    Cada escritura incrementa la versión del usuario; una recarga de la hoja
+    que trae cambios hechos fuera de la aplicación incrementa la generación,
+    que invalida a todos. Si el almacén guarda su propia versión por usuario
+    (SQLite) se usa esa, que incluye las escrituras de cualquier proceso; si
+    no, con caché compartida se usan sus contadores por usuario, así que
+    todos los workers del host calculan la misma versión.
+    """
+
+    def __init__(
+        self,
+        shared_cache: Optional[SharedCache] = None,
+        store_version: Optional[Callable[[str], Optional[int]]] = None
+    ):
+        self.shared_cache = shared_cache
+        self.store_version = store_version
+        self._lock = threading.Lock()
+        self._versions: Dict[str, int] = defaultdict(int)
+        self._generation = 0
+        # Los contadores locales empiezan en 0 en cada arranque
+        self._epoch = uuid.uuid4().hex[:8]
+
+    def on_storage_change(self, user_id: str, kind: str):
+        """Listener del almacenamiento: cualquier escritura cambia la versión"""
+        with self._lock:
+            self._versions[str(user_id)] += 1
+
+    def bump_all(self):
+        """Invalidar las versiones de todos los usuarios"""
+        with self._lock:
+            self._generation += 1
+
+    def version(self, user_id: str) -> Optional[str]:
+        """Versión vigente de los datos de un usuario (None si no se pudo leer)"""
+        user_id = str(user_id)
+        if self.store_version:
+            version = self.store_version(user_id)
+            return None if version is None else f"d{version}.{self._generation}"
+        if self.shared_cache:
+            tag = self.shared_cache.user_tag(user_id)
+            return None if tag is None else f"s{tag}.{self._generation}"
+        with self._lock:
+            return f"{self._epoch}.{self._versions.get(user_id, 0)}.{self._generation}"
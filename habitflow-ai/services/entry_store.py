@@ -0,0 +1,264 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import threading
+import numpy as np
+
+
+def _split_date(value: Any) -> Optional[Tuple[int, int]]:
+    """Ordinal del día y segundo del día de una fecha ISO (None si está malformada)"""
+    if not isinstance(value, datetime):
+        try:
+            value = datetime.fromisoformat(str(value))
+        except ValueError:
+            return None
+    return value.toordinal(), value.hour * 3600 + value.minute * 60 + value.second
+
+
+def _as_flag(value: Any) -> bool:
+    """Interpretar completed ("True"/"False" en Sheets, 0/1 en SQLite)"""
+    return str(value).lower() in ("true", "1")
+
+
+def _as_rating(value: Any) -> int:
+    """Calificación 1-5 (0 si no hay)"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _cut_index(days: np.ndarray, seconds: np.ndarray, cutoff: datetime) -> int:
+    """Primera posición con fecha >= cutoff en columnas ordenadas por fecha"""
+    cut_day, cut_second = _split_date(cutoff)
+    lo = int(np.searchsorted(days, cut_day, side="left"))
+    hi = int(np.searchsorted(days, cut_day, side="right"))
+    return lo + int(np.searchsorted(seconds[lo:hi], cut_second, side="left"))
+
+
+def _localize(codes: np.ndarray, vocabulary: np.ndarray) -> Tuple[np.ndarray, List[str]]:
+    """Recodificar nombres internados a códigos 0..k-1 en orden alfabético"""
+    used, inverse = np.unique(codes, return_inverse=True)
+    names = vocabulary[used]
+    order = np.argsort(names, kind="stable")
+    rank = np.empty(len(order), dtype=np.int32)
+    rank[order] = np.arange(len(order), dtype=np.int32)
+    return rank[inverse].astype(np.int32), [str(name) for name in names[order]]
+
+
+class EntryColumns:
+    """Entradas de un usuario en columnas compactas, ordenadas por fecha
+
+    days son ordinales de día (int32) y seconds el segundo dentro del día;
+    habits son códigos sobre habit_names (alfabético); ratings usa 0 para
+    "sin calificación".
+    """
+
+    __slots__ = ("days", "seconds", "completed", "ratings", "habits", "habit_names")
+
+    def __init__(
+        self,
+        days: np.ndarray,
+        seconds: np.ndarray,
+        completed: np.ndarray,
+        ratings: np.ndarray,
+        habits: np.ndarray,
+        habit_names: List[str]
+    ):
+        self.days = days
+        self.seconds = seconds
+        self.completed = completed
+        self.ratings = ratings
+        self.habits = habits
+        self.habit_names = habit_names
+
+    @classmethod
+    def build(cls, items: Iterable[Tuple[Any, Any, Any, Any]]) -> "EntryColumns":
+        """Construir desde tuplas (date, completed, rating, habit_name)"""
+        days, seconds, completed, ratings, names = [], [], [], [], []
+        for date_value, completed_value, rating, habit_name in items:
+            split = _split_date(date_value)
+            if split is None:
+                continue  # Ignorar fechas malformadas
+            days.append(split[0])
+            seconds.append(split[1])
+            completed.append(_as_flag(completed_value))
+            ratings.append(_as_rating(rating))
+            names.append(str(habit_name))
+
+        days_array = np.array(days, dtype=np.int32)
+        seconds_array = np.array(seconds, dtype=np.int32)
+        order = np.lexsort((seconds_array, days_array))
+        habit_names, habits = np.unique(np.array(names, dtype=object), return_inverse=True)
+        return cls(
+            days_array[order],
+            seconds_array[order],
+            np.array(completed, dtype=np.uint8)[order],
+            np.array(ratings, dtype=np.int8)[order],
+            habits.astype(np.int32)[order],
+            [str(name) for name in habit_names]
+        )
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> "EntryColumns":
+        """Construir desde filas con el formato de la hoja de entradas"""
+        return cls.build(
+            (r.get('date'), r.get('completed'), r.get('rating'), r.get('habit_name'))
+            for r in records
+        )
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def since(self, cutoff: datetime) -> "EntryColumns":
+        """Entradas con fecha >= cutoff (vistas sobre las mismas columnas)"""
+        start = _cut_index(self.days, self.seconds, cutoff)
+        return EntryColumns(
+            self.days[start:], self.seconds[start:], self.completed[start:],
+            self.ratings[start:], self.habits[start:], self.habit_names
+        )
+
+    def completed_count(self) -> int:
+        """Número de entradas completadas"""
+        return int(np.count_nonzero(self.completed))
+
+    @staticmethod
+    def weekday_of(days: np.ndarray) -> np.ndarray:
+        """Día de la semana de ordinales de día (0 = lunes; el ordinal 1 fue lunes)"""
+        return (days.astype(np.int64) - 1) % 7
+
+    def weekdays(self) -> np.ndarray:
+        """Día de la semana de cada entrada (0 = lunes)"""
+        return self.weekday_of(self.days)
+
+    def habit_counts(self) -> np.ndarray:
+        """Número de entradas de cada código de hábito
+
+        habit_names puede incluir hábitos sin entradas (vistas de since).
+        """
+        return np.bincount(self.habits, minlength=len(self.habit_names))
+
+    def idle_habits(self, habits: List[Dict[str, Any]]) -> List[str]:
+        """Hábitos del usuario sin entradas en estas columnas, en orden alfabético"""
+        counts = self.habit_counts()
+        recorded = {self.habit_names[habit] for habit in np.flatnonzero(counts)}
+        return sorted({str(h.get('name', '')) for h in habits} - recorded - {""})
+
+    def last_activity(self) -> Optional[datetime]:
+        """Fecha de la última entrada (al segundo)"""
+        if not len(self.days):
+            return None
+        return datetime.fromordinal(int(self.days[-1])) + timedelta(seconds=int(self.seconds[-1]))
+
+
+class _UserBlock:
+    """Columnas de un usuario con capacidad de reserva para agregar sin copiar"""
+
+    __slots__ = ("size", "days", "seconds", "completed", "ratings", "habits")
+
+    def __init__(self, capacity: int = 16):
+        self.size = 0
+        self.days = np.empty(capacity, dtype=np.int32)
+        self.seconds = np.empty(capacity, dtype=np.int32)
+        self.completed = np.empty(capacity, dtype=np.uint8)
+        self.ratings = np.empty(capacity, dtype=np.int8)
+        self.habits = np.empty(capacity, dtype=np.int32)
+
+    def _columns(self) -> Tuple[np.ndarray, ...]:
+        return self.days, self.seconds, self.completed, self.ratings, self.habits
+
+    def append(self, day: int, second: int, completed: bool, rating: int, habit: int):
+        """Agregar una entrada manteniendo el orden por fecha"""
+        if self.size == len(self.days):
+            for name, column in zip(self.__slots__[1:], self._columns()):
+                grown = np.empty(max(16, 2 * len(column)), dtype=column.dtype)
+                grown[:self.size] = column[:self.size]
+                setattr(self, name, grown)
+
+        size = self.size
+        position = size
+        if size and (day, second) < (int(self.days[size - 1]), int(self.seconds[size - 1])):
+            # Entrada con fecha anterior a la última: insertar en su sitio
+            lo = int(np.searchsorted(self.days[:size], day, side="left"))
+            hi = int(np.searchsorted(self.days[:size], day, side="right"))
+            position = lo + int(np.searchsorted(self.seconds[lo:hi], second, side="right"))
+            for column in self._columns():
+                column[position + 1:size + 1] = column[position:size]
+
+        self.days[position] = day
+        self.seconds[position] = second
+        self.completed[position] = completed
+        self.ratings[position] = rating
+        self.habits[position] = habit
+        self.size = size + 1
+
+
+class EntryStore:
+    """Hoja de entradas completa en columnas por usuario
+
+    Los IDs de usuario y los nombres de hábito se internan: cada entrada
+    ocupa 14 bytes en lugar de un dict con seis cadenas.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._users: Dict[str, _UserBlock] = {}
+        self._habit_codes: Dict[str, int] = {}
+        self._habit_names: List[str] = []
+        self._vocabulary: Optional[np.ndarray] = None
+
+    def _habit_code(self, habit_name: Any) -> int:
+        """Código internado de un nombre de hábito"""
+        name = str(habit_name)
+        code = self._habit_codes.get(name)
+        if code is None:
+            code = len(self._habit_names)
+            self._habit_codes[name] = code
+            self._habit_names.append(name)
+            self._vocabulary = None
+        return code
+
+    def load(self, records: Iterable[Dict[str, Any]]):
+        """Reconstruir desde la hoja completa"""
+        with self._lock:
+            self._users = {}
+            for record in records:
+                self._add(record)
+
+    def add(self, record: Dict[str, Any]):
+        """Agregar una entrada recién escrita"""
+        with self._lock:
+            self._add(record)
+
+    def _add(self, record: Dict[str, Any]):
+        split = _split_date(record.get('date'))
+        if split is None:
+            return  # Ignorar fechas malformadas
+
+        user_id = str(record['user_id'])
+        block = self._users.get(user_id)
+        if block is None:
+            block = _UserBlock()
+            self._users[user_id] = block
+        block.append(
+            split[0], split[1], _as_flag(record.get('completed')),
+            _as_rating(record.get('rating')), self._habit_code(record.get('habit_name'))
+        )
+
+    def columns(self, user_id: str, since: Optional[datetime] = None) -> EntryColumns:
+        """Copia de las columnas de un usuario, opcionalmente desde una fecha"""
+        with self._lock:
+            block = self._users.get(user_id)
+            if block is None:
+                return EntryColumns.build(())
+
+            size = block.size
+            start = _cut_index(block.days[:size], block.seconds[:size], since) if since else 0
+            days, seconds, completed, ratings, codes = (
+                column[start:size].copy() for column in block._columns()
+            )
+            if self._vocabulary is None:
+                self._vocabulary = np.array(self._habit_names, dtype=object)
+            vocabulary = self._vocabulary
+
+        habits, habit_names = _localize(codes, vocabulary)
+        return EntryColumns(days, seconds, completed, ratings, habits, habit_names)
@@ -0,0 +1,53 @@
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from models.schemas import AIInsight
+import threading
+import time
+
+
+class InsightCache:
+    """Caché LRU con TTL de insights por usuario
+
+    Cada entrada guarda la huella de los datos con que se generó: si los
+    hábitos o entradas del usuario cambian, la huella deja de coincidir y
+    el insight se vuelve a generar.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[str, float, List[AIInsight]]]" = OrderedDict()
+
+    def get(self, user_id: str, fingerprint: str) -> Optional[List[AIInsight]]:
+        """Insights en caché si siguen vigentes para esos datos"""
+        with self._lock:
+            cached = self._entries.get(user_id)
+            if cached is None:
+                return None
+
+            cached_fingerprint, expires_at, insights = cached
+            if cached_fingerprint != fingerprint or expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+
+            self._entries.move_to_end(user_id)
+            return list(insights)
+
+    def set(self, user_id: str, fingerprint: str, insights: List[AIInsight]):
+        """Guardar insights generados para una huella de datos"""
+        with self._lock:
+            self._entries[user_id] = (fingerprint, time.monotonic() + self.ttl, list(insights))
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        """Descartar los insights de un usuario"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def on_storage_change(self, user_id: str, kind: str):
+        """Listener del almacenamiento: invalidar al cambiar hábitos o entradas"""
+        if kind in ("habit", "entry"):
+            self.invalidate(user_id)
@@ -0,0 +1,106 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time as day_time
+from typing import Dict, List, Optional, Tuple
+import threading
+from services.ai_service import AIAnalysisService
+from services.data_context import UserDataContext
+from services.rate_limit import TokenBucket
+from services.storage import StorageBackend
+
+
+def parse_window(window: str) -> Optional[Tuple[day_time, day_time]]:
+    """Leer una ventana "HH:MM-HH:MM" (None si está vacía: siempre abierta)"""
+    if not window.strip():
+        return None
+    try:
+        start, end = (day_time.fromisoformat(part.strip()) for part in window.split("-"))
+    except ValueError as e:
+        raise ValueError(f"Ventana horaria inválida: {window!r} (formato HH:MM-HH:MM)") from e
+    return start, end
+
+
+class InsightScheduler:
+    """Precalcula los insights de los usuarios cuyos datos cambiaron
+
+    Cada pasada compara la huella de los datos de cada usuario con la de
+    sus últimos insights guardados y regenera solo los distintos, en lotes
+    de varios usuarios por llamada (generate_insights_batch), con un número
+    máximo de lotes a la vez y un presupuesto de llamadas por minuto al
+    modelo. Solo trabaja dentro de la ventana horaria; si se cierra a
+    mitad de pasada, el resto queda para la siguiente.
+    """
+
+    def __init__(
+        self,
+        storage: StorageBackend,
+        ai_service: AIAnalysisService,
+        window: Optional[Tuple[day_time, day_time]] = None,
+        concurrency: int = 2,
+        rate_per_minute: float = 10,
+        interval: float = 600
+    ):
+        if ai_service.insight_store is None:
+            raise ValueError("El planificador necesita INSIGHT_STORE_PATH configurado")
+        self.storage = storage
+        self.ai_service = ai_service
+        self.window = window
+        self.concurrency = concurrency
+        self.interval = interval
+        self.budget = TokenBucket(rate_per_minute / 60.0, capacity=max(1.0, float(concurrency)))
+        # Todas las llamadas al modelo de este proceso cuentan contra el presupuesto
+        self.ai_service.call_budget = self.budget
+        self._stop = threading.Event()
+
+    def in_window(self, now: Optional[datetime] = None) -> bool:
+        """Si ahora se puede trabajar (las ventanas pueden cruzar la medianoche)"""
+        if self.window is None:
+            return True
+        current = (now or datetime.now()).time()
+        start, end = self.window
+        if start <= end:
+            return start <= current < end
+        return current >= start or current < end
+
+    def pending_users(self) -> List[str]:
+        """Usuarios con entradas cuyos datos cambiaron desde sus últimos insights"""
+        stored = self.ai_service.insight_store.fingerprints()
+        pending = []
+        for user_id in self.storage.get_user_ids():
+            context = UserDataContext(self.storage, user_id)
+            fingerprint = self.ai_service.insights_fingerprint(context)
+            if fingerprint is not None and stored.get(user_id) != fingerprint:
+                pending.append(user_id)
+        return pending
+
+    def _refresh(self, user_ids: List[str]) -> int:
+        """Regenerar los insights de un lote (0 si la ventana ya se cerró)"""
+        if self._stop.is_set() or not self.in_window():
+            return 0
+        return len(self.ai_service.generate_insights_batch(user_ids, self.storage))
+
+    def run_once(self) -> Dict[str, int]:
+        """Una pasada sobre los usuarios pendientes"""
+        pending = self.pending_users()
+        size = self.ai_service.batch_size
+        batches = [pending[start:start + size] for start in range(0, len(pending), size)]
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="insights") as pool:
+            done = sum(pool.map(self._refresh, batches))
+        return {"pending": len(pending), "refreshed": done}
+
+    def run_forever(self):
+        """Ejecutar pasadas cada interval segundos hasta stop()"""
+        while not self._stop.is_set():
+            if self.in_window():
+                try:
+                    result = self.run_once()
+                    print(
+                        f"Insights precalculados: {result['refreshed']} "
+                        f"de {result['pending']} usuarios pendientes"
+                    )
+                except Exception as e:
+                    print(f"Error precalculando insights: {e}")
+            self._stop.wait(self.interval)
+
+    def stop(self):
+        """Terminar tras las generaciones en curso"""
+        self._stop.set()
@@ -0,0 +1,100 @@
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+import json
+import sqlite3
+import threading
+from models.schemas import AIInsight
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS insights (
+    user_id TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    generated_at TEXT NOT NULL,
+    payload TEXT NOT NULL
+);
+"""
+
+
+class StoredInsights(NamedTuple):
+    fingerprint: str
+    generated_at: datetime
+    insights: List[AIInsight]
+
+
+class InsightStore:
+    """Últimos insights generados de cada usuario, persistidos en SQLite
+
+    Lo escriben el planificador de insights y las generaciones bajo demanda,
+    y lo leen la API y el bot de cualquier proceso: guarda la huella de los
+    datos con que se generó cada resultado.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._initialize_schema()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Conexión propia de cada hilo"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _initialize_schema(self):
+        """Crear tablas si no existen"""
+        try:
+            self._connection().executescript(SCHEMA)
+        except Exception as e:
+            print(f"Error inicializando almacén de insights: {e}")
+            raise
+
+    def get(self, user_id: str) -> Optional[StoredInsights]:
+        """Últimos insights guardados de un usuario"""
+        try:
+            row = self._connection().execute(
+                "SELECT fingerprint, generated_at, payload FROM insights WHERE user_id = ?",
+                (user_id,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error leyendo insights guardados: {e}")
+            return None
+
+        if row is None:
+            return None
+        return StoredInsights(
+            row[0],
+            datetime.fromisoformat(row[1]),
+            [AIInsight(**item) for item in json.loads(row[2])]
+        )
+
+    def save(self, user_id: str, fingerprint: str, insights: List[AIInsight]):
+        """Guardar los insights generados para una huella de datos"""
+        payload = json.dumps([insight.model_dump(mode="json") for insight in insights])
+        try:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO insights (user_id, fingerprint, generated_at, payload) "
+                "VALUES (?, ?, ?, ?)",
+                (user_id, fingerprint, datetime.now().isoformat(), payload)
+            )
+        except sqlite3.Error as e:
+            print(f"Error guardando insights: {e}")
+
+    def fingerprints(self) -> Dict[str, str]:
+        """Huella de los datos de los últimos insights de cada usuario"""
+        try:
+            rows = self._connection().execute("SELECT user_id, fingerprint FROM insights").fetchall()
+        except sqlite3.Error as e:
+            print(f"Error leyendo insights guardados: {e}")
+            return {}
+        return dict(rows)
+
+    def close(self):
+        """Cerrar la conexión del hilo actual"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
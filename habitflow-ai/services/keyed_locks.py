@@ -0,0 +1,31 @@
+from contextlib import contextmanager
+from typing import Dict, Hashable, List
+import threading
+
+
+class KeyedLocks:
+    """Locks por clave, creados bajo demanda y liberados al dejar de usarse"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # clave -> [lock, número de hilos que lo usan]
+        self._locks: Dict[Hashable, List] = {}
+
+    @contextmanager
+    def hold(self, key: Hashable):
+        """Ejecutar el bloque con la clave bloqueada dentro del proceso"""
+        with self._lock:
+            slot = self._locks.get(key)
+            if slot is None:
+                slot = [threading.Lock(), 0]
+                self._locks[key] = slot
+            slot[1] += 1
+
+        try:
+            with slot[0]:
+                yield
+        finally:
+            with self._lock:
+                slot[1] -= 1
+                if slot[1] == 0:
+                    del self._locks[key]
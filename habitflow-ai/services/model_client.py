@@ -0,0 +1,199 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional
+import random
+import threading
+import time
+from google.api_core import exceptions as api_exceptions
+from services.ai_metrics import AIUsageMetrics
+
+
+class ModelTimeoutError(Exception):
+    """La llamada al modelo superó su plazo"""
+
+
+class ModelUnavailableError(Exception):
+    """El circuito está abierto: no se llama al modelo"""
+
+
+# Errores transitorios del modelo: se reintentan y cuentan para el circuito
+RETRYABLE_ERRORS = (
+    ModelTimeoutError,
+    OSError,  # Conexión rechazada o cortada, timeouts de socket
+    api_exceptions.TooManyRequests,
+    api_exceptions.ResourceExhausted,
+    api_exceptions.ServerError,
+)
+
+
+class CircuitBreaker:
+    """Circuito cerrado / abierto / semiabierto ante fallos seguidos del modelo
+
+    Tras failure_threshold fallos transitorios seguidos se abre y rechaza
+    las llamadas durante reset_timeout segundos; después deja pasar una
+    llamada de prueba (semiabierto) que lo cierra si sale bien o lo vuelve
+    a abrir si falla.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        on_state_change: Optional[Callable[[str], None]] = None
+    ):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.on_state_change = on_state_change
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def _set_state(self, state: str):
+        if state != self._state:
+            self._state = state
+            if self.on_state_change:
+                self.on_state_change(state)
+
+    def allow(self) -> bool:
+        """Si se puede llamar al modelo (en semiabierto, solo una llamada a la vez)"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._set_state(self.HALF_OPEN)
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        """El modelo respondió (también con un error no transitorio)"""
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        """Fallo transitorio: abre el circuito al llegar al umbral o en la prueba"""
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._probing = False
+                self._set_state(self.OPEN)
+
+
+class ResilientModelClient:
+    """Llamadas a generate_content con plazo, reintentos y circuito
+
+    Cada intento tiene un plazo de timeout segundos y la llamada completa,
+    reintentos incluidos, nunca pasa de deadline: el intento se ejecuta en
+    un hilo propio y se abandona al vencer el plazo, aunque la librería no
+    lo respete. Los errores transitorios se reintentan hasta max_attempts
+    veces con espera exponencial con jitter; los demás se propagan sin
+    reintentar. Con el circuito abierto se lanza ModelUnavailableError sin
+    llamar al modelo.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 6.0,
+        deadline: float = 10.0,
+        max_attempts: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 4.0,
+        breaker: Optional[CircuitBreaker] = None,
+        metrics: Optional[AIUsageMetrics] = None,
+        max_workers: int = 8
+    ):
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.metrics = metrics or AIUsageMetrics()
+        self.breaker = breaker or CircuitBreaker()
+        if self.breaker.on_state_change is None:
+            self.breaker.on_state_change = lambda state: self.metrics.increment(f"breaker_{state}")
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="model")
+
+    def generate(self, model: Any, prompt: str) -> Any:
+        """Llamar a model.generate_content y devolver la respuesta"""
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self.metrics.increment("short_circuited")
+                raise ModelUnavailableError("Circuito abierto: el modelo está degradado")
+            attempt += 1
+            self.metrics.increment("attempts")
+            timeout = min(self.timeout, deadline - time.monotonic())
+            attempt_started = time.monotonic()
+            try:
+                response = self._call(model, prompt, timeout)
+            except RETRYABLE_ERRORS as e:
+                self.breaker.record_failure()
+                self.metrics.increment("timeouts" if isinstance(e, ModelTimeoutError) else "transient_errors")
+                self.metrics.record_latency(time.monotonic() - attempt_started)
+                wait = self._backoff(attempt)
+                if attempt >= self.max_attempts or time.monotonic() + wait >= deadline:
+                    self.metrics.increment("failures")
+                    raise
+                self.metrics.increment("retries")
+                time.sleep(wait)
+                continue
+            except Exception:
+                # Error no transitorio (petición inválida, credenciales...): el
+                # modelo responde, así que no cuenta contra el circuito
+                self.breaker.record_success()
+                self.metrics.increment("failures")
+                raise
+            self.breaker.record_success()
+            self.metrics.increment("successes")
+            self.metrics.record_latency(time.monotonic() - attempt_started)
+            return response
+
+    def _call(self, model: Any, prompt: str, timeout: float) -> Any:
+        """Un intento con plazo (ModelTimeoutError si vence)
+
+        Los reintentos propios de la librería se desactivan: los hace generate.
+        """
+        future = self._executor.submit(
+            model.generate_content, prompt, request_options={"timeout": timeout, "retry": None}
+        )
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise ModelTimeoutError(f"Sin respuesta del modelo en {timeout:.1f}s") from None
+
+    def _backoff(self, attempt: int) -> float:
+        """Espera antes del siguiente intento (jitter completo)"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Estado del circuito y configuración de plazos"""
+        return {
+            "breaker_state": self.breaker.state,
+            "timeout": self.timeout,
+            "deadline": self.deadline,
+            "max_attempts": self.max_attempts,
+        }
+
+    def shutdown(self):
+        """Detener el pool de hilos de las llamadas"""
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,61 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import base64
+import bisect
+import json
+
+
+def encode_cursor(payload: Dict[str, Any]) -> str:
+    """Cursor opaco para la siguiente página"""
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Leer un cursor de encode_cursor (ValueError si está malformado)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Cursor inválido") from e
+    if not isinstance(payload, dict):
+        raise ValueError("Cursor inválido")
+    return payload
+
+
+def paginate_sorted(
+    dates: List[datetime],
+    entries: List[Dict[str, Any]],
+    since: datetime,
+    until: Optional[datetime] = None,
+    limit: int = 1000,
+    cursor: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Página de entradas ya ordenadas por fecha con since <= fecha < until
+
+    El cursor guarda la fecha de la siguiente entrada y cuántas entradas con
+    esa misma fecha la preceden, así que sigue siendo válido aunque se
+    agreguen entradas en otras fechas. Coste O(log n + limit).
+    """
+    start = bisect.bisect_left(dates, since)
+    if cursor:
+        payload = decode_cursor(cursor)
+        try:
+            resume_date = datetime.fromisoformat(payload["d"])
+            offset = int(payload["o"])
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError("Cursor inválido") from e
+        start = max(start, bisect.bisect_left(dates, resume_date) + offset)
+
+    end = bisect.bisect_left(dates, until) if until else len(dates)
+    stop = max(start, min(end, start + limit))
+    page = entries[start:stop]
+
+    next_cursor = None
+    if stop < end:
+        next_date = dates[stop]
+        next_cursor = encode_cursor({
+            "d": next_date.isoformat(),
+            "o": stop - bisect.bisect_left(dates, next_date)
+        })
+    return page, next_cursor
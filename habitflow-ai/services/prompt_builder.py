@@ -0,0 +1,143 @@
+"""
+Prompts compactos para los insights
+
+Las instrucciones fijas (rol, criterios y formato de respuesta) se envían
+aparte, como system_instruction del modelo, y no se repiten en cada prompt.
+Cada usuario aporta un resumen estructurado que nunca pasa de un
+presupuesto de tokens.
+"""
+from datetime import date
+from typing import Dict, List, Optional
+import math
+import numpy as np
+from models.schemas import HabitAnalytics, UserStats
+from services.entry_store import EntryColumns
+from utils.analytics import analyze_user
+
+
+INSIGHT_INSTRUCTIONS = """Eres un coach experto en hábitos. Analiza los datos del usuario y da 3-4 insights útiles y motivadores: específicos, personales, accionables, realistas y basados en los patrones observados. Tono positivo y constructivo, con emojis apropiados.
+
+Formato de los datos: tasas en % de registros completados (entre paréntesis, número de registros); tendencia en puntos frente a los 7 días anteriores; semana L M X J V S D, "-" si no hay registros.
+
+Responde SOLO con JSON: [{"insight": "texto", "category": "motivation|improvement|pattern|achievement", "confidence": 0.0-1.0}]
+Si hay varios usuarios (secciones "### clave"), responde un objeto con la lista de cada uno: {"u1": [...], "u2": [...]}"""
+
+WEEKDAY_LETTERS = "LMXJVSD"
+
+
+def estimate_tokens(text: str) -> int:
+    """Tokens aproximados de un texto (unos 4 caracteres por token)"""
+    return max(1, math.ceil(len(text) / 4))
+
+
+def _percent(completed: float, total: float) -> str:
+    return f"{completed / total:.0%}" if total else "-"
+
+
+class InsightPromptBuilder:
+    """Resúmenes de usuario para el prompt con un presupuesto de tokens
+
+    El presupuesto es estricto y cuenta todo el resumen. Las líneas van por
+    prioridad: totales y rachas primero; después hábitos sin registros,
+    tasas por hábito, semana y la matriz hábito × día de la semana. En las
+    listas por hábito (primero los hábitos con más registros) entran los
+    elementos que quepan.
+    """
+
+    def __init__(self, token_budget: int = 200):
+        self.token_budget = token_budget
+
+    def user_summary(
+        self,
+        habits: List[Dict],
+        columns: EntryColumns,
+        stats: UserStats,
+        today: Optional[int] = None,
+        analytics: Optional[HabitAnalytics] = None
+    ) -> str:
+        """Resumen de los últimos 30 días de un usuario
+
+        analytics evita recalcular las analíticas si ya se tienen (lotes).
+        """
+        if today is None:
+            today = date.today().toordinal()
+        if analytics is None:
+            analytics = analyze_user(stats.user_id, columns, today=today)
+        done = columns.completed.astype(bool)
+
+        # Tendencia: últimos 7 días frente a los 7 anteriores
+        previous = (columns.days >= today - 13) & (columns.days < today - 6)
+        previous_total = int(np.count_nonzero(previous))
+        trend = ""
+        if previous_total:
+            change = analytics.rolling_7d_rate - np.count_nonzero(done & previous) / previous_total
+            trend = f", tendencia {change * 100:+.0f}pp"
+
+        required = [
+            f"30d: {_percent(columns.completed_count(), len(columns))} ({len(columns)}); "
+            f"7d: {analytics.rolling_7d_rate:.0%}{trend}",
+            f"racha: actual {stats.streak_days}, mejor {analytics.longest_streak}",
+        ]
+
+        # Registros por hábito y por día de la semana
+        n_habits = len(columns.habit_names)
+        cells = columns.habits.astype(np.int64) * 7 + columns.weekdays()
+        totals = np.bincount(cells, minlength=n_habits * 7).reshape(n_habits, 7)
+        completed = np.bincount(cells, weights=done, minlength=n_habits * 7).reshape(n_habits, 7)
+        habit_totals = columns.habit_counts()
+        order = [h for h in np.argsort(-habit_totals, kind="stable") if habit_totals[h]]
+
+        lines: List[str] = []
+        for line in required:
+            if not self._add(lines, line):
+                # Presupuesto menor que las líneas obligatorias: se recorta la que no cabe
+                room = self.token_budget * 4 - len("\n".join(lines + [""]))
+                if room > 0:
+                    lines.append(line[:room])
+                return "\n".join(lines)
+
+        self._add_items(lines, "sin registros: ", columns.idle_habits(habits))
+        self._add_items(lines, "por hábito: ", [
+            f"{columns.habit_names[h]} {_percent(completed[h].sum(), totals[h].sum())} ({int(totals[h].sum())})"
+            for h in order
+        ])
+        self._add(lines, "semana: " + self._week_row(completed.sum(axis=0), totals.sum(axis=0)))
+        if len(order) > 1:
+            for h in order:
+                if not self._add(lines, f"{columns.habit_names[h]}: {self._week_row(completed[h], totals[h])}"):
+                    break
+        return "\n".join(lines)
+
+    def _add(self, lines: List[str], line: str) -> bool:
+        """Añadir una línea si el resumen sigue dentro del presupuesto"""
+        if estimate_tokens("\n".join(lines + [line])) > self.token_budget:
+            return False
+        lines.append(line)
+        return True
+
+    def _add_items(self, lines: List[str], prefix: str, items: List[str]):
+        """Añadir una línea con los primeros elementos que quepan (ninguno: sin línea)"""
+        fitted = 0
+        while fitted < len(items) and estimate_tokens(
+            "\n".join(lines + [prefix + ", ".join(items[:fitted + 1])])
+        ) <= self.token_budget:
+            fitted += 1
+        if fitted:
+            lines.append(prefix + ", ".join(items[:fitted]))
+
+    @staticmethod
+    def _week_row(completed: np.ndarray, totals: np.ndarray) -> str:
+        return " ".join(
+            f"{letter}{_percent(completed[day], totals[day]).rstrip('%')}"
+            for day, letter in enumerate(WEEKDAY_LETTERS)
+        )
+
+    def single_prompt(self, summary: str) -> str:
+        """Prompt de un usuario (las instrucciones van como system_instruction)"""
+        return summary
+
+    def batch_prompt(self, summaries: List[str]) -> str:
+        """Prompt con varios usuarios, con claves u1, u2..."""
+        return "\n\n".join(
+            f"### u{position}\n{summary}" for position, summary in enumerate(summaries, 1)
+        )
@@ -0,0 +1,50 @@
+from typing import Optional
+import threading
+import time
+
+
+class TokenBucket:
+    """Cubo de tokens compartido entre hilos
+
+    Se rellena a rate tokens por segundo hasta capacity; cada llamada
+    consume un token y espera si no queda ninguno.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError(f"La tasa del cubo de tokens debe ser mayor que 0 (recibido {rate})")
+        if capacity is not None and capacity <= 0:
+            raise ValueError(f"La capacidad del cubo de tokens debe ser mayor que 0 (recibido {capacity})")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """Consumir tokens si los hay; si no, segundos hasta que los haya"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1, timeout: Optional[float] = None) -> bool:
+        """Esperar a tener tokens (False si se agota el timeout)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
@@ -0,0 +1,203 @@
+"""
+Insights calculados localmente a partir de las analíticas
+
+Salen de las mismas métricas del dashboard sin llamar a la red: rachas e
+hitos, ritmo de la semana frente a la anterior, hábitos en retroceso,
+mejor/peor día de la semana, hábito más constante, racha por hábito y
+hábitos sin registros,
+además de recomendaciones de hábitos nuevos a partir de un catálogo.
+Son el primer nivel de insights (INSIGHTS_ENGINE=rules o hybrid) y el
+respaldo cuando el modelo está degradado.
+"""
+from datetime import date
+from typing import Dict, List, Optional
+import numpy as np
+from models.schemas import AIInsight, HabitAnalytics, UserStats
+from services.entry_store import EntryColumns
+from utils.analytics import analyze_user, best_and_worst_weekday
+from utils.config import WEEKDAY_NAMES
+from utils.helpers import generate_streak_message, get_motivational_emoji
+from utils.streaks import habit_streaks
+
+
+_WEEKDAYS_ES = dict(zip(
+    WEEKDAY_NAMES, ["lunes", "martes", "miércoles", "jueves", "viernes", "sábado", "domingo"]
+))
+
+STREAK_MILESTONES = (7, 14, 21, 30, 50, 100, 200, 365)
+
+# Hábitos para recomendar, en orden: palabras que indican que ya se tiene y sugerencia
+RECOMMENDATIONS = [
+    (("agua", "hidrat"), "💧 Beber 8 vasos de agua al día: el hábito más fácil de sumar a tu rutina."),
+    (("camin", "correr", "ejercicio", "deporte", "gym", "entren"),
+     "🚶‍♂️ Caminar 20 minutos al día: más energía sin necesitar equipo."),
+    (("medit", "mindful", "respir"), "🧘‍♂️ 5 minutos de meditación diaria: te ayuda a sostener el resto de hábitos."),
+    (("dormir", "sueño", "acostar"), "😴 Acostarte a la misma hora cada noche: descansar bien hace todo más fácil."),
+    (("leer", "lectura", "libro"), "📚 Leer 10 páginas antes de dormir: un cierre del día sin pantallas."),
+    (("diario", "escrib", "gratitud", "agradec"), "📝 Anotar 3 cosas por las que estás agradecido cada noche."),
+    (("estir", "yoga"), "🤸 Estirar 5 minutos al levantarte: despierta el cuerpo en un momento."),
+]
+
+
+class RuleInsightEngine:
+    """Insights deterministas a partir de las entradas de los últimos 30 días
+
+    Cada regla aporta como mucho un insight; se devuelven por prioridad
+    (racha, retrocesos, semana, día de la semana, hábito más constante,
+    racha por hábito, hábitos olvidados) hasta max_insights.
+    """
+
+    def __init__(
+        self,
+        max_insights: int = 4,
+        decline_threshold: float = 0.25,
+        min_habit_entries: int = 5,
+        min_habit_streak: int = 5
+    ):
+        self.max_insights = max_insights
+        self.decline_threshold = decline_threshold
+        self.min_habit_entries = min_habit_entries
+        self.min_habit_streak = min_habit_streak
+
+    def insights(
+        self,
+        user_id: str,
+        habits: List[Dict],
+        columns: EntryColumns,
+        stats: UserStats,
+        today: Optional[int] = None
+    ) -> List[AIInsight]:
+        """Insights de un usuario (columns: entradas de los últimos 30 días)"""
+        if today is None:
+            today = date.today().toordinal()
+        analytics = analyze_user(user_id, columns, today=today)
+        weekly = self._weekly_rates(columns, today)
+
+        candidates = [
+            self._streak(stats.streak_days, analytics),
+            self._declining_habit(columns, weekly),
+            self._week(analytics, weekly),
+            self._weekday(analytics),
+            self._best_habit(analytics, columns),
+            self._habit_streak(columns, today),
+            self._idle_habits(habits, columns),
+        ]
+        return [
+            AIInsight(user_id=user_id, insight=text, category=category, confidence=confidence)
+            for text, category, confidence in filter(None, candidates)
+        ][:self.max_insights]
+
+    @staticmethod
+    def recommendation(habit_names: List[str]) -> str:
+        """Primer hábito del catálogo que el usuario aún no tiene"""
+        names = " ".join(habit_names).lower()
+        for keywords, text in RECOMMENDATIONS:
+            if not any(keyword in names for keyword in keywords):
+                return text
+        return "🌟 Ya tienes una rutina muy completa. ¡Sube un poco la meta de tu hábito más constante!"
+
+    @staticmethod
+    def _weekly_rates(columns: EntryColumns, today: int) -> Dict[str, np.ndarray]:
+        """Registros y completados por hábito en los últimos 7 días y los 7 anteriores"""
+        n_habits = len(columns.habit_names)
+        done = columns.completed.astype(bool)
+        rates = {}
+        for name, window in (
+            ("current", columns.days > today - 7),
+            ("previous", (columns.days > today - 14) & (columns.days <= today - 7)),
+        ):
+            habits = columns.habits[window]
+            rates[f"{name}_total"] = np.bincount(habits, minlength=n_habits)
+            rates[f"{name}_done"] = np.bincount(habits[done[window]], minlength=n_habits)
+        return rates
+
+    @staticmethod
+    def _streak(streak_days: int, analytics: HabitAnalytics):
+        if streak_days in STREAK_MILESTONES:
+            return f"🎉 ¡Hito alcanzado: {streak_days} días seguidos! {generate_streak_message(streak_days)}", "achievement", 1.0
+        if streak_days >= 3 and streak_days >= analytics.longest_streak:
+            return f"{generate_streak_message(streak_days)} Es tu mejor racha del último mes.", "achievement", 0.95
+        return generate_streak_message(streak_days), "achievement" if streak_days >= 7 else "motivation", 0.9
+
+    def _declining_habit(self, columns: EntryColumns, weekly: Dict[str, np.ndarray]):
+        """El hábito que más cayó frente a la semana anterior (con al menos 2 registros en cada una)"""
+        current_total, previous_total = weekly["current_total"], weekly["previous_total"]
+        comparable = (current_total >= 2) & (previous_total >= 2)
+        if not comparable.any():
+            return None
+        current = weekly["current_done"] / np.maximum(current_total, 1)
+        previous = weekly["previous_done"] / np.maximum(previous_total, 1)
+        drop = np.where(comparable, previous - current, 0.0)
+        habit = int(np.argmax(drop))
+        if drop[habit] < self.decline_threshold:
+            return None
+        return (
+            f"📉 {columns.habit_names[habit]} bajó del {previous[habit]:.0%} al {current[habit]:.0%} "
+            f"esta semana. ¿Qué cambió? Retómalo con una versión más pequeña.",
+            "improvement",
+            0.85
+        )
+
+    @staticmethod
+    def _week(analytics: HabitAnalytics, weekly: Dict[str, np.ndarray]):
+        rate = analytics.rolling_7d_rate
+        text = f"{get_motivational_emoji(rate)} Esta semana completaste el {rate:.0%} de tus registros"
+        previous_total = weekly["previous_total"].sum()
+        if previous_total:
+            change = rate - weekly["previous_done"].sum() / previous_total
+            if abs(change) >= 0.05:
+                text += f" ({change * 100:+.0f} puntos frente a la anterior)"
+                if change <= -0.15:
+                    return text + ". ¡Aún estás a tiempo de remontar!", "improvement", 0.9
+        return text + ".", "pattern", 0.9
+
+    @staticmethod
+    def _weekday(analytics: HabitAnalytics):
+        best, worst = best_and_worst_weekday(analytics)
+        if not best or best == worst:
+            return None
+        rates = analytics.weekday_rates
+        if rates[best] - rates[worst] < 0.2:
+            return None
+        return (
+            f"📅 Tu mejor día es el {_WEEKDAYS_ES[best]} ({rates[best]:.0%}) "
+            f"y el más difícil, el {_WEEKDAYS_ES[worst]} ({rates[worst]:.0%}). "
+            f"¡Prepáralo con antelación!",
+            "pattern",
+            0.8
+        )
+
+    def _best_habit(self, analytics: HabitAnalytics, columns: EntryColumns):
+        if len(analytics.habit_rates) < 2:
+            return None
+        totals = dict(zip(columns.habit_names, columns.habit_counts()))
+        eligible = {
+            name: rate for name, rate in analytics.habit_rates.items()
+            if totals.get(name, 0) >= self.min_habit_entries
+        }
+        if not eligible:
+            return None
+        habit = max(eligible, key=eligible.get)
+        if eligible[habit] < 0.8:
+            return None
+        return f"🏆 {habit} es tu hábito más constante ({eligible[habit]:.0%}). ¡Úsalo de ancla para los demás!", "achievement", 0.85
+
+    def _habit_streak(self, columns: EntryColumns, today: int):
+        """El hábito con la racha actual más larga (con al menos min_habit_streak días)"""
+        streaks = habit_streaks(columns, today)
+        if len(streaks) < 2:
+            return None  # Con un solo hábito coincide con la racha general
+        habit = max(streaks, key=lambda name: streaks[name][0])
+        current, longest = streaks[habit]
+        if current < self.min_habit_streak:
+            return None
+        if current >= longest:
+            return f"🔗 {habit} lleva {current} días seguidos, su mejor racha del mes. ¡No rompas la cadena!", "achievement", 0.8
+        return f"🔗 {habit} lleva {current} días seguidos (su récord del mes es {longest}). ¡Sigue así!", "motivation", 0.8
+
+    @staticmethod
+    def _idle_habits(habits: List[Dict], columns: EntryColumns):
+        idle = columns.idle_habits(habits)
+        if not idle:
+            return None
+        return f"💤 No has registrado {', '.join(idle)} en el último mes. ¿Sigue siendo una meta para ti?", "improvement", 0.7
@@ -0,0 +1,157 @@
+from typing import Any, Callable, Optional
+import pickle
+import sqlite3
+import threading
+import time
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_versions (
+    scope TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS cache_entries (
+    key TEXT PRIMARY KEY,
+    tag TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    value BLOB NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_cache_entries_expires ON cache_entries (expires_at);
+"""
+
+# Cada cuántas escrituras se borran las entradas caducadas
+PURGE_EVERY = 200
+
+
+class SharedCache:
+    """Caché compartida por todos los workers de un host sobre un fichero SQLite
+
+    Cada valor se guarda con una etiqueta de versión y solo se sirve si la
+    etiqueta sigue siendo la vigente. Los contadores de versión (por hoja y
+    por usuario) viven en el mismo fichero: cuando un worker escribe y los
+    incrementa, el resto de procesos deja de servir los valores anteriores.
+    """
+
+    def __init__(self, path: str, ttl: float = 60):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        self._initialize_schema()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Conexión propia de cada hilo"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _initialize_schema(self):
+        """Crear tablas si no existen"""
+        try:
+            self._connection().executescript(SCHEMA)
+        except Exception as e:
+            print(f"Error inicializando caché compartida: {e}")
+            raise
+
+    def version(self, scope: str) -> Optional[int]:
+        """Versión vigente de un ámbito ("sheet:entries", "user:123"...)
+
+        None si no se pudo leer: los valores con esa etiqueta nunca se sirven.
+        """
+        try:
+            row = self._connection().execute(
+                "SELECT version FROM cache_versions WHERE scope = ?", (scope,)
+            ).fetchone()
+            return row[0] if row else 0
+        except sqlite3.Error as e:
+            print(f"Error leyendo versión de caché: {e}")
+            return None
+
+    def bump(self, scope: str) -> Optional[int]:
+        """Invalidar en todos los procesos los valores de un ámbito"""
+        conn = self._connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO cache_versions (scope, version) VALUES (?, 1) "
+                "ON CONFLICT(scope) DO UPDATE SET version = version + 1",
+                (scope,)
+            )
+            version = conn.execute(
+                "SELECT version FROM cache_versions WHERE scope = ?", (scope,)
+            ).fetchone()[0]
+            conn.execute("COMMIT")
+            return version
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            print(f"Error invalidando caché compartida: {e}")
+            return None
+
+    def user_tag(self, user_id: str) -> Optional[str]:
+        """Etiqueta de los datos de un usuario"""
+        version = self.version(f"user:{user_id}")
+        return None if version is None else str(version)
+
+    def bump_user(self, user_id: str):
+        """Invalidar los datos cacheados de un usuario"""
+        self.bump(f"user:{user_id}")
+
+    def on_storage_change(self, user_id: str, kind: str):
+        """Listener del almacenamiento: cualquier escritura invalida al usuario"""
+        self.bump_user(user_id)
+
+    def get(self, key: str, tag: Optional[str]) -> Optional[Any]:
+        """Valor guardado con esa etiqueta (None si falta, caducó o cambió)"""
+        if tag is None:
+            return None
+        try:
+            row = self._connection().execute(
+                "SELECT tag, expires_at, value FROM cache_entries WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error leyendo caché compartida: {e}")
+            return None
+
+        if row is None or row[0] != tag or row[1] < time.time():
+            return None
+        return pickle.loads(row[2])
+
+    def set(self, key: str, tag: Optional[str], value: Any, ttl: Optional[float] = None):
+        """Guardar un valor para una etiqueta de versión"""
+        if tag is None:
+            return
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, tag, expires_at, value) "
+                "VALUES (?, ?, ?, ?)",
+                (key, tag, expires_at, sqlite3.Binary(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)))
+            )
+            self._writes += 1
+            if self._writes % PURGE_EVERY == 0:
+                conn.execute("DELETE FROM cache_entries WHERE expires_at < ?", (time.time(),))
+        except sqlite3.Error as e:
+            print(f"Error escribiendo caché compartida: {e}")
+
+    def get_or_compute(self, key: str, tag: Optional[str], compute: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        """Leer de la caché o calcular el valor y guardarlo"""
+        value = self.get(key, tag)
+        if value is None:
+            value = compute()
+            self.set(key, tag, value, ttl)
+        return value
+
+    def close(self):
+        """Cerrar la conexión del hilo actual"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
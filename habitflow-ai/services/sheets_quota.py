@@ -0,0 +1,208 @@
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import heapq
+import itertools
+import random
+import threading
+import time
+import gspread
+from services.rate_limit import TokenBucket
+from utils.config import (
+    DEFAULT_SHEETS_READS_PER_MINUTE, DEFAULT_SHEETS_WRITES_PER_MINUTE,
+    DEFAULT_SHEETS_MAX_THROTTLE_RETRIES, DEFAULT_SHEETS_THROTTLE_BACKOFF_MAX, get_env_or_default
+)
+
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+KINDS = ("read", "write")
+
+
+def _status_code(error: gspread.exceptions.APIError) -> Optional[int]:
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def is_rejection(error: Exception) -> bool:
+    """Si Sheets rechazó la petición en sí (4xx salvo 429): reintentarla igual no sirve"""
+    if not isinstance(error, gspread.exceptions.APIError):
+        return False
+    status = _status_code(error)
+    return status is not None and 400 <= status < 500 and status not in (408, 429)
+
+
+class SheetsQuotaScheduler:
+    """Cola con cuota para todas las llamadas a Google Sheets de un proceso
+
+    Sheets limita las lecturas y las escrituras por minuto: cada tipo tiene
+    su cubo de tokens y su cola. Las llamadas esperan turno en vez de
+    fallar, y dentro de cada cola las interactivas pasan antes que las de
+    segundo plano (sincronización de la réplica, lotes del buffer de
+    escrituras); a igual prioridad, por orden de llegada. Un 429 pausa la
+    cola de ese tipo con espera exponencial con jitter y la llamada se
+    reintenta.
+
+    La prioridad de una llamada es la indicada o, si no, la del hilo
+    (with scheduler.background(): ...).
+    """
+
+    def __init__(
+        self,
+        reads_per_minute: float = 60,
+        writes_per_minute: float = 60,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 64.0
+    ):
+        # Ráfagas de hasta una décima de la cuota por minuto
+        self._buckets = {
+            "read": TokenBucket(reads_per_minute / 60.0, capacity=max(1.0, reads_per_minute / 10)),
+            "write": TokenBucket(writes_per_minute / 60.0, capacity=max(1.0, writes_per_minute / 10)),
+        }
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._cond = threading.Condition()
+        self._queues: Dict[str, List[Tuple[int, int]]] = {kind: [] for kind in KINDS}
+        self._paused_until = {kind: 0.0 for kind in KINDS}
+        self._throttle_streak = {kind: 0 for kind in KINDS}
+        self._tickets = itertools.count()
+        self._local = threading.local()
+        self._counters = {
+            kind: {"calls": 0, "throttled": 0, "failed": 0, "wait_seconds": 0.0} for kind in KINDS
+        }
+
+    @contextmanager
+    def background(self) -> Iterator[None]:
+        """Las llamadas de este hilo dentro del bloque van como segundo plano"""
+        previous = getattr(self._local, "priority", INTERACTIVE)
+        self._local.priority = BACKGROUND
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    def call(self, kind: str, fn: Callable, *args, priority: Optional[int] = None, **kwargs) -> Any:
+        """Ejecutar una llamada de gspread cuando la cuota lo permita
+
+        kind es "read" o "write". Los 429 se reintentan hasta max_retries
+        veces; el resto de errores se propaga.
+        """
+        if priority is None:
+            priority = getattr(self._local, "priority", INTERACTIVE)
+        attempt = 0
+        while True:
+            self._acquire(kind, priority)
+            try:
+                result = fn(*args, **kwargs)
+            except gspread.exceptions.APIError as e:
+                if _status_code(e) != 429 or attempt >= self.max_retries:
+                    self._count(kind, "failed")
+                    raise
+                attempt += 1
+                self._throttled(kind)
+                continue
+            with self._cond:
+                self._throttle_streak[kind] = 0
+            self._count(kind, "calls")
+            return result
+
+    def read(self, fn: Callable, *args, **kwargs) -> Any:
+        """Atajo de call("read", ...)"""
+        return self.call("read", fn, *args, **kwargs)
+
+    def write(self, fn: Callable, *args, **kwargs) -> Any:
+        """Atajo de call("write", ...)"""
+        return self.call("write", fn, *args, **kwargs)
+
+    def _acquire(self, kind: str, priority: int):
+        """Esperar turno en la cola y un token del cubo"""
+        ticket = (priority, next(self._tickets))
+        queue, bucket = self._queues[kind], self._buckets[kind]
+        started = time.monotonic()
+        with self._cond:
+            heapq.heappush(queue, ticket)
+            try:
+                while True:
+                    wait = None  # Sin turno: hasta que la cabeza de la cola salga
+                    if queue[0] == ticket:
+                        wait = self._paused_until[kind] - time.monotonic()
+                        if wait <= 0:
+                            wait = bucket.try_acquire()
+                            if not wait:
+                                break
+                    self._cond.wait(wait)
+            finally:
+                queue.remove(ticket)
+                heapq.heapify(queue)
+                self._cond.notify_all()
+            self._counters[kind]["wait_seconds"] += time.monotonic() - started
+
+    def _throttled(self, kind: str):
+        """Pausar la cola tras un 429 (cada 429 seguido dobla la espera)"""
+        with self._cond:
+            streak = self._throttle_streak[kind]
+            self._throttle_streak[kind] = streak + 1
+            pause = min(self.backoff_max, self.backoff_base * 2 ** streak)
+            pause *= random.uniform(0.5, 1.0)
+            self._paused_until[kind] = max(self._paused_until[kind], time.monotonic() + pause)
+            self._counters[kind]["throttled"] += 1
+            self._cond.notify_all()
+        print(f"Cuota de Google Sheets agotada ({kind}): reintentando en {pause:.1f}s")
+
+    def _count(self, kind: str, counter: str):
+        with self._cond:
+            self._counters[kind][counter] += 1
+
+    def queue_depth(self) -> Dict[str, int]:
+        """Llamadas esperando turno por tipo"""
+        with self._cond:
+            return {kind: len(queue) for kind, queue in self._queues.items()}
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Cola por tipo y prioridad, pausas por 429 y contadores"""
+        with self._cond:
+            now = time.monotonic()
+            return {
+                kind: {
+                    "queued": len(self._queues[kind]),
+                    "queued_by_priority": {
+                        name: sum(1 for priority, _ in self._queues[kind] if priority == value)
+                        for value, name in PRIORITY_NAMES.items()
+                    },
+                    "paused_seconds": round(max(0.0, self._paused_until[kind] - now), 1),
+                    **{
+                        name: round(value, 2) if isinstance(value, float) else value
+                        for name, value in self._counters[kind].items()
+                    },
+                }
+                for kind in KINDS
+            }
+
+
+_shared: Optional[SheetsQuotaScheduler] = None
+_shared_lock = threading.Lock()
+
+
+def get_sheets_quota() -> SheetsQuotaScheduler:
+    """Planificador único del proceso (lo comparten la API, el bot y los scripts)"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = SheetsQuotaScheduler(
+                reads_per_minute=float(get_env_or_default(
+                    "SHEETS_READS_PER_MINUTE", str(DEFAULT_SHEETS_READS_PER_MINUTE)
+                )),
+                writes_per_minute=float(get_env_or_default(
+                    "SHEETS_WRITES_PER_MINUTE", str(DEFAULT_SHEETS_WRITES_PER_MINUTE)
+                )),
+                max_retries=int(get_env_or_default(
+                    "SHEETS_MAX_THROTTLE_RETRIES", str(DEFAULT_SHEETS_MAX_THROTTLE_RETRIES)
+                )),
+                backoff_max=float(get_env_or_default(
+                    "SHEETS_THROTTLE_BACKOFF_MAX", str(DEFAULT_SHEETS_THROTTLE_BACKOFF_MAX)
+                ))
+            )
+        return _shared
@@ -0,0 +1,150 @@
+from typing import Any, Callable, ContextManager, Dict, List, Optional, Tuple
+from collections import Counter
+import threading
+
+
+class SheetsReplica:
+    """Réplica en memoria (write-through) de las hojas de Google Sheets"""
+
+    def __init__(
+        self,
+        loader: Callable[[str], List[Dict[str, Any]]],
+        headers: Dict[str, List[str]],
+        sync_interval: float = 60,
+        on_reload: Optional[Callable[[str, List[Dict[str, Any]]], None]] = None,
+        on_append: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+        version_fn: Optional[Callable[[str], Any]] = None,
+        background: Optional[Callable[[], ContextManager]] = None
+    ):
+        self._loader = loader
+        self._headers = headers
+        self.sync_interval = sync_interval
+        # Los callbacks se ejecutan bajo el lock para que las estructuras
+        # derivadas (índices) vean las cargas y las escrituras en orden
+        self._on_reload = on_reload
+        self._on_append = on_append
+        # Versión compartida de cada hoja: si otro proceso escribe, se recarga
+        self._version_fn = version_fn
+        self._versions: Dict[str, Any] = {}
+        # Contexto de las descargas periódicas (p. ej. prioridad baja en la cuota)
+        self._background = background
+
+        self._lock = threading.RLock()
+        self._records: Dict[str, List[Dict[str, Any]]] = {}
+        # Escrituras locales que aún no aparecen en una descarga completa
+        self._unconfirmed: Dict[str, List[Dict[str, Any]]] = {name: [] for name in headers}
+
+        self._stop_event = threading.Event()
+        self._sync_thread: Optional[threading.Thread] = None
+
+    def get_records(self, sheet_name: str) -> List[Dict[str, Any]]:
+        """Obtener los registros de una hoja (se descarga solo la primera vez)"""
+        with self._lock:
+            records = self._records.get(sheet_name)
+            loaded_version = self._versions.get(sheet_name)
+        if records is not None and self._version_fn and self._version_fn(sheet_name) != loaded_version:
+            records = None
+        if records is None:
+            self.sync(sheet_name)
+            with self._lock:
+                records = self._records[sheet_name]
+        return records
+
+    def ensure_loaded(self, sheet_name: str):
+        """Cargar la hoja si todavía no está en memoria (o si otro proceso la cambió)"""
+        self.get_records(sheet_name)
+
+    def append(self, sheet_name: str, row: List[Any]):
+        """Aplicar localmente una fila que acabamos de escribir en Sheets"""
+        record = dict(zip(self._headers[sheet_name], row))
+        with self._lock:
+            self._unconfirmed[sheet_name].append(record)
+            if sheet_name in self._records:
+                # Copy-on-write: los lectores conservan una lista estable
+                self._records[sheet_name] = self._records[sheet_name] + [record]
+                if self._on_append:
+                    self._on_append(sheet_name, record)
+
+    def advance_version(self, sheet_name: str, version: int):
+        """Anotar una versión que solo incluye nuestra propia escritura"""
+        with self._lock:
+            if self._versions.get(sheet_name) == version - 1:
+                self._versions[sheet_name] = version
+
+    def is_loaded(self, sheet_name: str) -> bool:
+        """Indicar si la hoja ya está en memoria"""
+        with self._lock:
+            return sheet_name in self._records
+
+    def sync(self, sheet_name: Optional[str] = None):
+        """Volver a descargar una hoja (o todas las ya cargadas)"""
+        if sheet_name is None:
+            with self._lock:
+                names = list(self._records.keys())
+        else:
+            names = [sheet_name]
+
+        for name in names:
+            version = self._version_fn(name) if self._version_fn else None
+            downloaded = self._loader(name)
+
+            with self._lock:
+                records = self._merge_unconfirmed(name, downloaded)
+                self._records[name] = records
+                self._versions[name] = version
+                if self._on_reload:
+                    self._on_reload(name, records)
+
+    def _merge_unconfirmed(self, sheet_name: str, downloaded: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Conservar escrituras locales que la descarga todavía no incluye"""
+        pending = self._unconfirmed[sheet_name]
+        if not pending:
+            return downloaded
+
+        seen = Counter(self._record_key(sheet_name, r) for r in downloaded)
+        still_pending = []
+        for record in pending:
+            key = self._record_key(sheet_name, record)
+            if seen[key] > 0:
+                seen[key] -= 1
+            else:
+                still_pending.append(record)
+
+        self._unconfirmed[sheet_name] = still_pending
+        return downloaded + still_pending
+
+    def _record_key(self, sheet_name: str, record: Dict[str, Any]) -> Tuple[str, ...]:
+        """Clave comparable de una fila (get_all_records convierte números)"""
+        return tuple(str(record.get(header, "")) for header in self._headers[sheet_name])
+
+    def start(self):
+        """Iniciar la resincronización periódica en segundo plano"""
+        if self._sync_thread is not None or self.sync_interval <= 0:
+            return
+
+        self._stop_event.clear()
+        self._sync_thread = threading.Thread(
+            target=self._sync_loop,
+            name="sheets-replica-sync",
+            daemon=True
+        )
+        self._sync_thread.start()
+
+    def stop(self):
+        """Detener la resincronización en segundo plano"""
+        self._stop_event.set()
+        if self._sync_thread is not None:
+            self._sync_thread.join(timeout=5)
+            self._sync_thread = None
+
+    def _sync_loop(self):
+        """Bucle de resincronización"""
+        while not self._stop_event.wait(self.sync_interval):
+            try:
+                if self._background:
+                    with self._background():
+                        self.sync()
+                else:
+                    self.sync()
+            except Exception as e:
+                print(f"Error sincronizando réplica de Sheets: {e}")
@@ -1,21 +1,121 @@
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import Iterator, List, Dict, Any, Optional, Tuple
 import gspread
 from google.oauth2.service_account import Credentials
-from models.schemas import Habit, HabitEntry, TelegramUser, UserStats
-import pandas as pd
+from models.schemas import Habit, HabitEntry, TelegramUser
+from services.entry_store import EntryColumns, EntryStore
+from services.keyed_locks import KeyedLocks
+from services.sheets_quota import BACKGROUND, SheetsQuotaScheduler, get_sheets_quota, is_rejection
+from services.sheets_replica import SheetsReplica
+from services.user_index import UserIndex
+from services.storage import StorageBackend
+from services.write_buffer import EntryWriteBuffer
+from utils.config import (
+    SHEET_HEADERS, DEFAULT_REPLICA_ENABLED, DEFAULT_REPLICA_SYNC_INTERVAL,
+    DEFAULT_WRITE_BUFFER_ENABLED, DEFAULT_WRITE_BATCH_SIZE, DEFAULT_WRITE_MAX_DELAY,
+    DEFAULT_WRITE_JOURNAL_PATH, DEFAULT_WRITE_MAX_RETRIES, DEFAULT_WRITE_WAIT_TIMEOUT,
+    EXPORT_CHUNK_SIZE, MAX_ENTRIES_PER_REQUEST, get_env_or_default
+)
 import os
+import threading
 
 
-class GoogleSheetsService:
+class GoogleSheetsService(StorageBackend):
     """Servicio para manejar Google Sheets como base de datos"""
     
-    def __init__(self, credentials_file: str, spreadsheet_id: str):
+    def __init__(
+        self,
+        credentials_file: str,
+        spreadsheet_id: str,
+        use_replica: Optional[bool] = None,
+        replica_sync_interval: Optional[float] = None,
+        use_write_buffer: Optional[bool] = None,
+        quota: Optional[SheetsQuotaScheduler] = None
+    ):
+        super().__init__()
         self.credentials_file = credentials_file
         self.spreadsheet_id = spreadsheet_id
+        # Todas las llamadas a Sheets pasan por la cola con cuota del proceso
+        self.quota = quota or get_sheets_quota()
         self.client = None
         self.spreadsheet = None
+        self._worksheets: Dict[str, gspread.Worksheet] = {}
         self._connect()
+        
+        # Claves conocidas para detectar duplicados sin recorrer las hojas
+        self._known_keys: Dict[str, Optional[set]] = {"users": None, "habits": None}
+        self._known_versions: Dict[str, Any] = {}
+        self._keys_lock = threading.Lock()
+        self._key_locks = KeyedLocks()
+        # Filas y huella de la última descarga de cada hoja, para detectar cambios externos
+        self._sheet_digests: Dict[str, Tuple[int, int]] = {}
+        
+        # Réplica en memoria opcional: las lecturas se sirven sin ir a Sheets
+        if use_replica is None:
+            use_replica = get_env_or_default(
+                "SHEETS_REPLICA_ENABLED", DEFAULT_REPLICA_ENABLED
+            ).lower() == "true"
+        if replica_sync_interval is None:
+            replica_sync_interval = float(get_env_or_default(
+                "SHEETS_REPLICA_SYNC_INTERVAL", str(DEFAULT_REPLICA_SYNC_INTERVAL)
+            ))
+        
+        self.replica: Optional[SheetsReplica] = None
+        self.index = UserIndex()
+        self.entry_store = EntryStore()
+        if use_replica:
+            self.replica = SheetsReplica(
+                loader=self._download_records,
+                headers=SHEET_HEADERS,
+                sync_interval=replica_sync_interval,
+                on_reload=self._on_replica_reload,
+                on_append=self._on_replica_append,
+                version_fn=self._sheet_version if self.shared_cache else None,
+                background=self.quota.background
+            )
+            self.replica.start()
+        
+        # Buffer de escrituras: las entradas se envían en lotes con append_rows
+        if use_write_buffer is None:
+            use_write_buffer = get_env_or_default(
+                "SHEETS_WRITE_BUFFER_ENABLED", DEFAULT_WRITE_BUFFER_ENABLED
+            ).lower() == "true"
+        self.write_wait_timeout = float(get_env_or_default(
+            "SHEETS_WRITE_WAIT_TIMEOUT", str(DEFAULT_WRITE_WAIT_TIMEOUT)
+        ))
+        
+        self.write_buffer: Optional[EntryWriteBuffer] = None
+        if use_write_buffer:
+            self.write_buffer = EntryWriteBuffer(
+                flush_rows=self._append_entry_rows,
+                max_batch=int(get_env_or_default(
+                    "SHEETS_WRITE_BATCH_SIZE", str(DEFAULT_WRITE_BATCH_SIZE)
+                )),
+                max_delay=float(get_env_or_default(
+                    "SHEETS_WRITE_MAX_DELAY", str(DEFAULT_WRITE_MAX_DELAY)
+                )),
+                journal_path=get_env_or_default(
+                    "SHEETS_WRITE_JOURNAL", DEFAULT_WRITE_JOURNAL_PATH
+                ),
+                max_retries=int(get_env_or_default(
+                    "SHEETS_WRITE_MAX_RETRIES", str(DEFAULT_WRITE_MAX_RETRIES)
+                )),
+                is_rejection=is_rejection
+            )
+            # Las entradas recuperadas del journal se ven ya en las lecturas
+            if self.replica:
+                for row in self.write_buffer.recovered_rows():
+                    self.replica.append("entries", row)
+            self.write_buffer.start()
+        
+        # Las estadísticas incrementales necesitan ver todas las escrituras:
+        # solo se usan con la réplica, que se carga ya al arrancar
+        if not self.replica:
+            self.stats_aggregator = None
+        elif self.stats_aggregator:
+            self.replica.ensure_loaded("habits")
+            self.replica.ensure_loaded("entries")
+            self.reconcile_stats()
     
     def _connect(self):
         """Conectar a Google Sheets"""
@@ -30,7 +130,7 @@ class GoogleSheetsService:
                 scopes=scope
             )
             self.client = gspread.authorize(creds)
-            self.spreadsheet = self.client.open_by_key(self.spreadsheet_id)
+            self.spreadsheet = self.quota.read(self.client.open_by_key, self.spreadsheet_id)
             
             # Crear hojas si no existen
             self._initialize_sheets()
@@ -44,55 +144,210 @@ class GoogleSheetsService:
         try:
             # Hoja de usuarios
             try:
-                self.spreadsheet.worksheet("users")
+                self.quota.read(self.spreadsheet.worksheet, "users")
             except gspread.WorksheetNotFound:
-                users_sheet = self.spreadsheet.add_worksheet(title="users", rows="1000", cols="10")
-                users_sheet.append_row([
+                users_sheet = self.quota.write(
+                    self.spreadsheet.add_worksheet, title="users", rows="1000", cols="10"
+                )
+                self.quota.write(users_sheet.append_row, [
                     "user_id", "username", "first_name", "last_name", 
                     "joined_at", "is_active"
                 ])
             
             # Hoja de hábitos
             try:
-                self.spreadsheet.worksheet("habits")
+                self.quota.read(self.spreadsheet.worksheet, "habits")
             except gspread.WorksheetNotFound:
-                habits_sheet = self.spreadsheet.add_worksheet(title="habits", rows="1000", cols="10")
-                habits_sheet.append_row([
+                habits_sheet = self.quota.write(
+                    self.spreadsheet.add_worksheet, title="habits", rows="1000", cols="10"
+                )
+                self.quota.write(habits_sheet.append_row, [
                     "user_id", "name", "description", "target_frequency", "created_at"
                 ])
             
             # Hoja de entradas
             try:
-                self.spreadsheet.worksheet("entries")
+                self.quota.read(self.spreadsheet.worksheet, "entries")
             except gspread.WorksheetNotFound:
-                entries_sheet = self.spreadsheet.add_worksheet(title="entries", rows="5000", cols="10")
-                entries_sheet.append_row([
+                entries_sheet = self.quota.write(
+                    self.spreadsheet.add_worksheet, title="entries", rows="5000", cols="10"
+                )
+                self.quota.write(entries_sheet.append_row, [
                     "user_id", "habit_name", "completed", "date", "notes", "rating"
                 ])
                 
         except Exception as e:
             print(f"Error inicializando hojas: {e}")
     
+    def _worksheet(self, sheet_name: str) -> gspread.Worksheet:
+        """Obtener una hoja (cacheada para no pedir metadatos en cada llamada)"""
+        worksheet = self._worksheets.get(sheet_name)
+        if worksheet is None:
+            worksheet = self.quota.read(self.spreadsheet.worksheet, sheet_name)
+            self._worksheets[sheet_name] = worksheet
+        return worksheet
+    
+    def _download_records(self, sheet_name: str) -> List[Dict[str, Any]]:
+        """Descargar todos los registros de una hoja desde Sheets
+
+        Con caché compartida, la primera descarga de cada versión de la hoja
+        la reutilizan el resto de workers.
+        """
+        worksheet = self._worksheet(sheet_name)
+        if self.shared_cache:
+            records = self.shared_cache.get_or_compute(
+                f"sheet:{sheet_name}", str(self._sheet_version(sheet_name)),
+                lambda: self.quota.read(worksheet.get_all_records)
+            )
+        else:
+            records = self.quota.read(worksheet.get_all_records)
+        self._track_sheet_changes(sheet_name, records)
+        return records
+    
+    def _track_sheet_changes(self, sheet_name: str, records: List[Dict[str, Any]]):
+        """Invalidar las versiones de datos si la hoja cambió desde la última descarga
+
+        Las escrituras de la aplicación ya cambian la versión del usuario; esto
+        cubre las ediciones hechas directamente en la hoja. Con caché compartida
+        las filas agregadas por otros workers ya cambiaron la versión de su
+        usuario, así que solo cuentan los cambios en las filas ya vistas.
+        """
+        rows = [tuple(record.values()) for record in records]
+        previous = self._sheet_digests.get(sheet_name)
+        self._sheet_digests[sheet_name] = (len(rows), hash(tuple(rows)))
+        if previous is None:
+            return
+        
+        seen_rows, digest = previous
+        if self.shared_cache and len(rows) >= seen_rows:
+            changed = hash(tuple(rows[:seen_rows])) != digest
+        else:
+            changed = (len(rows), hash(tuple(rows))) != previous
+        if changed:
+            self.data_versions.bump_all()
+    
+    def _sheet_version(self, sheet_name: str) -> Optional[int]:
+        """Versión compartida de una hoja (cambia con cada escritura en Sheets)"""
+        return self.shared_cache.version(f"sheet:{sheet_name}")
+    
+    def _publish_write(self, sheet_name: str, user_ids: List[str]):
+        """Invalidar en los demás workers lo que depende de filas ya escritas en Sheets"""
+        if not self.shared_cache:
+            return
+        version = self.shared_cache.bump(f"sheet:{sheet_name}")
+        if version is not None:
+            if self.replica:
+                self.replica.advance_version(sheet_name, version)
+            if self._known_versions.get(sheet_name) == version - 1:
+                self._known_versions[sheet_name] = version
+        for user_id in set(user_ids):
+            self.shared_cache.bump_user(user_id)
+    
+    def _get_records(self, sheet_name: str) -> List[Dict[str, Any]]:
+        """Obtener registros de una hoja, desde la réplica si está activa"""
+        if self.replica:
+            return self.replica.get_records(sheet_name)
+        return self._download_records(sheet_name)
+    
+    def _append_row(self, sheet_name: str, row: List[Any]):
+        """Agregar una fila en Sheets y aplicarla a la réplica"""
+        self.quota.write(self._worksheet(sheet_name).append_row, row)
+        if self.replica:
+            self.replica.append(sheet_name, row)
+        self._publish_write(sheet_name, [str(row[0])])
+    
+    def _append_entry_rows(self, rows: List[List[Any]]):
+        """Enviar un lote de entradas con una sola llamada a Sheets (en segundo plano)"""
+        self.quota.write(self._worksheet("entries").append_rows, rows, priority=BACKGROUND)
+        self._publish_write("entries", [str(row[0]) for row in rows])
+    
+    @staticmethod
+    def _unique_key(sheet_name: str, record: Dict[str, Any]) -> Any:
+        """Clave de unicidad de un usuario o de un hábito (sin distinguir mayúsculas)"""
+        if sheet_name == "users":
+            return str(record['user_id'])
+        return (str(record['user_id']), str(record['name']).lower())
+    
+    def _known(self, sheet_name: str) -> set:
+        """Claves existentes de usuarios o hábitos (se cargan de Sheets una sola vez)
+
+        Con caché compartida se recargan cuando otro worker escribe en la hoja.
+        """
+        if self.replica:
+            # Si la hoja cambió, la réplica la recarga y el hook reconstruye las claves
+            self.replica.ensure_loaded(sheet_name)
+        elif self.shared_cache and self._known_versions.get(sheet_name) != self._sheet_version(sheet_name):
+            self._known_keys[sheet_name] = None
+        
+        keys = self._known_keys[sheet_name]
+        if keys is None:
+            with self._keys_lock:
+                keys = self._known_keys[sheet_name]
+                if keys is None:
+                    version = self._sheet_version(sheet_name) if self.shared_cache else None
+                    records = self._get_records(sheet_name)
+                    keys = {self._unique_key(sheet_name, r) for r in records}
+                    self._known_keys[sheet_name] = keys
+                    self._known_versions[sheet_name] = version
+        return keys
+    
+    def _on_replica_reload(self, sheet_name: str, records: List[Dict[str, Any]]):
+        """Reconstruir índices y estadísticas cuando la réplica recarga una hoja"""
+        if sheet_name in self._known_keys:
+            self._known_keys[sheet_name] = {self._unique_key(sheet_name, r) for r in records}
+        if sheet_name == "habits":
+            self.index.load_habits(records)
+            if self.stats_aggregator:
+                self.stats_aggregator.load_habits(records)
+        elif sheet_name == "entries":
+            self.index.load_entries(records)
+            self.entry_store.load(records)
+            if self.stats_aggregator:
+                self.stats_aggregator.load_entries(records)
+    
+    def _on_replica_append(self, sheet_name: str, record: Dict[str, Any]):
+        """Mantener índices y estadísticas al día con nuestras escrituras"""
+        keys = self._known_keys.get(sheet_name)
+        if keys is not None:
+            keys.add(self._unique_key(sheet_name, record))
+        if sheet_name == "habits":
+            self.index.add_habit(record)
+            if self.stats_aggregator:
+                self.stats_aggregator.add_habit(str(record['user_id']))
+        elif sheet_name == "entries":
+            self.index.add_entry(record)
+            self.entry_store.add(record)
+            if self.stats_aggregator:
+                self.stats_aggregator.add_entry(
+                    str(record['user_id']), record.get('date'), record.get('completed')
+                )
+    
+    def close(self):
+        """Detener tareas en segundo plano (vaciando las escrituras pendientes)"""
+        if self.write_buffer:
+            self.write_buffer.close()
+        if self.replica:
+            self.replica.stop()
+    
     def create_user(self, user: TelegramUser) -> bool:
         """Crear un nuevo usuario"""
         try:
-            users_sheet = self.spreadsheet.worksheet("users")
-            
-            # Verificar si el usuario ya existe
-            existing_users = users_sheet.get_all_records()
-            for existing_user in existing_users:
-                if existing_user['user_id'] == user.user_id:
+            # La comprobación y la escritura van bajo el lock del usuario
+            with self._key_locks.hold(("user", user.user_id)):
+                if user.user_id in self._known("users"):
                     return False  # Usuario ya existe
-            
-            # Agregar nuevo usuario
-            users_sheet.append_row([
-                user.user_id,
-                user.username or "",
-                user.first_name or "",
-                user.last_name or "",
-                user.joined_at.isoformat(),
-                str(user.is_active)
-            ])
+                
+                # Agregar nuevo usuario
+                self._append_row("users", [
+                    user.user_id,
+                    user.username or "",
+                    user.first_name or "",
+                    user.last_name or "",
+                    user.joined_at.isoformat(),
+                    str(user.is_active)
+                ])
+                self._known("users").add(user.user_id)
+            self._notify_change(user.user_id, "user")
             return True
             
         except Exception as e:
@@ -102,59 +357,79 @@ class GoogleSheetsService:
     def create_habit(self, habit: Habit) -> bool:
         """Crear un nuevo hábito"""
         try:
-            habits_sheet = self.spreadsheet.worksheet("habits")
-            
             # Verificar si el hábito ya existe para este usuario
-            existing_habits = habits_sheet.get_all_records()
-            for existing_habit in existing_habits:
-                if (existing_habit['user_id'] == habit.user_id and 
-                    existing_habit['name'].lower() == habit.name.lower()):
+            key = self._unique_key("habits", {'user_id': habit.user_id, 'name': habit.name})
+            with self._key_locks.hold(("habit",) + key):
+                if key in self._known("habits"):
                     return False  # Hábito ya existe
-            
-            # Agregar nuevo hábito
-            habits_sheet.append_row([
-                habit.user_id,
-                habit.name,
-                habit.description or "",
-                habit.target_frequency,
-                habit.created_at.isoformat()
-            ])
+                
+                # Agregar nuevo hábito
+                self._append_row("habits", [
+                    habit.user_id,
+                    habit.name,
+                    habit.description or "",
+                    habit.target_frequency,
+                    habit.created_at.isoformat()
+                ])
+                self._known("habits").add(key)
+            self._notify_change(habit.user_id, "habit")
             return True
             
         except Exception as e:
             print(f"Error creando hábito: {e}")
             return False
     
-    def add_habit_entry(self, entry: HabitEntry) -> bool:
+    def add_habit_entry(self, entry: HabitEntry, wait: bool = False) -> bool:
         """Agregar una entrada de hábito"""
         try:
-            entries_sheet = self.spreadsheet.worksheet("entries")
-            
-            entries_sheet.append_row([
+            row = [
                 entry.user_id,
                 entry.habit_name,
                 str(entry.completed),
                 entry.date.isoformat(),
                 entry.notes or "",
                 str(entry.rating) if entry.rating else ""
-            ])
+            ]
+            
+            if self.write_buffer:
+                # Se envía a Sheets en lote; una vez en el journal ya es visible en las lecturas
+                pending = self.write_buffer.submit(row)
+                if self.replica:
+                    self.replica.append("entries", row)
+                self._notify_change(entry.user_id, "entry")
+                if wait:
+                    return pending.wait(self.write_wait_timeout)
+                return True
+            
+            self._append_row("entries", row)
+            self._notify_change(entry.user_id, "entry")
             return True
             
         except Exception as e:
             print(f"Error agregando entrada: {e}")
             return False
     
+    def get_user_ids(self) -> List[str]:
+        """IDs de todos los usuarios registrados"""
+        try:
+            return [str(record['user_id']) for record in self._get_records("users")]
+        except Exception as e:
+            print(f"Error obteniendo usuarios: {e}")
+            return []
+    
     def get_user_habits(self, user_id: str) -> List[Dict[str, Any]]:
         """Obtener todos los hábitos de un usuario"""
         try:
-            habits_sheet = self.spreadsheet.worksheet("habits")
-            all_habits = habits_sheet.get_all_records()
+            if self.replica:
+                self.replica.ensure_loaded("habits")
+                return self.index.habits(user_id)
             
-            user_habits = [
-                habit for habit in all_habits 
-                if habit['user_id'] == user_id
-            ]
-            return user_habits
+            if self.shared_cache:
+                return self.shared_cache.get_or_compute(
+                    f"habits:{user_id}", self.shared_cache.user_tag(user_id),
+                    lambda: self._scan_user_habits(user_id)
+                )
+            return self._scan_user_habits(user_id)
             
         except Exception as e:
             print(f"Error obteniendo hábitos: {e}")
@@ -163,100 +438,112 @@ class GoogleSheetsService:
     def get_user_entries(self, user_id: str, days: int = 30) -> List[Dict[str, Any]]:
         """Obtener entradas de un usuario de los últimos N días"""
         try:
-            entries_sheet = self.spreadsheet.worksheet("entries")
-            all_entries = entries_sheet.get_all_records()
-            
-            # Filtrar por usuario y fecha
             cutoff_date = datetime.now() - timedelta(days=days)
-            user_entries = []
             
-            for entry in all_entries:
-                if entry['user_id'] == user_id:
-                    try:
-                        entry_date = datetime.fromisoformat(entry['date'])
-                        if entry_date >= cutoff_date:
-                            user_entries.append(entry)
-                    except ValueError:
-                        continue  # Ignorar fechas malformadas
+            # Con la réplica activa: búsqueda binaria en el índice por usuario
+            if self.replica:
+                self.replica.ensure_loaded("entries")
+                return self.index.entries_since(user_id, cutoff_date)
             
-            return user_entries
+            if self.shared_cache:
+                return self.shared_cache.get_or_compute(
+                    f"entries:{user_id}:{days}", self.shared_cache.user_tag(user_id),
+                    lambda: self._scan_user_entries(user_id, cutoff_date)
+                )
+            return self._scan_user_entries(user_id, cutoff_date)
             
         except Exception as e:
             print(f"Error obteniendo entradas: {e}")
             return []
     
-    def get_user_stats(self, user_id: str) -> UserStats:
-        """Calcular estadísticas de un usuario"""
-        try:
-            habits = self.get_user_habits(user_id)
-            entries = self.get_user_entries(user_id, days=30)
-            
-            total_habits = len(habits)
-            active_habits = len([h for h in habits if h])  # Simplificado por ahora
-            
-            # Calcular tasa de completación
-            completed_entries = [e for e in entries if e.get('completed', '').lower() == 'true']
-            completion_rate = len(completed_entries) / len(entries) if entries else 0.0
-            
-            # Calcular racha (simplificado)
-            streak_days = self._calculate_streak(user_id)
-            
-            # Última actividad
-            last_activity = datetime.now()  # Simplificado
-            if entries:
-                try:
-                    last_entry_date = max([datetime.fromisoformat(e['date']) for e in entries])
-                    last_activity = last_entry_date
-                except ValueError:
-                    pass
-            
-            return UserStats(
-                user_id=user_id,
-                total_habits=total_habits,
-                active_habits=active_habits,
-                completion_rate=completion_rate,
-                streak_days=streak_days,
-                last_activity=last_activity
-            )
-            
-        except Exception as e:
-            print(f"Error calculando estadísticas: {e}")
-            return UserStats(
-                user_id=user_id,
-                total_habits=0,
-                active_habits=0,
-                completion_rate=0.0,
-                streak_days=0,
-                last_activity=datetime.now()
-            )
+    def get_user_entries_page(
+        self,
+        user_id: str,
+        since: datetime,
+        until: Optional[datetime] = None,
+        habit_name: Optional[str] = None,
+        limit: int = MAX_ENTRIES_PER_REQUEST,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Página de entradas por fecha (búsqueda binaria en el índice si hay réplica)"""
+        if not self.replica:
+            return super().get_user_entries_page(user_id, since, until, habit_name, limit, cursor)
+        
+        self.replica.ensure_loaded("entries")
+        return self.index.entries_page(user_id, since, until, habit_name, limit, cursor)
+    
+    def iter_entries(
+        self,
+        user_id: Optional[str] = None,
+        chunk_size: int = EXPORT_CHUNK_SIZE
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Recorrer entradas en bloques (de la réplica o leyendo la hoja por rangos)"""
+        # Lo ya encolado se envía antes para que la exportación lo incluya
+        if self.write_buffer:
+            self.write_buffer.flush(self.write_wait_timeout)
+        
+        if self.replica:
+            if user_id is not None:
+                yield from super().iter_entries(user_id, chunk_size)
+                return
+            # La réplica reemplaza la lista en cada escritura: esta no cambia
+            records = self.replica.get_records("entries")
+            for start in range(0, len(records), chunk_size):
+                yield records[start:start + chunk_size]
+            return
+        
+        headers = SHEET_HEADERS["entries"]
+        last_column = chr(ord("A") + len(headers) - 1)
+        worksheet = self._worksheet("entries")
+        start = 2  # La fila 1 son los encabezados
+        while True:
+            rows = self.quota.read(worksheet.get_values, f"A{start}:{last_column}{start + chunk_size - 1}")
+            chunk = [dict(zip(headers, row + [""] * (len(headers) - len(row)))) for row in rows]
+            if user_id is not None:
+                chunk = [record for record in chunk if str(record['user_id']) == user_id]
+            if chunk:
+                yield chunk
+            if len(rows) < chunk_size:
+                return
+            start += chunk_size
     
-    def _calculate_streak(self, user_id: str) -> int:
-        """Calcular la racha actual de días"""
+    def get_user_entry_columns(self, user_id: str, days: int = 30) -> EntryColumns:
+        """Entradas de los últimos N días en columnas (desde la réplica si está activa)"""
+        if not self.replica:
+            return super().get_user_entry_columns(user_id, days)
+        
         try:
-            entries = self.get_user_entries(user_id, days=365)  # Último año
-            
-            if not entries:
-                return 0
-            
-            # Convertir a DataFrame para análisis más fácil
-            df = pd.DataFrame(entries)
-            df['date'] = pd.to_datetime(df['date'])
-            df['completed'] = df['completed'].str.lower() == 'true'
-            
-            # Agrupar por día y verificar si hubo al menos un hábito completado
-            daily_completion = df.groupby(df['date'].dt.date)['completed'].any()
-            
-            # Calcular racha desde el día más reciente
-            streak = 0
-            for date in sorted(daily_completion.index, reverse=True):
-                if daily_completion[date]:
-                    streak += 1
-                else:
-                    break
-            
-            return streak
+            self.replica.ensure_loaded("entries")
+            return self.entry_store.columns(user_id, since=datetime.now() - timedelta(days=days))
             
         except Exception as e:
-            print(f"Error calculando racha: {e}")
-            return 0
-
+            print(f"Error obteniendo entradas: {e}")
+            return EntryColumns.build(())
+    
+    def _scan_user_habits(self, user_id: str) -> List[Dict[str, Any]]:
+        """Recorrer la hoja de hábitos buscando los de un usuario"""
+        all_habits = self._get_records("habits")
+        
+        user_habits = [
+            habit for habit in all_habits 
+            if str(habit['user_id']) == user_id
+        ]
+        return user_habits
+    
+    def _scan_user_entries(self, user_id: str, cutoff_date: datetime) -> List[Dict[str, Any]]:
+        """Recorrer la hoja de entradas buscando las de un usuario desde una fecha"""
+        all_entries = self._get_records("entries")
+        
+        # Filtrar por usuario y fecha
+        user_entries = []
+        
+        for entry in all_entries:
+            if str(entry['user_id']) == user_id:
+                try:
+                    entry_date = datetime.fromisoformat(entry['date'])
+                    if entry_date >= cutoff_date:
+                        user_entries.append(entry)
+                except ValueError:
+                    continue  # Ignorar fechas malformadas
+        
+        return user_entries
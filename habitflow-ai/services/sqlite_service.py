@@ -0,0 +1,430 @@
+from datetime import datetime, timedelta
+from typing import Iterator, List, Dict, Any, Optional, Tuple
+from models.schemas import Habit, HabitEntry, TelegramUser, UserStats
+from services.data_context import UserDataContext
+from services.entry_store import EntryColumns
+from services.pagination import decode_cursor, encode_cursor
+from services.storage import StorageBackend
+from utils.config import EXPORT_CHUNK_SIZE, MAX_ENTRIES_PER_REQUEST
+import sqlite3
+import threading
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    username TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    joined_at TEXT,
+    is_active TEXT
+);
+
+CREATE TABLE IF NOT EXISTS habits (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    description TEXT,
+    target_frequency TEXT,
+    created_at TEXT
+);
+
+-- Un hábito por (usuario, nombre sin distinguir mayúsculas)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_habits_user_name ON habits (user_id, name_key);
+
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    habit_name TEXT NOT NULL,
+    completed INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    notes TEXT,
+    rating INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS idx_entries_user_date ON entries (user_id, date);
+CREATE INDEX IF NOT EXISTS idx_entries_user_habit_date ON entries (user_id, habit_name, date);
+
+-- Versión de los datos de cada usuario; cada escritura la incrementa en su
+-- misma transacción, así la ven todos los procesos que comparten la base
+CREATE TABLE IF NOT EXISTS user_versions (
+    user_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+"""
+
+
+class SQLiteStorageService(StorageBackend):
+    """Almacenamiento local en SQLite con índices por usuario"""
+
+    stores_versions = True
+
+    def __init__(self, db_path: str):
+        super().__init__()
+        self.db_path = db_path
+        self._local = threading.local()
+        # Versión de la base que reflejan los agregados de cada usuario
+        self._aggregated_versions: Dict[str, int] = {}
+        self._aggregate_lock = threading.Lock()
+        self.initialize_schema()
+        
+        # Reconstruir las estadísticas incrementales desde la base al arrancar
+        if self.stats_aggregator:
+            self._load_stats_aggregator()
+            self.reconcile_stats()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Conexión propia de cada hilo"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            # WAL permite lecturas concurrentes mientras otro proceso escribe
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def initialize_schema(self):
+        """Crear tablas e índices si no existen (se puede llamar varias veces)"""
+        try:
+            conn = self._connection()
+            with conn:
+                conn.executescript(SCHEMA)
+        except Exception as e:
+            print(f"Error inicializando SQLite: {e}")
+            raise
+
+    def table_counts(self) -> Dict[str, int]:
+        """Número de filas de cada tabla de datos"""
+        conn = self._connection()
+        return {
+            table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("users", "habits", "entries")
+        }
+
+    def _load_stats_aggregator(self):
+        """Cargar los agregados desde las tablas completas
+
+        Las versiones se leen antes que los datos: una escritura intermedia
+        solo provoca una recarga de más de ese usuario.
+        """
+        conn = self._connection()
+        versions = dict(conn.execute("SELECT user_id, version FROM user_versions").fetchall())
+        self.stats_aggregator.load_habits(
+            dict(row) for row in conn.execute("SELECT user_id FROM habits")
+        )
+        self.stats_aggregator.load_entries(
+            self._entry_record(row)
+            for row in conn.execute("SELECT user_id, completed, date, rating FROM entries")
+        )
+        with self._aggregate_lock:
+            self._aggregated_versions = versions
+
+    def _sync_stats_aggregate(self, user_id: str):
+        """Recargar los agregados del usuario si otro proceso escribió en la base"""
+        version = self.store_version(user_id)
+        if version is None or self._aggregated_versions.get(user_id, 0) == version:
+            return
+
+        conn = self._connection()
+        habit_count = conn.execute(
+            "SELECT COUNT(*) FROM habits WHERE user_id = ?", (user_id,)
+        ).fetchone()[0]
+        self.stats_aggregator.load_user(
+            user_id, habit_count,
+            (
+                self._entry_record(row)
+                for row in conn.execute(
+                    "SELECT user_id, completed, date, rating FROM entries WHERE user_id = ?", (user_id,)
+                )
+            )
+        )
+        with self._aggregate_lock:
+            self._aggregated_versions[user_id] = version
+
+    def _apply_to_aggregate(self, user_id: str, version: int, apply):
+        """Sumar una escritura propia a los agregados si son de la versión anterior
+
+        Si no (otro proceso escribió entre medias), la próxima consulta
+        recarga al usuario desde la base.
+        """
+        with self._aggregate_lock:
+            if self._aggregated_versions.get(user_id, 0) != version - 1:
+                return
+            apply()
+            self._aggregated_versions[user_id] = version
+
+    def get_user_stats(self, user_id: str, context: Optional[UserDataContext] = None) -> UserStats:
+        """Estadísticas de un usuario, con los agregados al día con la base"""
+        if self.stats_aggregator:
+            try:
+                self._sync_stats_aggregate(user_id)
+            except Exception as e:
+                print(f"Error recargando estadísticas de {user_id}: {e}")
+                self.stats_aggregator.discard(user_id)
+        return super().get_user_stats(user_id, context)
+
+    @staticmethod
+    def _bump_version(conn: sqlite3.Connection, user_id: str) -> int:
+        """Incrementar la versión del usuario dentro de la transacción en curso"""
+        conn.execute(
+            "INSERT INTO user_versions (user_id, version) VALUES (?, 1) "
+            "ON CONFLICT (user_id) DO UPDATE SET version = version + 1",
+            (user_id,)
+        )
+        return conn.execute(
+            "SELECT version FROM user_versions WHERE user_id = ?", (user_id,)
+        ).fetchone()[0]
+
+    def store_version(self, user_id: str) -> Optional[int]:
+        """Versión de los datos del usuario en la base (0 si nunca cambió)"""
+        try:
+            row = self._connection().execute(
+                "SELECT version FROM user_versions WHERE user_id = ?", (str(user_id),)
+            ).fetchone()
+            return row[0] if row else 0
+
+        except Exception as e:
+            print(f"Error leyendo versión de datos: {e}")
+            return None
+
+    def close(self):
+        """Cerrar la conexión del hilo actual"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def create_user(self, user: TelegramUser) -> bool:
+        """Crear un nuevo usuario"""
+        try:
+            conn = self._connection()
+            with conn:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO users "
+                    "(user_id, username, first_name, last_name, joined_at, is_active) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        user.user_id,
+                        user.username or "",
+                        user.first_name or "",
+                        user.last_name or "",
+                        user.joined_at.isoformat(),
+                        str(user.is_active)
+                    )
+                )
+                if cursor.rowcount == 1:
+                    version = self._bump_version(conn, user.user_id)
+            if cursor.rowcount != 1:
+                return False  # Usuario ya existe
+            if self.stats_aggregator:
+                self._apply_to_aggregate(user.user_id, version, lambda: None)
+            self._notify_change(user.user_id, "user")
+            return True
+
+        except Exception as e:
+            print(f"Error creando usuario: {e}")
+            return False
+
+    def create_habit(self, habit: Habit) -> bool:
+        """Crear un nuevo hábito"""
+        try:
+            conn = self._connection()
+            with conn:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO habits "
+                    "(user_id, name, name_key, description, target_frequency, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        habit.user_id,
+                        habit.name,
+                        habit.name.lower(),
+                        habit.description or "",
+                        habit.target_frequency,
+                        habit.created_at.isoformat()
+                    )
+                )
+                if cursor.rowcount == 1:
+                    version = self._bump_version(conn, habit.user_id)
+            if cursor.rowcount != 1:
+                return False  # Hábito ya existe
+            if self.stats_aggregator:
+                self._apply_to_aggregate(
+                    habit.user_id, version, lambda: self.stats_aggregator.add_habit(habit.user_id)
+                )
+            self._notify_change(habit.user_id, "habit")
+            return True
+
+        except Exception as e:
+            print(f"Error creando hábito: {e}")
+            return False
+
+    def add_habit_entry(self, entry: HabitEntry, wait: bool = False) -> bool:
+        """Agregar una entrada de hábito (siempre durable al confirmar)"""
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "INSERT INTO entries (user_id, habit_name, completed, date, notes, rating) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        entry.user_id,
+                        entry.habit_name,
+                        int(entry.completed),
+                        entry.date.isoformat(),
+                        entry.notes or "",
+                        entry.rating
+                    )
+                )
+                version = self._bump_version(conn, entry.user_id)
+            if self.stats_aggregator:
+                self._apply_to_aggregate(
+                    entry.user_id, version,
+                    lambda: self.stats_aggregator.add_entry(entry.user_id, entry.date, entry.completed)
+                )
+            self._notify_change(entry.user_id, "entry")
+            return True
+
+        except Exception as e:
+            print(f"Error agregando entrada: {e}")
+            return False
+
+    def get_user_ids(self) -> List[str]:
+        """IDs de todos los usuarios registrados"""
+        try:
+            rows = self._connection().execute("SELECT user_id FROM users ORDER BY rowid").fetchall()
+            return [row[0] for row in rows]
+
+        except Exception as e:
+            print(f"Error obteniendo usuarios: {e}")
+            return []
+
+    def get_user_habits(self, user_id: str) -> List[Dict[str, Any]]:
+        """Obtener todos los hábitos de un usuario"""
+        try:
+            rows = self._connection().execute(
+                "SELECT user_id, name, description, target_frequency, created_at "
+                "FROM habits WHERE user_id = ? ORDER BY id",
+                (user_id,)
+            ).fetchall()
+            return [dict(row) for row in rows]
+
+        except Exception as e:
+            print(f"Error obteniendo hábitos: {e}")
+            return []
+
+    def get_user_entries(self, user_id: str, days: int = 30) -> List[Dict[str, Any]]:
+        """Obtener entradas de un usuario de los últimos N días"""
+        try:
+            cutoff_date = datetime.now() - timedelta(days=days)
+            rows = self._connection().execute(
+                "SELECT user_id, habit_name, completed, date, notes, rating "
+                "FROM entries WHERE user_id = ? AND date >= ? ORDER BY date, id",
+                (user_id, cutoff_date.isoformat())
+            ).fetchall()
+            return [self._entry_record(row) for row in rows]
+
+        except Exception as e:
+            print(f"Error obteniendo entradas: {e}")
+            return []
+
+    def get_user_entries_page(
+        self,
+        user_id: str,
+        since: datetime,
+        until: Optional[datetime] = None,
+        habit_name: Optional[str] = None,
+        limit: int = MAX_ENTRIES_PER_REQUEST,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Página de entradas por fecha con paginación por clave (date, id)"""
+        conditions = ["user_id = ?", "date >= ?"]
+        params: List[Any] = [user_id, since.isoformat()]
+        if until:
+            conditions.append("date < ?")
+            params.append(until.isoformat())
+        if habit_name:
+            conditions.append("habit_name = ?")
+            params.append(habit_name)
+        if cursor:
+            payload = decode_cursor(cursor)
+            try:
+                after_date, after_id = str(payload["d"]), int(payload["i"])
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError("Cursor inválido") from e
+            conditions.append("(date > ? OR (date = ? AND id > ?))")
+            params.extend([after_date, after_date, after_id])
+
+        # Se pide una fila de más para saber si hay otra página
+        rows = self._connection().execute(
+            "SELECT id, user_id, habit_name, completed, date, notes, rating FROM entries "
+            f"WHERE {' AND '.join(conditions)} ORDER BY date, id LIMIT ?",
+            params + [limit + 1]
+        ).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor({"d": rows[-1]["date"], "i": rows[-1]["id"]})
+
+        entries = []
+        for row in rows:
+            record = self._entry_record(row)
+            del record['id']
+            entries.append(record)
+        return entries, next_cursor
+
+    def iter_entries(
+        self,
+        user_id: Optional[str] = None,
+        chunk_size: int = EXPORT_CHUNK_SIZE
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Recorrer entradas en bloques (todas, por id, si no se indica usuario)"""
+        if user_id is not None:
+            yield from super().iter_entries(user_id, chunk_size)
+            return
+
+        last_id = 0
+        while True:
+            # Cada bloque es una consulta completa: el generador puede avanzar
+            # desde hilos distintos, cada uno con su conexión
+            rows = self._connection().execute(
+                "SELECT id, user_id, habit_name, completed, date, notes, rating "
+                "FROM entries WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, chunk_size)
+            ).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1]["id"]
+
+            chunk = []
+            for row in rows:
+                record = self._entry_record(row)
+                del record['id']
+                chunk.append(record)
+            yield chunk
+
+    def get_user_entry_columns(self, user_id: str, days: int = 30) -> EntryColumns:
+        """Entradas de los últimos N días en columnas, sin pasar por dicts"""
+        try:
+            cutoff_date = datetime.now() - timedelta(days=days)
+            rows = self._connection().execute(
+                "SELECT date, completed, rating, habit_name "
+                "FROM entries WHERE user_id = ? AND date >= ?",
+                (user_id, cutoff_date.isoformat())
+            )
+            return EntryColumns.build(rows)
+
+        except Exception as e:
+            print(f"Error obteniendo entradas: {e}")
+            return EntryColumns.build(())
+
+    @staticmethod
+    def _entry_record(row: sqlite3.Row) -> Dict[str, Any]:
+        """Convertir una fila al mismo formato que las hojas de Sheets"""
+        record = dict(row)
+        record['completed'] = str(bool(record['completed']))
+        record['rating'] = record['rating'] if record['rating'] is not None else ""
+        return record
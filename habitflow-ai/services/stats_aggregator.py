@@ -0,0 +1,231 @@
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+from models.schemas import UserStats
+from utils.streaks import compute_streaks
+import bisect
+import threading
+import numpy as np
+
+
+class _UserAggregate:
+    """Contadores de un usuario"""
+
+    __slots__ = ("days", "sorted_days", "last_activity", "streak", "streak_today", "habit_count")
+
+    def __init__(self):
+        self.days: Dict[int, List[int]] = {}  # ordinal del día -> [total, completadas]
+        self.sorted_days: List[int] = []
+        self.last_activity: Optional[datetime] = None
+        # Racha actual calculada para el día streak_today
+        self.streak = 0
+        self.streak_today: Optional[int] = None
+        self.habit_count = 0
+
+
+class StatsAggregator:
+    """Estadísticas por usuario mantenidas de forma incremental en cada escritura
+
+    Guarda, por usuario y día, el total de entradas y las completadas, la
+    última actividad y la racha actual (utils.streaks, recalculada con cada
+    día completado nuevo y una vez al día), de modo que get_stats solo
+    recorre la ventana de días de la tasa de completación. Las ventanas son
+    de días naturales completos.
+    """
+
+    def __init__(self, window_days: int = 30, streak_days: int = 365):
+        self.window_days = window_days
+        self.streak_days = streak_days
+        self._lock = threading.RLock()
+        self._users: Dict[str, _UserAggregate] = {}
+        # Usuarios cuyo agregado no cuadró con el recálculo completo
+        self._excluded: set = set()
+
+    @staticmethod
+    def _parse_date(value: Any) -> Optional[datetime]:
+        """Parsear una fecha ISO (None si está malformada)"""
+        if isinstance(value, datetime):
+            return value
+        try:
+            return datetime.fromisoformat(str(value))
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _is_completed(value: Any) -> bool:
+        """Interpretar el campo completed de una fila"""
+        return str(value).lower() == 'true'
+
+    def load_habits(self, records: Iterable[Dict[str, Any]]):
+        """Reconstruir desde cero el número de hábitos por usuario"""
+        counts: Dict[str, int] = {}
+        for record in records:
+            user_id = str(record['user_id'])
+            counts[user_id] = counts.get(user_id, 0) + 1
+
+        with self._lock:
+            for aggregate in self._users.values():
+                aggregate.habit_count = 0
+            for user_id, count in counts.items():
+                self._aggregate(user_id).habit_count = count
+
+    def load_entries(self, records: Iterable[Dict[str, Any]]):
+        """Reconstruir desde cero los agregados de entradas"""
+        with self._lock:
+            habit_counts = {user_id: a.habit_count for user_id, a in self._users.items()}
+            self._users = {}
+            self._excluded = set()
+            for user_id, count in habit_counts.items():
+                self._aggregate(user_id).habit_count = count
+
+            for record in records:
+                self._apply_entry(
+                    str(record['user_id']), record.get('date'), record.get('completed'),
+                    refresh_streak=False
+                )
+            for aggregate in self._users.values():
+                self._refresh_streak(aggregate)
+
+    def load_user(self, user_id: str, habit_count: int, records: Iterable[Dict[str, Any]]):
+        """Reconstruir desde cero los agregados de un usuario"""
+        with self._lock:
+            if user_id in self._excluded:
+                return
+            aggregate = _UserAggregate()
+            aggregate.habit_count = habit_count
+            self._users[user_id] = aggregate
+            for record in records:
+                self._apply_entry(user_id, record.get('date'), record.get('completed'), refresh_streak=False)
+            self._refresh_streak(aggregate)
+
+    def add_habit(self, user_id: str):
+        """Registrar un hábito nuevo"""
+        with self._lock:
+            if user_id in self._excluded:
+                return
+            self._aggregate(user_id).habit_count += 1
+
+    def add_entry(self, user_id: str, date_value: Any, completed_value: Any):
+        """Registrar una entrada nueva"""
+        with self._lock:
+            if user_id in self._excluded:
+                return
+            self._apply_entry(user_id, date_value, completed_value)
+
+    def discard(self, user_id: str):
+        """Dejar de servir agregados de un usuario (se recalcularán completos)"""
+        with self._lock:
+            self._users.pop(user_id, None)
+            self._excluded.add(user_id)
+
+    def user_ids(self) -> List[str]:
+        """Usuarios con agregados"""
+        with self._lock:
+            return list(self._users.keys())
+
+    def _aggregate(self, user_id: str) -> _UserAggregate:
+        """Agregado de un usuario (se crea si no existe)"""
+        aggregate = self._users.get(user_id)
+        if aggregate is None:
+            aggregate = _UserAggregate()
+            self._users[user_id] = aggregate
+        return aggregate
+
+    def _apply_entry(
+        self,
+        user_id: str,
+        date_value: Any,
+        completed_value: Any,
+        refresh_streak: bool = True
+    ):
+        """Sumar una entrada al día que le corresponde y actualizar la racha"""
+        entry_date = self._parse_date(date_value)
+        if entry_date is None:
+            return  # Ignorar fechas malformadas
+
+        aggregate = self._aggregate(user_id)
+        day = entry_date.toordinal()
+        counts = aggregate.days.get(day)
+        if counts is None:
+            counts = [0, 0]
+            aggregate.days[day] = counts
+            bisect.insort(aggregate.sorted_days, day)
+        counts[0] += 1
+        if self._is_completed(completed_value):
+            counts[1] += 1
+
+        if aggregate.last_activity is None or entry_date > aggregate.last_activity:
+            aggregate.last_activity = entry_date
+
+        if refresh_streak and counts[1]:
+            self._refresh_streak(aggregate)
+
+    def _refresh_streak(self, aggregate: _UserAggregate, today: Optional[int] = None):
+        """Recalcular la racha actual del usuario (solo cuenta el último año)"""
+        if today is None:
+            today = date.today().toordinal()
+        start = bisect.bisect_left(aggregate.sorted_days, today - self.streak_days)
+        days = aggregate.sorted_days[start:]
+        aggregate.streak, _ = compute_streaks(
+            np.array(days, dtype=np.int64),
+            np.array([aggregate.days[day][1] > 0 for day in days], dtype=bool),
+            today
+        )
+        aggregate.streak_today = today
+
+    def get_stats(self, user_id: str, now: Optional[datetime] = None) -> Optional[UserStats]:
+        """Estadísticas del usuario (None si no hay agregados para él)"""
+        now = now or datetime.now()
+        with self._lock:
+            aggregate = self._users.get(user_id)
+            if aggregate is None:
+                return None
+
+            window_start = (now - timedelta(days=self.window_days)).toordinal()
+            start = bisect.bisect_left(aggregate.sorted_days, window_start)
+            total = completed = 0
+            for day in aggregate.sorted_days[start:]:
+                day_total, day_completed = aggregate.days[day]
+                total += day_total
+                completed += day_completed
+
+            # La racha calculada otro día puede haber caducado
+            if aggregate.streak_today != now.toordinal():
+                self._refresh_streak(aggregate, now.toordinal())
+
+            last_activity = now
+            if aggregate.last_activity and aggregate.last_activity.toordinal() >= window_start:
+                last_activity = aggregate.last_activity
+
+            return UserStats(
+                user_id=user_id,
+                total_habits=aggregate.habit_count,
+                active_habits=aggregate.habit_count,
+                completion_rate=completed / total if total else 0.0,
+                streak_days=aggregate.streak,
+                last_activity=last_activity
+            )
+
+    def boundary_has_entries(self, user_id: str, now: Optional[datetime] = None) -> bool:
+        """Indicar si el primer día de la ventana tiene entradas
+
+        Ese día se cuenta completo aquí y solo en parte en el recálculo por
+        fecha y hora, así que la tasa de completación puede diferir.
+        """
+        now = now or datetime.now()
+        with self._lock:
+            aggregate = self._users.get(user_id)
+            if aggregate is None:
+                return False
+            return (now - timedelta(days=self.window_days)).toordinal() in aggregate.days
+
+    def matches(self, fast: UserStats, full: UserStats, now: Optional[datetime] = None) -> bool:
+        """Comparar los agregados de un usuario con su recálculo completo"""
+        if fast.total_habits != full.total_habits or fast.streak_days != full.streak_days:
+            return False
+
+        if self.boundary_has_entries(fast.user_id, now):
+            return True
+
+        # Sin actividad en la ventana ambos usan "ahora": se tolera el desfase
+        same_activity = abs((fast.last_activity - full.last_activity).total_seconds()) < 1
+        return same_activity and abs(fast.completion_rate - full.completion_rate) < 1e-9
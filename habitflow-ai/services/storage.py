@@ -0,0 +1,288 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Callable, Iterator, List, Dict, Any, Optional, Tuple
+from models.schemas import Habit, HabitAnalytics, HabitEntry, TelegramUser, UserStats
+from services.data_context import UserDataContext
+from services.data_versions import DataVersions
+from services.entry_store import EntryColumns
+from services.pagination import paginate_sorted
+from services.user_index import UserIndex
+from services.shared_cache import SharedCache
+from services.stats_aggregator import StatsAggregator
+from utils.analytics import analyze_user
+from utils.streaks import compute_streaks
+from utils.config import (
+    DEFAULT_STORAGE_BACKEND, DEFAULT_SQLITE_DB_PATH, DEFAULT_STATS_AGGREGATOR_ENABLED,
+    DEFAULT_SHARED_CACHE_PATH, DEFAULT_SHARED_CACHE_TTL, EXPORT_CHUNK_SIZE, MAX_ENTRIES_PER_REQUEST,
+    get_env_or_default
+)
+import os
+
+
+class StorageBackend(ABC):
+    """Interfaz común para los motores de almacenamiento de HabitFlow AI"""
+
+    # Si el motor guarda una versión por usuario que ven todos los procesos
+    stores_versions = False
+
+    def __init__(self):
+        self._change_listeners: List[Callable[[str, str], None]] = []
+        # Estadísticas incrementales; cada motor decide cómo alimentarlas
+        self.stats_aggregator: Optional[StatsAggregator] = None
+        if get_env_or_default(
+            "STATS_AGGREGATOR_ENABLED", DEFAULT_STATS_AGGREGATOR_ENABLED
+        ).lower() == "true":
+            self.stats_aggregator = StatsAggregator()
+        
+        # Caché compartida entre procesos; cada escritura invalida al usuario
+        self.shared_cache: Optional[SharedCache] = None
+        shared_cache_path = get_env_or_default("SHARED_CACHE_PATH", DEFAULT_SHARED_CACHE_PATH)
+        if shared_cache_path:
+            self.shared_cache = SharedCache(
+                shared_cache_path,
+                ttl=float(get_env_or_default("SHARED_CACHE_TTL", str(DEFAULT_SHARED_CACHE_TTL)))
+            )
+            self.add_change_listener(self.shared_cache.on_storage_change)
+        
+        # Versión de los datos de cada usuario (ETags de la API)
+        self.data_versions = DataVersions(
+            self.shared_cache, self.store_version if self.stores_versions else None
+        )
+        self.add_change_listener(self.data_versions.on_storage_change)
+
+    def add_change_listener(self, listener: Callable[[str, str], None]):
+        """Registrar un callback(user_id, kind) que se llama en cada escritura
+
+        kind es "user", "habit" o "entry".
+        """
+        self._change_listeners.append(listener)
+
+    def _notify_change(self, user_id: str, kind: str):
+        """Avisar a los listeners de que cambiaron los datos de un usuario"""
+        for listener in self._change_listeners:
+            try:
+                listener(user_id, kind)
+            except Exception as e:
+                print(f"Error notificando cambio de datos: {e}")
+
+    def get_data_version(self, user_id: str) -> Optional[str]:
+        """Versión de los datos de un usuario; cambia con cada escritura"""
+        return self.data_versions.version(user_id)
+
+    def store_version(self, user_id: str) -> Optional[int]:
+        """Versión de los datos del usuario guardada en el almacén (solo si stores_versions)"""
+        return None
+
+    @abstractmethod
+    def create_user(self, user: TelegramUser) -> bool:
+        """Crear un nuevo usuario (False si ya existe)"""
+
+    @abstractmethod
+    def create_habit(self, habit: Habit) -> bool:
+        """Crear un nuevo hábito (False si ya existe para el usuario)"""
+
+    @abstractmethod
+    def add_habit_entry(self, entry: HabitEntry, wait: bool = False) -> bool:
+        """Agregar una entrada de hábito
+
+        Los motores con escritura diferida devuelven al encolar; con
+        wait=True esperan a que la entrada quede guardada.
+        """
+
+    @abstractmethod
+    def get_user_ids(self) -> List[str]:
+        """IDs de todos los usuarios registrados"""
+
+    @abstractmethod
+    def get_user_habits(self, user_id: str) -> List[Dict[str, Any]]:
+        """Obtener todos los hábitos de un usuario"""
+
+    @abstractmethod
+    def get_user_entries(self, user_id: str, days: int = 30) -> List[Dict[str, Any]]:
+        """Obtener entradas de un usuario de los últimos N días"""
+
+    def get_user_entries_page(
+        self,
+        user_id: str,
+        since: datetime,
+        until: Optional[datetime] = None,
+        habit_name: Optional[str] = None,
+        limit: int = MAX_ENTRIES_PER_REQUEST,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Página de entradas con since <= fecha < until, ordenadas por fecha
+
+        Devuelve las entradas y el cursor de la página siguiente (None si no
+        hay más). Un cursor malformado lanza ValueError. Esta versión filtra
+        get_user_entries; los motores con índice la sobrescriben.
+        """
+        days = max(0, (datetime.now() - since).days + 1)
+        dated = []
+        for position, record in enumerate(self.get_user_entries(user_id, days=days)):
+            if habit_name and record.get('habit_name') != habit_name:
+                continue
+            entry_date = UserIndex.parse_date(record.get('date'))
+            if entry_date is not None:
+                dated.append((entry_date, position, record))
+        dated.sort(key=lambda item: (item[0], item[1]))
+
+        return paginate_sorted(
+            [item[0] for item in dated], [item[2] for item in dated],
+            since, until, limit, cursor
+        )
+
+    def iter_entries(
+        self,
+        user_id: Optional[str] = None,
+        chunk_size: int = EXPORT_CHUNK_SIZE
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Recorrer entradas en bloques para exportarlas sin cargarlas todas
+
+        Con user_id, las del usuario en orden de fecha (paginando con
+        get_user_entries_page); sin él, las de todos los usuarios, que cada
+        motor debe implementar.
+        """
+        if user_id is None:
+            raise NotImplementedError("Este motor no permite exportar todos los usuarios")
+
+        cursor = None
+        while True:
+            page, cursor = self.get_user_entries_page(
+                user_id, datetime.min, limit=chunk_size, cursor=cursor
+            )
+            if page:
+                yield page
+            if not cursor:
+                return
+
+    def get_user_entry_columns(self, user_id: str, days: int = 30) -> EntryColumns:
+        """Entradas de los últimos N días en columnas (para las analíticas)
+
+        Los motores que mantienen las columnas en memoria o pueden leerlas
+        directamente lo sobrescriben.
+        """
+        return EntryColumns.from_records(self.get_user_entries(user_id, days))
+
+    def close(self):
+        """Liberar recursos del motor"""
+
+    def get_user_stats(self, user_id: str, context: Optional[UserDataContext] = None) -> UserStats:
+        """Obtener estadísticas de un usuario (O(1) con los agregados incrementales)"""
+        if self.stats_aggregator:
+            stats = self.stats_aggregator.get_stats(user_id)
+            if stats is not None:
+                return stats
+        if self.shared_cache:
+            return self.shared_cache.get_or_compute(
+                f"stats:{user_id}", self.shared_cache.user_tag(user_id),
+                lambda: self._compute_user_stats(user_id, context)
+            )
+        return self._compute_user_stats(user_id, context)
+
+    def get_user_analytics(
+        self,
+        user_id: str,
+        days: int = 30,
+        context: Optional[UserDataContext] = None
+    ) -> HabitAnalytics:
+        """Tasas por día de la semana y por hábito, tasas recientes y rachas"""
+        if context is None:
+            context = UserDataContext(self, user_id, max_days=days)
+        return analyze_user(user_id, context.columns(days=days))
+
+    def reconcile_stats(self) -> int:
+        """Comparar los agregados con el recálculo completo de cada usuario
+
+        Los usuarios que no cuadran se recalculan completos en cada consulta
+        hasta la próxima reconstrucción. Devuelve cuántos no cuadraron.
+        """
+        if not self.stats_aggregator:
+            return 0
+
+        user_ids = self.stats_aggregator.user_ids()
+        mismatches = 0
+        for user_id in user_ids:
+            fast = self.stats_aggregator.get_stats(user_id)
+            full = self._compute_user_stats(user_id)
+            if fast is not None and not self.stats_aggregator.matches(fast, full):
+                print(f"Estadísticas incrementales descuadradas para {user_id}: {fast} != {full}")
+                self.stats_aggregator.discard(user_id)
+                mismatches += 1
+
+        print(f"Estadísticas reconciliadas: {len(user_ids)} usuarios, {mismatches} descuadres")
+        return mismatches
+
+    def _compute_user_stats(self, user_id: str, context: Optional[UserDataContext] = None) -> UserStats:
+        """Calcular estadísticas de un usuario desde las entradas"""
+        try:
+            # Un único contexto evita descargar las mismas hojas varias veces
+            if context is None:
+                context = UserDataContext(self, user_id)
+
+            habits = context.habits()
+            columns = context.columns(days=30)
+
+            total_habits = len(habits)
+            active_habits = len([h for h in habits if h])  # Simplificado por ahora
+
+            # Calcular tasa de completación
+            completion_rate = columns.completed_count() / len(columns) if len(columns) else 0.0
+
+            # Calcular racha
+            streak_days = self._calculate_streak(user_id, context.columns(days=365))
+
+            # Última actividad
+            last_activity = columns.last_activity() or datetime.now()
+
+            return UserStats(
+                user_id=user_id,
+                total_habits=total_habits,
+                active_habits=active_habits,
+                completion_rate=completion_rate,
+                streak_days=streak_days,
+                last_activity=last_activity
+            )
+
+        except Exception as e:
+            print(f"Error calculando estadísticas: {e}")
+            return UserStats(
+                user_id=user_id,
+                total_habits=0,
+                active_habits=0,
+                completion_rate=0.0,
+                streak_days=0,
+                last_activity=datetime.now()
+            )
+
+    def _calculate_streak(self, user_id: str, columns: Optional[EntryColumns] = None) -> int:
+        """Calcular la racha actual de días naturales con algún hábito completado"""
+        try:
+            if columns is None:
+                columns = self.get_user_entry_columns(user_id, days=365)  # Último año
+
+            current, _ = compute_streaks(columns.days, columns.completed)
+            return current
+
+        except Exception as e:
+            print(f"Error calculando racha: {e}")
+            return 0
+
+
+def create_storage_service() -> StorageBackend:
+    """Crear el motor de almacenamiento elegido con STORAGE_BACKEND (sheets | sqlite)"""
+    backend = get_env_or_default("STORAGE_BACKEND", DEFAULT_STORAGE_BACKEND).lower()
+
+    if backend == "sqlite":
+        from services.sqlite_service import SQLiteStorageService
+        return SQLiteStorageService(
+            get_env_or_default("SQLITE_DB_PATH", DEFAULT_SQLITE_DB_PATH)
+        )
+
+    if backend == "sheets":
+        from services.sheets_service import GoogleSheetsService
+        return GoogleSheetsService(
+            credentials_file=os.getenv("GOOGLE_SHEETS_CREDENTIALS_FILE"),
+            spreadsheet_id=os.getenv("SPREADSHEET_ID")
+        )
+
+    raise ValueError(f"STORAGE_BACKEND no soportado: {backend}")
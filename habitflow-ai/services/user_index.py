@@ -0,0 +1,114 @@
+from datetime import datetime
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+from services.pagination import paginate_sorted
+import bisect
+import threading
+
+
+class UserIndex:
+    """Índice secundario por usuario sobre hábitos y entradas"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._habits: Dict[str, List[Dict[str, Any]]] = {}
+        # Por usuario y por (usuario, hábito): fechas ordenadas y entradas en el mismo orden
+        self._entry_dates: Dict[Hashable, List[datetime]] = {}
+        self._entries: Dict[Hashable, List[Dict[str, Any]]] = {}
+
+    @staticmethod
+    def parse_date(value: Any) -> Optional[datetime]:
+        """Parsear la fecha ISO de una entrada (None si está malformada)"""
+        try:
+            parsed = datetime.fromisoformat(str(value))
+        except ValueError:
+            return None
+        # Las fechas se escriben sin zona horaria; normalizar por si acaso
+        return parsed.replace(tzinfo=None) if parsed.tzinfo else parsed
+
+    def load_habits(self, records: List[Dict[str, Any]]):
+        """Reconstruir el índice de hábitos desde la hoja completa"""
+        habits: Dict[str, List[Dict[str, Any]]] = {}
+        for record in records:
+            habits.setdefault(str(record['user_id']), []).append(record)
+
+        with self._lock:
+            self._habits = habits
+
+    def load_entries(self, records: List[Dict[str, Any]]):
+        """Reconstruir el índice de entradas desde la hoja completa"""
+        grouped: Dict[str, List[tuple]] = {}
+        for position, record in enumerate(records):
+            entry_date = self.parse_date(record.get('date'))
+            if entry_date is None:
+                continue  # Ignorar fechas malformadas
+            item = (entry_date, position, record)
+            for key in self._series_keys(record):
+                grouped.setdefault(key, []).append(item)
+
+        entry_dates: Dict[Hashable, List[datetime]] = {}
+        entries: Dict[Hashable, List[Dict[str, Any]]] = {}
+        for key, items in grouped.items():
+            # El orden por posición mantiene estables las entradas del mismo instante
+            items.sort(key=lambda item: (item[0], item[1]))
+            entry_dates[key] = [item[0] for item in items]
+            entries[key] = [item[2] for item in items]
+
+        with self._lock:
+            self._entry_dates = entry_dates
+            self._entries = entries
+
+    def add_habit(self, record: Dict[str, Any]):
+        """Agregar un hábito recién escrito"""
+        with self._lock:
+            self._habits.setdefault(str(record['user_id']), []).append(record)
+
+    def add_entry(self, record: Dict[str, Any]):
+        """Agregar una entrada recién escrita manteniendo el orden por fecha"""
+        entry_date = self.parse_date(record.get('date'))
+        if entry_date is None:
+            return
+
+        with self._lock:
+            for key in self._series_keys(record):
+                dates = self._entry_dates.setdefault(key, [])
+                entries = self._entries.setdefault(key, [])
+                position = bisect.bisect_right(dates, entry_date)
+                dates.insert(position, entry_date)
+                entries.insert(position, record)
+
+    @staticmethod
+    def _series_keys(record: Dict[str, Any]) -> Tuple[Hashable, ...]:
+        """Series donde se indexa una entrada: la del usuario y la de su hábito"""
+        user_id = str(record['user_id'])
+        return user_id, (user_id, str(record.get('habit_name', '')))
+
+    def habits(self, user_id: str) -> List[Dict[str, Any]]:
+        """Hábitos de un usuario"""
+        with self._lock:
+            return list(self._habits.get(user_id, []))
+
+    def entries_since(self, user_id: str, cutoff: datetime) -> List[Dict[str, Any]]:
+        """Entradas de un usuario con fecha >= cutoff, ordenadas por fecha"""
+        with self._lock:
+            dates = self._entry_dates.get(user_id)
+            if not dates:
+                return []
+            start = bisect.bisect_left(dates, cutoff)
+            return self._entries[user_id][start:]
+
+    def entries_page(
+        self,
+        user_id: str,
+        since: datetime,
+        until: Optional[datetime] = None,
+        habit_name: Optional[str] = None,
+        limit: int = 1000,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Página de entradas de un usuario (o de uno de sus hábitos) por fecha"""
+        key = (user_id, habit_name) if habit_name else user_id
+        with self._lock:
+            return paginate_sorted(
+                self._entry_dates.get(key, []), self._entries.get(key, []),
+                since, until, limit, cursor
+            )
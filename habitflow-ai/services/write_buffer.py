@@ -0,0 +1,347 @@
+from typing import Any, Callable, IO, List, Optional, Tuple
+import atexit
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo del journal
+    fcntl = None
+
+
+MAX_JOURNALS = 32  # journals con sufijo por ruta (uno por proceso o instancia a la vez)
+
+
+class PendingWrite:
+    """Escritura encolada; permite esperar a que quede guardada"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.success = False
+
+    def resolve(self, success: bool):
+        """Marcar la escritura como terminada"""
+        self.success = success
+        self._event.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Esperar a que la fila esté en Sheets (False si no se confirmó a tiempo)"""
+        if not self._event.wait(timeout):
+            return False
+        return self.success
+
+
+class EntryWriteBuffer:
+    """Buffer de escrituras que agrupa filas en un único append_rows
+
+    Las filas se vacían al llegar a max_batch o tras max_delay segundos.
+    Cada fila encolada se guarda antes en un journal local, de modo que un
+    fallo de Sheets o una caída del proceso no pierde entradas: se
+    reintentan hasta confirmarse y se recuperan al arrancar.
+
+    Los errores pasajeros se reintentan sin límite. Un lote rechazado
+    (is_rejection) max_retries veces seguidas se divide por la mitad hasta
+    aislar la fila que lo rechaza; esa fila pasa al fichero de descartes
+    (<journal>.dead.jsonl) y su escritura se resuelve como fallida.
+
+    Cada journal tiene un único dueño, con un bloqueo exclusivo sobre
+    <journal>.lock: si otra instancia (el bot y la API en --mode both, otro
+    worker) ya tiene la ruta, se usa la siguiente libre con sufijo
+    (journal.1.jsonl, ...). Al arrancar, el dueño adopta los journals con
+    sufijo que no tienen dueño, así cada fila pendiente se reenvía una vez.
+    """
+
+    def __init__(
+        self,
+        flush_rows: Callable[[List[List[Any]]], None],
+        max_batch: int = 50,
+        max_delay: float = 2.0,
+        journal_path: Optional[str] = None,
+        retry_delay: float = 5.0,
+        max_retries: int = 5,
+        is_rejection: Callable[[Exception], bool] = lambda error: True
+    ):
+        self._flush_rows = flush_rows
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.retry_delay = retry_delay
+        self.max_retries = max_retries
+        self._is_rejection = is_rejection
+        self._journal_lock: Optional[IO] = None
+        self._journal_root = journal_path
+        self.journal_path = self._claim_journal(journal_path) if journal_path else None
+        self.dead_letter_path = None
+        if journal_path:
+            base, ext = os.path.splitext(journal_path)
+            self.dead_letter_path = f"{base}.dead{ext}"
+
+        # Aislamiento de filas rechazadas: rechazos seguidos del lote actual,
+        # tamaño de lote reducido y filas del lote rechazado aún sin aislar
+        self._rejections = 0
+        self._batch_limit = max_batch
+        self._suspect_rows = 0
+
+        self._cond = threading.Condition()
+        self._queue: List[Tuple[List[Any], Optional[PendingWrite]]] = []
+        self._first_enqueued_at: Optional[float] = None
+        self._flush_requested = False
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+        self._load_journal()
+
+    @staticmethod
+    def _lock(path: str) -> Optional[IO]:
+        """Bloqueo exclusivo de un journal (None si ya tiene dueño)
+
+        El bloqueo va en un fichero aparte que nunca se borra: el journal se
+        reemplaza en cada reescritura.
+        """
+        if fcntl is None:
+            return open(f"{path}.lock", "a")
+        lock_file = open(f"{path}.lock", "a")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    @staticmethod
+    def _candidates(journal_path: str) -> List[str]:
+        base, ext = os.path.splitext(journal_path)
+        return [journal_path] + [f"{base}.{n}{ext}" for n in range(1, MAX_JOURNALS)]
+
+    def _claim_journal(self, journal_path: str) -> str:
+        """Primera ruta del journal sin dueño, bloqueada para esta instancia"""
+        for candidate in self._candidates(journal_path):
+            lock_file = self._lock(candidate)
+            if lock_file is not None:
+                self._journal_lock = lock_file
+                if candidate != journal_path:
+                    print(f"Journal de escrituras {journal_path} en uso; usando {candidate}")
+                return candidate
+        raise RuntimeError(f"Todos los journals de {journal_path} están en uso")
+
+    @staticmethod
+    def _read_rows(path: str) -> List[List[Any]]:
+        if not os.path.exists(path):
+            return []
+        try:
+            with open(path, "r", encoding="utf-8") as journal:
+                return [json.loads(line) for line in journal if line.strip()]
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error leyendo journal de escrituras {path}: {e}")
+            return []
+
+    def _load_journal(self):
+        """Recuperar filas que quedaron sin confirmar en una ejecución anterior
+
+        Además del journal propio se adoptan los de la misma ruta que no
+        tienen dueño (instancias que no volvieron a arrancar).
+        """
+        if not self.journal_path:
+            return
+
+        rows = self._read_rows(self.journal_path)
+        adopted = []
+        for path in self._candidates(self._journal_root):
+            if path == self.journal_path or not os.path.exists(path):
+                continue
+            lock_file = self._lock(path)
+            if lock_file is None:
+                continue  # Tiene dueño: lo reenvía él
+            sibling_rows = self._read_rows(path)
+            if sibling_rows:
+                rows.extend(sibling_rows)
+                adopted.append((path, lock_file))
+            else:
+                lock_file.close()
+
+        if rows:
+            print(f"Recuperando {len(rows)} entradas pendientes del journal")
+            self._queue = [(row, None) for row in rows]
+            self._first_enqueued_at = time.monotonic()
+        if adopted:
+            # Primero quedan en el journal propio; después se vacían los adoptados
+            self._rewrite_journal()
+            for path, lock_file in adopted:
+                os.remove(path)
+                lock_file.close()
+
+    def recovered_rows(self) -> List[List[Any]]:
+        """Filas recuperadas del journal que aún no están en Sheets"""
+        with self._cond:
+            return [row for row, _ in self._queue]
+
+    @property
+    def pending_count(self) -> int:
+        """Número de filas en cola"""
+        with self._cond:
+            return len(self._queue)
+
+    def start(self):
+        """Iniciar el hilo que vacía el buffer"""
+        if self._thread is not None:
+            return
+
+        self._thread = threading.Thread(
+            target=self._flush_loop,
+            name="sheets-write-buffer",
+            daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, row: List[Any]) -> PendingWrite:
+        """Encolar una fila (queda en el journal antes de devolver)"""
+        pending = PendingWrite()
+        with self._cond:
+            self._append_journal(row)
+            if not self._queue:
+                self._first_enqueued_at = time.monotonic()
+            self._queue.append((row, pending))
+            self._cond.notify()
+        return pending
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Forzar el vaciado y esperar a que la cola quede vacía"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify()
+            while self._queue:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 10.0):
+        """Vaciar lo pendiente, detener el hilo y liberar el journal (al cerrar la aplicación)"""
+        if self._thread is None:
+            self._release_journal()
+            return
+
+        self.flush(timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+        if self.pending_count:
+            print(f"Quedan {self.pending_count} entradas en el journal; se enviarán al reiniciar")
+        self._release_journal()
+
+    def _release_journal(self):
+        """Soltar el bloqueo del journal: otra instancia puede adoptarlo"""
+        if self._journal_lock is not None:
+            self._journal_lock.close()
+            self._journal_lock = None
+
+    def _flush_loop(self):
+        """Esperar a que haya un lote listo y enviarlo"""
+        while True:
+            with self._cond:
+                while not self._batch_ready():
+                    if self._stopping:
+                        return
+                    self._cond.wait(self._time_to_deadline())
+                batch = self._queue[:self._batch_limit]
+
+            try:
+                self._flush_rows([row for row, _ in batch])
+            except Exception as e:
+                if self._is_rejection(e):
+                    self._rejections += 1
+                if self._rejections < self.max_retries:
+                    print(f"Error enviando lote de {len(batch)} entradas (se reintentará): {e}")
+                    with self._cond:
+                        if self._stopping:
+                            return
+                        self._cond.wait(self.retry_delay)
+                    continue
+
+                self._rejections = 0
+                if len(batch) > 1:
+                    # Reintentar por mitades hasta dar con la fila rechazada
+                    print(f"Lote de {len(batch)} entradas rechazado {self.max_retries} veces; se divide: {e}")
+                    self._batch_limit = (len(batch) + 1) // 2
+                    self._suspect_rows = len(batch)
+                    continue
+                print(f"Entrada rechazada {self.max_retries} veces; se descarta: {e}")
+                self._dead_letter(batch[0][0])
+                self._batch_limit = self.max_batch
+                self._suspect_rows = 0
+                self._done(batch, success=False)
+                continue
+
+            self._rejections = 0
+            self._suspect_rows -= len(batch)
+            if self._suspect_rows <= 0:
+                self._batch_limit = self.max_batch
+            self._done(batch, success=True)
+
+    def _done(self, batch: List[Tuple[List[Any], Optional[PendingWrite]]], success: bool):
+        """Quitar de la cola y del journal un lote terminado y resolver sus escrituras"""
+        with self._cond:
+            del self._queue[:len(batch)]
+            self._first_enqueued_at = time.monotonic() if self._queue else None
+            if not self._queue:
+                self._flush_requested = False
+            self._rewrite_journal()
+            self._cond.notify_all()
+
+        for _, pending in batch:
+            if pending is not None:
+                pending.resolve(success)
+
+    def _batch_ready(self) -> bool:
+        """Indicar si toca enviar (tamaño, tiempo, vaciado forzado o cierre)"""
+        if not self._queue:
+            return False
+        if self._flush_requested or self._stopping:
+            return True
+        if len(self._queue) >= self.max_batch:
+            return True
+        return self._time_to_deadline() <= 0
+
+    def _time_to_deadline(self) -> Optional[float]:
+        """Segundos hasta que vence la ventana de la fila más antigua"""
+        if self._first_enqueued_at is None:
+            return None
+        return self._first_enqueued_at + self.max_delay - time.monotonic()
+
+    def _append_journal(self, row: List[Any]):
+        """Guardar una fila en el journal de forma durable"""
+        if not self.journal_path:
+            return
+        with open(self.journal_path, "a", encoding="utf-8") as journal:
+            journal.write(json.dumps(row, ensure_ascii=False) + "\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+
+    def _dead_letter(self, row: List[Any]):
+        """Guardar una fila descartada para revisarla a mano"""
+        if not self.dead_letter_path:
+            print(f"Entrada descartada: {json.dumps(row, ensure_ascii=False)}")
+            return
+        with open(self.dead_letter_path, "a", encoding="utf-8") as dead_letter:
+            dead_letter.write(json.dumps(row, ensure_ascii=False) + "\n")
+            dead_letter.flush()
+            os.fsync(dead_letter.fileno())
+
+    def _rewrite_journal(self):
+        """Reescribir el journal con las filas que siguen pendientes"""
+        if not self.journal_path:
+            return
+        tmp_path = f"{self.journal_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as journal:
+            for row, _ in self._queue:
+                journal.write(json.dumps(row, ensure_ascii=False) + "\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+        os.replace(tmp_path, self.journal_path)
@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta
+import json
+import pytest
+from models.schemas import AIInsight, Habit, HabitEntry, TelegramUser
+from services.ai_service import AIAnalysisService
+from services.data_context import UserDataContext
+from services.insight_store import InsightStore
+from services.prompt_builder import InsightPromptBuilder
+from services.sqlite_service import SQLiteStorageService
+
+
+class Response:
+    usage_metadata = None
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeModel:
+    """generate_content que responde en orden los textos indicados"""
+
+    def __init__(self, *texts):
+        self.texts = list(texts)
+        self.prompts = []
+
+    def generate_content(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return Response(self.texts.pop(0))
+
+
+def model_insights(text: str):
+    return json.dumps([{"insight": text, "category": "pattern", "confidence": 0.8}])
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.delenv("SHARED_CACHE_PATH", raising=False)
+    storage = SQLiteStorageService(str(tmp_path / "habits.db"))
+    for user_id in ("1", "2"):
+        storage.create_user(TelegramUser(user_id=user_id))
+        storage.create_habit(Habit(name="Leer", user_id=user_id))
+        for day in range(5):
+            storage.add_habit_entry(HabitEntry(
+                habit_name="Leer", user_id=user_id, completed=True,
+                date=datetime.now() - timedelta(days=day)
+            ))
+    return storage
+
+
+def make_service(tmp_path, monkeypatch, engine: str) -> AIAnalysisService:
+    monkeypatch.setenv("INSIGHTS_ENGINE", engine)
+    return AIAnalysisService("x", insight_store=InsightStore(str(tmp_path / "insights.db")))
+
+
+def test_rules_engine_serves_stored_insights(storage, tmp_path, monkeypatch):
+    ai = make_service(tmp_path, monkeypatch, "rules")
+    ai.model = FakeModel()
+    rules = ai.generate_insights("1", storage)
+    assert rules and all(i.insight != "del planificador" for i in rules)
+
+    # Lo que guarda el planificador se sirve aunque el motor sea rules
+    fingerprint = ai.insights_fingerprint(UserDataContext(storage, "1"))
+    stored = [AIInsight(user_id="1", insight="del planificador", category="pattern", confidence=0.8)]
+    ai.insight_store.save("1", fingerprint, stored)
+
+    assert [i.insight for i in ai.generate_insights("1", storage)] == ["del planificador"]
+    assert [i.insight for i in ai.get_cached_insights("1", storage)] == ["del planificador"]
+    texts = [i.insight for i in ai.get_cached_insights("2", storage)]
+    assert texts == [i.insight for i in ai.generate_insights("2", storage)]
+    assert ai.model.prompts == []
+
+
+def test_batch_prompt_has_one_section_per_user():
+    assert InsightPromptBuilder().batch_prompt(["a", "b"]) == "### u1\na\n\n### u2\nb"
+
+
+def test_batch_response_sections_and_per_user_fallback(storage, tmp_path, monkeypatch):
+    ai = make_service(tmp_path, monkeypatch, "llm")
+    ai.model = FakeModel(
+        # u2 viene malformada: ese usuario se pide aparte
+        "```json\n" + json.dumps({
+            "u1": [{"insight": "lote 1", "category": "pattern", "confidence": 0.8}],
+            "u2": "no es una lista",
+        }) + "\n```",
+        model_insights("individual 2"),
+    )
+
+    results = ai.generate_insights_batch(["1", "2"], storage)
+
+    assert [i.insight for i in results["1"]] == ["lote 1"]
+    assert [i.insight for i in results["2"]] == ["individual 2"]
+    assert "### u1" in ai.model.prompts[0] and "### u2" in ai.model.prompts[0]
+    assert "###" not in ai.model.prompts[1]
+    # Los dos quedan guardados: una segunda pasada no llama al modelo
+    assert ai.insight_store.get("1").insights[0].insight == "lote 1"
+    assert ai.generate_insights_batch(["1", "2"], storage).keys() == {"1", "2"}
+    assert len(ai.model.prompts) == 2
+
+
+def test_unreadable_batch_falls_back_to_one_call_per_user(storage, tmp_path, monkeypatch):
+    ai = make_service(tmp_path, monkeypatch, "llm")
+    ai.model = FakeModel("esto no es JSON", model_insights("uno"), model_insights("dos"))
+
+    results = ai.generate_insights_batch(["1", "2"], storage)
+
+    assert {user_id: [i.insight for i in insights] for user_id, insights in results.items()} == {
+        "1": ["uno"], "2": ["dos"]
+    }
+    assert len(ai.model.prompts) == 3
+
+
+def test_insight_items_are_validated():
+    parse = AIAnalysisService._parse_insight_items
+    insights = parse([
+        {"insight": "bien", "category": "pattern", "confidence": 0.9},
+        {"insight": "", "category": "pattern"},
+        {"insight": "confianza imposible", "confidence": 7},
+        "texto suelto",
+    ], "1")
+    assert [i.insight for i in insights] == ["bien"]
+    for items in ([], {"insight": "x"}, [{"insight": "x", "confidence": "alta"}]):
+        with pytest.raises(ValueError):
+            parse(items, "1")
@@ -0,0 +1,57 @@
+from datetime import date, datetime, timedelta
+import pytest
+from services.entry_store import EntryColumns
+from utils.analytics import analyze_all, analyze_user, best_and_worst_weekday
+
+
+TODAY = date(2026, 3, 18).toordinal()  # Miércoles
+
+
+def columns(*entries) -> EntryColumns:
+    """Entradas (días atrás, hábito, completada)"""
+    return EntryColumns.from_records(
+        {
+            "date": (datetime.fromordinal(TODAY - days_ago) + timedelta(hours=9)).isoformat(),
+            "habit_name": habit,
+            "completed": str(done),
+        }
+        for days_ago, habit, done in entries
+    )
+
+
+def test_analyze_user_rates_and_streaks():
+    analytics = analyze_user("1", columns(
+        (0, "Leer", True), (1, "Leer", True), (2, "Leer", False), (2, "Correr", True),
+        (3, "Correr", True), (10, "Correr", False), (40, "Leer", True),
+    ), today=TODAY)
+
+    assert analytics.total_entries == 7
+    assert analytics.completion_rate == pytest.approx(5 / 7)
+    assert analytics.habit_rates == {"Correr": pytest.approx(2 / 3), "Leer": pytest.approx(3 / 4)}
+    assert analytics.weekday_rates["Wednesday"] == 1.0
+    assert analytics.rolling_7d_rate == pytest.approx(4 / 5)
+    assert analytics.rolling_30d_rate == pytest.approx(4 / 6)
+    assert analytics.current_streak == 4
+    assert analytics.longest_streak == 4
+
+
+def test_analyze_all_matches_analyze_user():
+    by_user = {
+        "1": columns((0, "Leer", True), (1, "Meditar", False), (2, "Leer", True)),
+        "2": columns((0, "Agua", True), (1, "Agua", True), (5, "Leer", False)),
+        "3": columns(),
+    }
+
+    batch = analyze_all(by_user, today=TODAY)
+
+    assert list(batch) == ["1", "2", "3"]
+    for user_id, user_columns in by_user.items():
+        assert batch[user_id] == analyze_user(user_id, user_columns, today=TODAY)
+    assert set(batch["2"].habit_rates) == {"Agua", "Leer"}
+    assert analyze_all({}) == {}
+
+
+def test_best_and_worst_weekday():
+    analytics = analyze_user("1", columns((0, "Leer", True), (1, "Leer", False)), today=TODAY)
+
+    assert best_and_worst_weekday(analytics) == ("Wednesday", "Tuesday")
@@ -0,0 +1,213 @@
+from datetime import datetime, timedelta
+import csv
+import io
+import json
+import threading
+import time
+import pytest
+from fastapi.testclient import TestClient
+from models.schemas import AIInsight, HabitEntry
+
+
+@pytest.fixture(scope="module")
+def api(tmp_path_factory):
+    """La API sobre SQLite, con el motor rules y almacén de insights"""
+    directory = tmp_path_factory.mktemp("api")
+    environment = pytest.MonkeyPatch()
+    environment.setenv("STORAGE_BACKEND", "sqlite")
+    environment.setenv("SQLITE_DB_PATH", str(directory / "habits.db"))
+    environment.setenv("INSIGHTS_ENGINE", "rules")
+    environment.setenv("INSIGHT_STORE_PATH", str(directory / "insights.db"))
+    environment.setenv("EXPORT_ADMIN_TOKEN", "secreto")
+    environment.delenv("SHARED_CACHE_PATH", raising=False)
+    from api import main
+    yield main
+    environment.undo()
+
+
+@pytest.fixture(scope="module")
+def client(api):
+    with TestClient(api.app) as client:
+        yield client
+
+
+def add_entries(api, user_id: str, count: int, habit: str = "Leer"):
+    now = datetime.now()
+    for n in range(count):
+        api.storage_service.add_habit_entry(HabitEntry(
+            user_id=user_id, habit_name=habit, completed=n % 3 != 0, date=now - timedelta(days=n)
+        ))
+
+
+def test_dashboard_etag_only_for_generated_insights(api, client):
+    add_entries(api, "dashboard", 5)
+
+    # Insights de las reglas: sin ETag
+    response = client.get("/dashboard/dashboard")
+    assert response.status_code == 200
+    assert "etag" not in response.headers
+
+    context = api.UserDataContext(api.storage_service, "dashboard")
+    api.ai_service.insight_store.save("dashboard", api.ai_service.insights_fingerprint(context), [
+        AIInsight(user_id="dashboard", insight="del planificador", category="pattern", confidence=0.8)
+    ])
+    response = client.get("/dashboard/dashboard")
+    assert [i["insight"] for i in response.json()["insights"]] == ["del planificador"]
+    etag = response.headers["etag"]
+    assert client.get("/dashboard/dashboard", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_data_version_is_read_off_the_event_loop(api, client, monkeypatch):
+    add_entries(api, "version", 1)
+    threads = []
+    read_version = api.storage_service.get_data_version
+
+    def get_data_version(user_id):
+        threads.append(threading.current_thread().name)
+        return read_version(user_id)
+
+    monkeypatch.setattr(api.storage_service, "get_data_version", get_data_version)
+    etag = client.get("/habits/version").headers["etag"]
+    assert client.get("/habits/version", headers={"If-None-Match": etag}).status_code == 304
+    assert threads and all(name.startswith("storage") for name in threads)
+
+
+def test_entries_pages_follow_the_next_cursor(api, client):
+    add_entries(api, "pages", 5)
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/entries/pages", params=params)
+        assert response.status_code == 200
+        seen.extend(entry["date"] for entry in response.json())
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+
+    assert len(seen) == 5
+    assert seen == sorted(seen)
+    assert client.get("/entries/pages", params={"cursor": "roto"}).status_code == 400
+
+
+def test_export_one_user_as_ndjson_and_csv(api, client):
+    add_entries(api, "export", 3)
+    add_entries(api, "other", 1)
+
+    response = client.get("/export/entries", params={"user_id": "export"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 3 and {row["user_id"] for row in rows} == {"export"}
+
+    response = client.get("/export/entries", params={"user_id": "export", "format": "csv"})
+    assert response.headers["content-disposition"] == 'attachment; filename="entries-export.csv"'
+    table = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["date"] for row in table] == [row["date"] for row in rows]
+
+
+def test_export_all_users_needs_the_admin_token(api, client, monkeypatch):
+    add_entries(api, "admin-a", 1)
+    add_entries(api, "admin-b", 1)
+
+    assert client.get("/export/entries").status_code == 403
+    assert client.get("/export/entries", headers={"X-Admin-Token": "otro"}).status_code == 403
+    response = client.get("/export/entries", headers={"X-Admin-Token": "secreto"})
+    assert response.status_code == 200
+    users = {json.loads(line)["user_id"] for line in response.text.splitlines()}
+    assert {"admin-a", "admin-b"} <= users
+
+    # Sin token configurado no hay exportación completa
+    monkeypatch.setattr(api, "EXPORT_ADMIN_TOKEN", "")
+    assert client.get("/export/entries", headers={"X-Admin-Token": ""}).status_code == 400
+
+
+def test_export_streams_in_chunks(api, client, monkeypatch):
+    add_entries(api, "chunks", 5)
+    iter_entries = api.storage_service.iter_entries
+    chunks = []
+
+    def small_chunks(user_id):
+        for chunk in iter_entries(user_id, chunk_size=2):
+            chunks.append(len(chunk))
+            yield chunk
+
+    monkeypatch.setattr(api.storage_service, "iter_entries", small_chunks)
+    response = client.get("/export/entries", params={"user_id": "chunks"})
+    assert len(response.text.splitlines()) == 5
+    assert chunks == [2, 2, 1]
+
+
+@pytest.mark.parametrize("path", ["/habits/etag", "/stats/etag", "/entries/etag"])
+def test_conditional_get_until_the_data_changes(api, client, path):
+    add_entries(api, "etag", 1)
+    etag = client.get(path).headers["etag"]
+
+    not_modified = client.get(path, headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == etag
+    assert client.get(path, headers={"If-None-Match": etag[2:]}).status_code == 304  # Comparación débil
+    assert client.get(path, headers={"If-None-Match": f'"otra", {etag}'}).status_code == 304
+    assert client.get(path, headers={"If-None-Match": "*"}).status_code == 304
+
+    add_entries(api, "etag", 1)
+    changed = client.get(path, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+
+def test_etag_depends_on_query_and_user(api, client):
+    add_entries(api, "etag-query", 3)
+    add_entries(api, "etag-other", 3)
+    etag = client.get("/entries/etag-query", params={"limit": 1}).headers["etag"]
+
+    assert client.get("/entries/etag-query", params={"limit": 2}, headers={"If-None-Match": etag}).status_code == 200
+    assert client.get("/entries/etag-other", params={"limit": 1}, headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_event_delta_only_carries_what_changed(api):
+    add_entries(api, "delta", 2)
+
+    delta = api._load_delta("delta", {"entry"})
+    assert delta["changed"] == ["entry"]
+    assert len(delta["entries"]) == 2
+    assert delta["insights_status"] == "ready" and delta["insights"]
+    assert "habits" not in delta
+
+    delta = api._load_delta("delta", {"user"})
+    assert "habits" in delta and "entries" not in delta and "insights" not in delta
+
+
+class SlowModel:
+    """Modelo que tarda en responder"""
+
+    usage_metadata = None
+    text = '[{"insight": "del modelo", "category": "pattern", "confidence": 0.8}]'
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content(self, prompt, **kwargs):
+        self.calls += 1
+        time.sleep(0.5)
+        return self
+
+
+def test_dashboard_does_not_wait_for_the_model_when_pending(api, client, monkeypatch):
+    add_entries(api, "fanout", 3)
+    model = SlowModel()
+    monkeypatch.setattr(api.ai_service, "engine", "llm")
+    monkeypatch.setattr(api.ai_service, "model", model)
+
+    started = time.monotonic()
+    response = client.get("/dashboard/fanout", params={"insights": "pending"})
+    assert time.monotonic() - started < 0.5
+    data = response.json()
+    assert data["insights_status"] == "pending" and data["insights"] == []
+    assert len(data["entries"]) == 3 and "etag" not in response.headers
+
+    # GET /insights espera a la generación en curso en vez de lanzar otra
+    assert [i["insight"] for i in client.get("/insights/fanout").json()] == ["del modelo"]
+    response = client.get("/dashboard/fanout", params={"insights": "pending"})
+    assert response.json()["insights_status"] == "ready"
+    assert "etag" in response.headers
+    assert model.calls == 1
@@ -0,0 +1,45 @@
+import asyncio
+import threading
+from services.change_broker import ALL_KINDS, ChangeBroker
+
+
+def test_writes_from_other_threads_reach_only_that_user():
+    async def scenario():
+        broker = ChangeBroker(lambda user_id: None, poll_interval=0)
+        await broker.start()
+        mine, other = broker.subscribe("1"), broker.subscribe("2")
+
+        writer = threading.Thread(target=lambda: [
+            broker.on_storage_change("1", "entry"), broker.on_storage_change("1", "habit")
+        ])
+        writer.start()
+        writer.join()
+
+        # La ráfaga llega en un solo aviso
+        assert await mine.wait(1, debounce=0.01) == {"entry", "habit"}
+        assert await other.wait(0.05) == set()
+        assert await mine.wait(0.05) == set()
+
+        broker.unsubscribe(mine)
+        broker.unsubscribe(other)
+        assert broker.subscriber_count() == 0
+        await broker.stop()
+
+    asyncio.run(scenario())
+
+
+def test_watcher_notices_versions_changed_elsewhere():
+    versions = {"1": "v1"}
+
+    async def scenario():
+        broker = ChangeBroker(versions.get, poll_interval=0.01)
+        await broker.start()
+        subscription = broker.subscribe("1")
+        subscription.version = "v1"
+        assert await subscription.wait(0.05) == set()
+
+        versions["1"] = "v2"  # Escritura de otro proceso
+        assert await subscription.wait(1) == set(ALL_KINDS)
+        await broker.stop()
+
+    asyncio.run(scenario())
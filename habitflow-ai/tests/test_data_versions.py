@@ -0,0 +1,72 @@
+from models.schemas import HabitEntry, TelegramUser
+from services.data_versions import DataVersions
+from services.shared_cache import SharedCache
+from services.sqlite_service import SQLiteStorageService
+
+
+def test_local_versions_change_per_user():
+    versions = DataVersions()
+    before = {user_id: versions.version(user_id) for user_id in ("1", "2")}
+
+    versions.on_storage_change("1", "entry")
+
+    assert versions.version("1") != before["1"]
+    assert versions.version("2") == before["2"]
+
+
+def test_bump_all_changes_every_user():
+    versions = DataVersions()
+    before = versions.version("1")
+
+    versions.bump_all()
+
+    assert versions.version("1") != before
+
+
+def test_local_versions_differ_between_instances():
+    # Los contadores locales empiezan en 0 en cada arranque: nunca coinciden
+    assert DataVersions().version("1") != DataVersions().version("1")
+
+
+def test_shared_cache_versions_are_the_same_across_instances(tmp_path):
+    first = DataVersions(SharedCache(str(tmp_path / "cache.db")))
+    second = DataVersions(SharedCache(str(tmp_path / "cache.db")))
+    assert first.version("1") == second.version("1")
+
+    first.shared_cache.on_storage_change("1", "entry")
+
+    assert first.version("1") == second.version("1")
+    assert first.version("1") != DataVersions(SharedCache(str(tmp_path / "other.db"))).version("1")
+
+
+def test_store_version_takes_precedence():
+    store = {"1": 4}
+    versions = DataVersions(store_version=store.get)
+
+    assert versions.version("1") == "d4.0"
+    versions.on_storage_change("1", "entry")  # Sin efecto: manda el almacén
+    assert versions.version("1") == "d4.0"
+    store["1"] = 5
+    assert versions.version("1") == "d5.0"
+    assert versions.version("2") is None  # No se pudo leer
+
+
+def test_sqlite_versions_include_writes_from_other_instances(tmp_path, monkeypatch):
+    monkeypatch.delenv("SHARED_CACHE_PATH", raising=False)
+    db_path = str(tmp_path / "habits.db")
+    api = SQLiteStorageService(db_path)
+    bot = SQLiteStorageService(db_path)
+    before = api.get_data_version("1")
+    assert before == bot.get_data_version("1")
+
+    bot.create_user(TelegramUser(user_id="1"))
+    after_user = api.get_data_version("1")
+    assert after_user != before
+
+    assert not bot.create_user(TelegramUser(user_id="1"))  # Ya existe: no cambia nada
+    assert api.get_data_version("1") == after_user
+
+    bot.add_habit_entry(HabitEntry(habit_name="Leer", user_id="1", completed=True))
+    assert api.get_data_version("1") not in (before, after_user)
+    assert api.get_data_version("1") == bot.get_data_version("1")
+    assert api.get_data_version("2") == before
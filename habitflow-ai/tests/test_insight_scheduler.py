@@ -0,0 +1,78 @@
+from datetime import datetime, time as day_time
+import json
+import pytest
+from models.schemas import HabitEntry, TelegramUser
+from services.ai_service import AIAnalysisService
+from services.insight_scheduler import InsightScheduler, parse_window
+from services.insight_store import InsightStore
+from services.sqlite_service import SQLiteStorageService
+
+
+class Response:
+    usage_metadata = None
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class BatchModel:
+    """Responde a cada lote con un insight por sección"""
+
+    def __init__(self):
+        self.prompts = []
+
+    def generate_content(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        sections = [line[4:] for line in prompt.splitlines() if line.startswith("### ")]
+        return Response(json.dumps({
+            key: [{"insight": f"insight {key}", "category": "pattern", "confidence": 0.8}] for key in sections
+        }))
+
+
+@pytest.fixture
+def scheduler(tmp_path, monkeypatch):
+    monkeypatch.delenv("SHARED_CACHE_PATH", raising=False)
+    monkeypatch.setenv("INSIGHTS_ENGINE", "llm")
+    storage = SQLiteStorageService(str(tmp_path / "habits.db"))
+    for user_id in ("1", "2", "3"):
+        storage.create_user(TelegramUser(user_id=user_id))
+    for user_id in ("1", "2"):  # El 3 no tiene entradas: nada que precalcular
+        storage.add_habit_entry(HabitEntry(habit_name="Leer", user_id=user_id, completed=True))
+    ai = AIAnalysisService("x", insight_store=InsightStore(str(tmp_path / "insights.db")))
+    ai.model = BatchModel()
+    return InsightScheduler(storage, ai, rate_per_minute=6000)
+
+
+def test_only_users_whose_data_changed_are_regenerated(scheduler):
+    assert sorted(scheduler.pending_users()) == ["1", "2"]
+    assert scheduler.run_once() == {"pending": 2, "refreshed": 2}
+    assert len(scheduler.ai_service.model.prompts) == 1  # Los dos en un lote
+    assert scheduler.run_once() == {"pending": 0, "refreshed": 0}
+
+    scheduler.storage.add_habit_entry(HabitEntry(habit_name="Leer", user_id="2", completed=False))
+    assert scheduler.pending_users() == ["2"]
+
+
+def test_closed_window_refreshes_nothing(scheduler):
+    now = datetime.now()
+    start = day_time((now.hour + 2) % 24)
+    scheduler.window = (start, day_time((now.hour + 3) % 24))
+
+    assert scheduler.run_once() == {"pending": 2, "refreshed": 0}
+    assert scheduler.ai_service.model.prompts == []
+
+
+def test_windows_can_cross_midnight(scheduler):
+    scheduler.window = parse_window("22:00-06:00")
+    assert scheduler.in_window(datetime(2026, 3, 18, 23, 30))
+    assert scheduler.in_window(datetime(2026, 3, 18, 5, 59))
+    assert not scheduler.in_window(datetime(2026, 3, 18, 12, 0))
+    assert parse_window(" ") is None
+    with pytest.raises(ValueError):
+        parse_window("de noche")
+
+
+def test_scheduler_needs_an_insight_store(scheduler):
+    scheduler.ai_service.insight_store = None
+    with pytest.raises(ValueError):
+        InsightScheduler(scheduler.storage, scheduler.ai_service)
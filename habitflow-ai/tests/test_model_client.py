@@ -0,0 +1,175 @@
+from http.server import ThreadingHTTPServer
+import json
+import threading
+import time
+import warnings
+import pytest
+from google.api_core import exceptions as api_exceptions
+from services.model_client import (
+    CircuitBreaker, ModelTimeoutError, ModelUnavailableError, ResilientModelClient
+)
+from scripts.fake_model_server import FakeModelHandler
+
+
+class FakeModel:
+    """generate_content que devuelve o lanza lo indicado en cada llamada
+
+    Un número se interpreta como segundos de espera antes de responder.
+    """
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def generate_content(self, prompt, request_options=None):
+        self.calls.append(request_options)
+        outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        if isinstance(outcome, (int, float)):
+            time.sleep(outcome)
+            return "tarde"
+        return outcome
+
+
+def make_client(**kwargs) -> ResilientModelClient:
+    options = {"timeout": 1.0, "deadline": 2.0, "max_attempts": 3, "backoff_base": 0.0}
+    options.update(kwargs)
+    return ResilientModelClient(**options)
+
+
+def test_retries_transient_errors_until_success():
+    client = make_client()
+    model = FakeModel(api_exceptions.ServiceUnavailable("caído"), api_exceptions.TooManyRequests("cuota"), "ok")
+
+    assert client.generate(model, "hola") == "ok"
+    assert len(model.calls) == 3
+    assert model.calls[0]["retry"] is None
+    events = client.metrics.snapshot()["events"]
+    assert events["retries"] == 2
+    assert events["successes"] == 1
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_gives_up_after_max_attempts():
+    client = make_client(max_attempts=2)
+    model = FakeModel(api_exceptions.ServiceUnavailable("caído"))
+
+    with pytest.raises(api_exceptions.ServiceUnavailable):
+        client.generate(model, "hola")
+    assert len(model.calls) == 2
+    assert client.metrics.snapshot()["events"]["failures"] == 1
+
+
+def test_non_transient_errors_are_not_retried():
+    client = make_client(breaker=CircuitBreaker(failure_threshold=1))
+    model = FakeModel(api_exceptions.InvalidArgument("prompt inválido"))
+
+    with pytest.raises(api_exceptions.InvalidArgument):
+        client.generate(model, "hola")
+    assert len(model.calls) == 1
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_attempt_timeout_and_overall_deadline():
+    client = make_client(timeout=0.2, deadline=0.5, max_attempts=10)
+    model = FakeModel(2.0)
+
+    started = time.monotonic()
+    with pytest.raises(ModelTimeoutError):
+        client.generate(model, "hola")
+    assert time.monotonic() - started < 1.0
+    assert 1 <= len(model.calls) <= 3
+    assert client.metrics.snapshot()["events"]["timeouts"] == len(model.calls)
+    client.shutdown()
+
+
+def test_breaker_closed_open_half_open_closed():
+    changes = []
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.1, on_state_change=changes.append)
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.15)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # Una sola llamada de prueba a la vez
+
+    breaker.record_failure()  # La prueba falla: vuelve a abrirse
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.15)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+    assert changes == ["open", "half_open", "open", "half_open", "closed"]
+
+
+def test_open_breaker_short_circuits_without_calling_model():
+    client = make_client(max_attempts=1, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+    model = FakeModel(api_exceptions.ServiceUnavailable("caído"))
+
+    with pytest.raises(api_exceptions.ServiceUnavailable):
+        client.generate(model, "hola")
+    with pytest.raises(ModelUnavailableError):
+        client.generate(model, "hola")
+    assert len(model.calls) == 1
+    assert client.metrics.snapshot()["events"]["short_circuited"] == 1
+
+
+@pytest.fixture
+def fake_server():
+    FakeModelHandler.log_message = lambda *args: None
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeModelHandler)
+    server.delay = 0.0
+    server.error_rate = 0.0
+    server.error_status = 503
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def gemini_model(fake_server):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        import google.generativeai as genai
+    genai.configure(
+        api_key="fake", transport="rest",
+        client_options={"api_endpoint": f"http://127.0.0.1:{fake_server.server_address[1]}"}
+    )
+    return genai.GenerativeModel("gemini-1.5-flash")
+
+
+def test_fake_server_round_trip(gemini_model):
+    client = make_client()
+    response = client.generate(gemini_model, "### 1\nresumen\n### 2\nresumen")
+
+    assert set(json.loads(response.text)) == {"1", "2"}
+
+
+def test_fake_server_errors_are_retried_then_open_the_breaker(fake_server, gemini_model):
+    fake_server.error_rate = 1.0
+    client = make_client(breaker=CircuitBreaker(failure_threshold=3, reset_timeout=60))
+
+    with pytest.raises(api_exceptions.ServiceUnavailable):
+        client.generate(gemini_model, "hola")
+    assert client.metrics.snapshot()["events"]["attempts"] == 3
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+
+def test_fake_server_delay_hits_the_deadline(fake_server, gemini_model):
+    fake_server.delay = 1.0
+    client = make_client(timeout=0.2, deadline=0.4)
+
+    with pytest.raises(ModelTimeoutError):
+        client.generate(gemini_model, "hola")
+    client.shutdown()
@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+import pytest
+from models.schemas import HabitEntry
+from services.pagination import decode_cursor, encode_cursor, paginate_sorted
+from services.sqlite_service import SQLiteStorageService
+
+
+START = datetime(2026, 3, 1, 9, 0)
+
+
+def sorted_entries(dates):
+    dates = sorted(dates)
+    return dates, [{"n": n, "date": value} for n, value in enumerate(dates)]
+
+
+def all_pages(fetch, limit):
+    """Recorrer todas las páginas siguiendo los cursores"""
+    pages, cursor = [], None
+    while True:
+        page, cursor = fetch(limit, cursor)
+        pages.append(page)
+        if cursor is None:
+            return pages
+
+
+def test_cursor_round_trip():
+    payload = {"d": START.isoformat(), "o": 2}
+    assert decode_cursor(encode_cursor(payload)) == payload
+    for cursor in ("no es base64!", encode_cursor(["lista"])):
+        with pytest.raises(ValueError):
+            decode_cursor(cursor)
+
+
+def test_pages_cover_every_entry_once_with_repeated_dates():
+    # Varias entradas con la misma fecha a caballo entre páginas
+    dates, entries = sorted_entries([START + timedelta(hours=n // 3) for n in range(11)])
+
+    pages = all_pages(lambda limit, cursor: paginate_sorted(dates, entries, START, limit=limit, cursor=cursor), 4)
+
+    assert [len(page) for page in pages] == [4, 4, 3]
+    assert [entry["n"] for page in pages for entry in page] == list(range(11))
+
+
+def test_cursor_survives_entries_added_on_other_dates():
+    dates, entries = sorted_entries([START + timedelta(days=n) for n in range(6)])
+    first, cursor = paginate_sorted(dates, entries, START, limit=3)
+
+    # Una entrada anterior a la página siguiente no la desplaza
+    dates, entries = sorted_entries(dates + [START - timedelta(days=1), START + timedelta(hours=1)])
+    second, cursor = paginate_sorted(dates, entries, START, limit=10, cursor=cursor)
+
+    assert [e["date"] for e in first] == [START + timedelta(days=n) for n in range(3)]
+    assert [e["date"] for e in second] == [START + timedelta(days=n) for n in range(3, 6)]
+    assert cursor is None
+
+
+def test_range_limits():
+    dates, entries = sorted_entries([START + timedelta(days=n) for n in range(10)])
+    page, cursor = paginate_sorted(dates, entries, START + timedelta(days=2), START + timedelta(days=5), limit=10)
+
+    assert [e["date"] for e in page] == [START + timedelta(days=n) for n in (2, 3, 4)]
+    assert cursor is None
+    with pytest.raises(ValueError):
+        paginate_sorted(dates, entries, START, cursor=encode_cursor({"d": "ayer"}))
+
+
+def test_sqlite_pages_cover_every_entry_once(tmp_path, monkeypatch):
+    monkeypatch.delenv("SHARED_CACHE_PATH", raising=False)
+    storage = SQLiteStorageService(str(tmp_path / "habits.db"))
+    for n in range(7):
+        # Las tres primeras con la misma fecha
+        storage.add_habit_entry(HabitEntry(
+            habit_name="Leer" if n % 2 else "Correr", user_id="1", completed=True,
+            date=START + timedelta(days=max(0, n - 2))
+        ))
+    storage.add_habit_entry(HabitEntry(habit_name="Leer", user_id="2", completed=True, date=START))
+
+    pages = all_pages(lambda limit, cursor: storage.get_user_entries_page("1", START, limit=limit, cursor=cursor), 2)
+    assert [len(page) for page in pages] == [2, 2, 2, 1]
+    assert [e["date"] for page in pages for e in page] == sorted(
+        (START + timedelta(days=max(0, n - 2))).isoformat() for n in range(7)
+    )
+
+    only_leer = all_pages(
+        lambda limit, cursor: storage.get_user_entries_page("1", START, habit_name="Leer", limit=limit, cursor=cursor), 2
+    )
+    assert sum(len(page) for page in only_leer) == 3
@@ -0,0 +1,62 @@
+from datetime import date, datetime, timedelta
+import pytest
+from models.schemas import UserStats
+from services.entry_store import EntryColumns
+from services.prompt_builder import InsightPromptBuilder, estimate_tokens
+
+
+TODAY = date(2026, 3, 18).toordinal()
+HABITS = ["Leer", "Meditar", "Escribir diario", "Beber agua", "Correr", "Dormir temprano"]
+
+
+def columns() -> EntryColumns:
+    """Cada hábito con un número de registros distinto en los últimos 30 días"""
+    return EntryColumns.from_records(
+        {
+            "date": (datetime.fromordinal(TODAY - day) + timedelta(hours=9)).isoformat(),
+            "habit_name": habit,
+            "completed": str(day % 3 != 0),
+        }
+        for position, habit in enumerate(HABITS)
+        for day in range(30 - position * 3)
+    )
+
+
+def summary(token_budget: int) -> str:
+    stats = UserStats(
+        user_id="1", total_habits=7, active_habits=7, completion_rate=0.7,
+        streak_days=2, last_activity=datetime.now()
+    )
+    habits = [{"name": name} for name in HABITS + ["Yoga"]]
+    return InsightPromptBuilder(token_budget).user_summary(habits, columns(), stats, today=TODAY)
+
+
+@pytest.mark.parametrize("token_budget", [5, 20, 40, 60, 80, 120, 200, 400])
+def test_summary_never_exceeds_the_budget(token_budget):
+    assert estimate_tokens(summary(token_budget)) <= token_budget
+
+
+def test_required_lines_come_first():
+    lines = summary(400).splitlines()
+    assert lines[0].startswith("30d: ")
+    assert lines[1].startswith("racha: actual 2")
+    assert lines[2] == "sin registros: Yoga"
+    assert lines[3].startswith("por hábito: Leer ")
+    assert lines[4].startswith("semana: L")
+    assert len(lines) == 5 + len(HABITS)  # Y una fila de la semana por hábito
+
+
+def test_per_habit_items_are_trimmed_by_priority():
+    full = next(line for line in summary(400).splitlines() if line.startswith("por hábito: "))
+    trimmed = next(line for line in summary(45).splitlines() if line.startswith("por hábito: "))
+
+    # Entran los hábitos con más registros; el resto se queda fuera de la línea
+    assert trimmed != full
+    assert full.startswith(trimmed)
+    assert trimmed.startswith("por hábito: Leer ")
+
+
+def test_tiny_budget_cuts_the_required_lines():
+    text = summary(5)
+    assert text and "\n" not in text
+    assert summary(400).startswith(text)
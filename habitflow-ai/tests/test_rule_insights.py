@@ -0,0 +1,91 @@
+from datetime import date, datetime, timedelta
+from models.schemas import UserStats
+from services.entry_store import EntryColumns
+from services.rule_insights import RECOMMENDATIONS, RuleInsightEngine
+
+
+TODAY = date(2026, 3, 18).toordinal()  # Miércoles
+
+
+def columns(entries) -> EntryColumns:
+    """Entradas (días atrás, hábito, completada)"""
+    return EntryColumns.from_records(
+        {
+            "date": (datetime.fromordinal(TODAY - days_ago) + timedelta(hours=9)).isoformat(),
+            "habit_name": habit,
+            "completed": str(done),
+        }
+        for days_ago, habit, done in entries
+    )
+
+
+def stats(streak_days: int) -> UserStats:
+    return UserStats(
+        user_id="1", total_habits=3, active_habits=3, completion_rate=0.5,
+        streak_days=streak_days, last_activity=datetime.now()
+    )
+
+
+def insights(entries, streak_days: int, habits=("Leer",), **options):
+    engine = RuleInsightEngine(max_insights=10, **options)
+    result = engine.insights("1", [{"name": name} for name in habits], columns(entries), stats(streak_days), today=TODAY)
+    return {i.insight: i.category for i in result}
+
+
+def find(result, fragment):
+    return [text for text in result if fragment in text]
+
+
+def test_streak_milestone_comes_first():
+    engine = RuleInsightEngine()
+    entries = [(day, "Leer", True) for day in range(7)]
+    result = engine.insights("1", [{"name": "Leer"}], columns(entries), stats(7), today=TODAY)
+
+    assert result[0].insight.startswith("🎉 ¡Hito alcanzado: 7 días seguidos!")
+    assert result[0].category == "achievement" and result[0].confidence == 1.0
+
+
+def test_declining_habit():
+    entries = [(day, "Correr", True) for day in range(7, 14)]
+    entries += [(day, "Correr", day == 0) for day in range(7)]
+    result = insights(entries, 1, habits=("Correr",))
+
+    assert find(result, "📉 Correr bajó del 100% al 14%")
+    assert result[find(result, "📉")[0]] == "improvement"
+
+
+def test_weekday_best_habit_and_habit_streak():
+    entries = [(day, "Leer", True) for day in range(14)]
+    # Meditar: nunca los jueves
+    entries += [(day, "Meditar", (TODAY - day - 1) % 7 != 3) for day in range(14)]
+    result = insights(entries, 1, habits=("Leer", "Meditar"))
+
+    assert find(result, "y el más difícil, el jueves (50%)")
+    assert find(result, "🏆 Leer es tu hábito más constante (100%)")
+    assert find(result, "🔗 Leer lleva 14 días seguidos, su mejor racha del mes")
+
+
+def test_short_habit_streaks_are_not_mentioned():
+    entries = [(day, "Leer", True) for day in range(3)] + [(day, "Correr", True) for day in range(2)]
+    assert not find(insights(entries, 3, habits=("Leer", "Correr")), "🔗")
+
+
+def test_idle_habits():
+    result = insights([(0, "Leer", True)], 1, habits=("Leer", "Yoga", "Agua"))
+    assert find(result, "💤 No has registrado Agua, Yoga en el último mes")
+
+
+def test_max_insights_keeps_priority_order():
+    entries = [(day, "Leer", True) for day in range(7)]
+    engine = RuleInsightEngine(max_insights=2)
+    result = engine.insights("1", [{"name": "Leer"}, {"name": "Yoga"}], columns(entries), stats(7), today=TODAY)
+
+    assert len(result) == 2
+    assert result[0].insight.startswith("🎉")
+
+
+def test_recommendation_skips_habits_already_tracked():
+    assert RuleInsightEngine.recommendation([]) == RECOMMENDATIONS[0][1]
+    assert RuleInsightEngine.recommendation(["Beber agua", "Correr"]) == RECOMMENDATIONS[2][1]
+    everything = [keywords[0] for keywords, _ in RECOMMENDATIONS]
+    assert RuleInsightEngine.recommendation(everything).startswith("🌟")
@@ -0,0 +1,102 @@
+import threading
+import time
+import gspread
+import pytest
+from services.sheets_quota import INTERACTIVE, SheetsQuotaScheduler, is_rejection
+
+
+class Response:
+    """Respuesta mínima para construir un APIError de gspread"""
+
+    text = "error"
+
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+
+    def json(self):
+        return {"error": {"code": self.status_code, "message": "error", "status": "ERROR"}}
+
+
+def failing(status_code: int, times: int):
+    """Llamada que falla times veces con status_code y después devuelve "ok" """
+    calls = []
+
+    def call():
+        calls.append(time.monotonic())
+        if len(calls) <= times:
+            raise gspread.exceptions.APIError(Response(status_code))
+        return "ok"
+
+    return call, calls
+
+
+def test_throttled_calls_are_retried():
+    scheduler = SheetsQuotaScheduler(backoff_base=0.01, backoff_max=0.05)
+    call, calls = failing(429, 2)
+
+    assert scheduler.write(call) == "ok"
+    assert len(calls) == 3
+    write = scheduler.snapshot()["write"]
+    assert write["throttled"] == 2
+    assert write["calls"] == 1
+
+
+def test_throttling_gives_up_after_max_retries():
+    scheduler = SheetsQuotaScheduler(max_retries=2, backoff_base=0.01, backoff_max=0.05)
+    call, calls = failing(429, 10)
+
+    with pytest.raises(gspread.exceptions.APIError):
+        scheduler.read(call)
+    assert len(calls) == 3
+    assert scheduler.snapshot()["read"]["failed"] == 1
+
+
+def test_other_errors_propagate_without_retry():
+    scheduler = SheetsQuotaScheduler()
+    call, calls = failing(400, 1)
+
+    with pytest.raises(gspread.exceptions.APIError):
+        scheduler.read(call)
+    assert len(calls) == 1
+
+
+def test_interactive_calls_go_before_background():
+    scheduler = SheetsQuotaScheduler(reads_per_minute=600)
+    for _ in range(60):  # Agotar la ráfaga inicial
+        scheduler.read(lambda: None)
+
+    order = []
+
+    def background(tag):
+        with scheduler.background():
+            scheduler.read(lambda: order.append(tag))
+
+    def interactive(tag):
+        scheduler.read(lambda: order.append(tag), priority=INTERACTIVE)
+
+    threads = [threading.Thread(target=background, args=(f"bg{n}",)) for n in range(3)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    assert scheduler.snapshot()["read"]["queued_by_priority"]["background"] == 3
+
+    threads += [threading.Thread(target=interactive, args=(f"ia{n}",)) for n in range(2)]
+    for thread in threads[3:]:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert set(order[:2]) == {"ia0", "ia1"}
+    assert sorted(order[2:]) == ["bg0", "bg1", "bg2"]
+
+
+def test_zero_quota_is_rejected():
+    with pytest.raises(ValueError):
+        SheetsQuotaScheduler(reads_per_minute=0)
+
+
+def test_only_client_errors_are_rejections():
+    assert is_rejection(gspread.exceptions.APIError(Response(400)))
+    assert not is_rejection(gspread.exceptions.APIError(Response(429)))
+    assert not is_rejection(gspread.exceptions.APIError(Response(503)))
+    assert not is_rejection(ConnectionError("sin red"))
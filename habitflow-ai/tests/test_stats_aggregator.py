@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+import pytest
+from models.schemas import Habit, HabitEntry
+from services.stats_aggregator import StatsAggregator
+from services.sqlite_service import SQLiteStorageService
+
+
+NOW = datetime(2026, 3, 18, 12, 0)
+
+
+def days_ago(days: int) -> datetime:
+    return NOW - timedelta(days=days)
+
+
+def test_rate_streak_and_habits():
+    aggregator = StatsAggregator()
+    aggregator.add_habit("1")
+    aggregator.add_habit("1")
+    for day in (0, 1, 2, 4):
+        aggregator.add_entry("1", days_ago(day), True)
+    aggregator.add_entry("1", days_ago(0), False)
+    aggregator.add_entry("1", days_ago(40), True)  # Fuera de la ventana de 30 días
+
+    stats = aggregator.get_stats("1", NOW)
+    assert stats.total_habits == 2
+    assert stats.completion_rate == pytest.approx(4 / 5)
+    assert stats.streak_days == 3
+    assert stats.last_activity == days_ago(0)
+
+
+def test_streak_survives_until_the_day_after():
+    aggregator = StatsAggregator()
+    aggregator.add_entry("1", days_ago(1), True)
+    aggregator.add_entry("1", days_ago(2), True)
+
+    assert aggregator.get_stats("1", NOW).streak_days == 2
+    assert aggregator.get_stats("1", NOW + timedelta(days=1)).streak_days == 0
+
+
+def test_future_days_are_ignored_until_they_arrive():
+    aggregator = StatsAggregator()
+    aggregator.load_entries([
+        {"user_id": "1", "date": days_ago(day).isoformat(), "completed": "True"}
+        for day in (0, 1, -2)
+    ])
+
+    assert aggregator.get_stats("1", NOW).streak_days == 2
+    assert aggregator.get_stats("1", NOW + timedelta(days=2)).streak_days == 1
+
+
+def test_unknown_and_discarded_users_have_no_stats():
+    aggregator = StatsAggregator()
+    aggregator.add_entry("1", days_ago(0), True)
+    aggregator.discard("1")
+    aggregator.add_entry("1", days_ago(0), True)
+
+    assert aggregator.get_stats("1", NOW) is None
+    assert aggregator.get_stats("2", NOW) is None
+
+
+def test_load_user_replaces_only_that_user():
+    aggregator = StatsAggregator()
+    aggregator.add_entry("1", days_ago(0), False)
+    aggregator.add_entry("2", days_ago(0), True)
+    aggregator.load_user("1", 3, [{"date": days_ago(0).isoformat(), "completed": "True"}])
+
+    assert aggregator.get_stats("1", NOW).completion_rate == 1.0
+    assert aggregator.get_stats("1", NOW).total_habits == 3
+    assert aggregator.get_stats("2", NOW).streak_days == 1
+
+
+def test_sqlite_aggregates_follow_writes_from_other_instances(tmp_path, monkeypatch):
+    monkeypatch.delenv("SHARED_CACHE_PATH", raising=False)
+    monkeypatch.setenv("STATS_AGGREGATOR_ENABLED", "true")
+    db_path = str(tmp_path / "habits.db")
+    api = SQLiteStorageService(db_path)
+    bot = SQLiteStorageService(db_path)
+
+    api.create_habit(Habit(name="Leer", user_id="1"))
+    api.add_habit_entry(HabitEntry(habit_name="Leer", user_id="1", completed=True))
+    assert api.get_user_stats("1").completion_rate == 1.0
+
+    bot.create_habit(Habit(name="Correr", user_id="1"))
+    bot.add_habit_entry(HabitEntry(habit_name="Correr", user_id="1", completed=False))
+
+    stats = api.get_user_stats("1")
+    assert stats.total_habits == 2
+    assert stats.completion_rate == pytest.approx(0.5)
+
+    # Las escrituras propias siguen siendo incrementales
+    api.add_habit_entry(HabitEntry(habit_name="Leer", user_id="1", completed=True))
+    assert api.get_user_stats("1").completion_rate == pytest.approx(2 / 3)
+    assert api.stats_aggregator.get_stats("1").completion_rate == pytest.approx(2 / 3)
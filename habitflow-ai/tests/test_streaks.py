@@ -0,0 +1,75 @@
+from datetime import date, datetime, timedelta
+import numpy as np
+from services.entry_store import EntryColumns
+from services.stats_aggregator import StatsAggregator
+from utils.streaks import compute_streaks, grouped_streaks, habit_streaks
+
+
+TODAY = date(2026, 3, 18).toordinal()
+
+
+def ordinals(*days_ago):
+    return np.array([TODAY - days for days in days_ago], dtype=np.int64)
+
+
+def test_current_and_longest_streak():
+    days = ordinals(0, 1, 2, 5, 6, 7, 8, 8)
+    assert compute_streaks(days, np.ones(days.size, dtype=bool), TODAY) == (3, 4)
+
+
+def test_streak_survives_until_the_day_after_and_ignores_failures():
+    days = ordinals(1, 2, 3, 0)
+    completed = np.array([True, True, True, False])
+    assert compute_streaks(days, completed, TODAY) == (3, 3)
+    assert compute_streaks(days, completed, TODAY + 1) == (0, 3)
+
+
+def test_future_days_do_not_count_for_the_current_streak():
+    days = ordinals(0, 1, -1, -2)
+    assert compute_streaks(days, np.ones(days.size, dtype=bool), TODAY) == (2, 4)
+
+
+def test_no_completed_days():
+    assert compute_streaks(ordinals(0, 1), np.zeros(2, dtype=bool), TODAY) == (0, 0)
+    assert compute_streaks(ordinals(), np.zeros(0, dtype=bool), TODAY) == (0, 0)
+
+
+def test_grouped_streaks_keep_groups_apart():
+    # El grupo 1 empieza justo el día siguiente al último del grupo 0
+    groups = np.array([0, 0, 1, 1, 1, 2])
+    days = ordinals(2, 1, 0, 3, 2, 9)
+    current, longest = grouped_streaks(groups, days, np.ones(6, dtype=bool), 4, TODAY)
+
+    assert current.tolist() == [2, 1, 0, 0]
+    assert longest.tolist() == [2, 2, 1, 0]
+
+
+def test_habit_streaks_from_columns():
+    columns = EntryColumns.from_records(
+        {
+            "date": (datetime.fromordinal(TODAY - days_ago) + timedelta(hours=9)).isoformat(),
+            "habit_name": habit,
+            "completed": str(done),
+        }
+        for days_ago, habit, done in [
+            (0, "Leer", True), (1, "Leer", True), (2, "Leer", True),
+            (0, "Correr", False), (1, "Correr", True), (4, "Correr", True), (5, "Correr", True),
+            (3, "Meditar", False),
+        ]
+    )
+
+    assert habit_streaks(columns, TODAY) == {"Leer": (3, 3), "Correr": (1, 2), "Meditar": (0, 0)}
+
+
+def test_aggregator_matches_compute_streaks():
+    done_days = (0, 1, 2, 4, 5, 366, 367)
+    aggregator = StatsAggregator(streak_days=365)
+    now = datetime.fromordinal(TODAY) + timedelta(hours=12)
+    for days_ago in done_days:
+        aggregator.add_entry("1", datetime.fromordinal(TODAY - days_ago), True)
+
+    for later in range(3):
+        today = TODAY + later
+        days = np.array([TODAY - d for d in done_days if today - (TODAY - d) <= 365], dtype=np.int64)
+        expected, _ = compute_streaks(days, np.ones(days.size, dtype=bool), today)
+        assert aggregator.get_stats("1", now + timedelta(days=later)).streak_days == expected
@@ -0,0 +1,158 @@
+import json
+import pytest
+from services.write_buffer import EntryWriteBuffer
+
+
+class Sheet:
+    """Destino de los lotes; puede fallar las primeras veces"""
+
+    def __init__(self, failures: int = 0):
+        self.rows = []
+        self.failures = failures
+
+    def append(self, rows):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("429")
+        self.rows.extend(rows)
+
+
+def journal_rows(path):
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line]
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return tmp_path / "journal.jsonl"
+
+
+def test_flush_sends_rows_and_empties_journal(journal):
+    sheet = Sheet()
+    buffer = EntryWriteBuffer(sheet.append, max_delay=60, journal_path=str(journal))
+    buffer.start()
+    pending = [buffer.submit(["1", "Leer", str(n)]) for n in range(3)]
+    assert len(journal_rows(journal)) == 3
+
+    assert buffer.flush(timeout=5)
+    assert all(p.wait(1) for p in pending)
+    assert sheet.rows == [["1", "Leer", "0"], ["1", "Leer", "1"], ["1", "Leer", "2"]]
+    assert journal_rows(journal) == []
+    buffer.close()
+
+
+def test_failed_batches_are_retried(journal):
+    sheet = Sheet(failures=2)
+    buffer = EntryWriteBuffer(sheet.append, max_delay=0.01, journal_path=str(journal), retry_delay=0.05)
+    buffer.start()
+
+    assert buffer.submit(["1", "Leer"]).wait(5)
+    assert sheet.rows == [["1", "Leer"]]
+    assert sheet.failures == 0
+    buffer.close()
+
+
+def test_restart_replays_pending_rows(journal):
+    down = Sheet(failures=1000)
+    first = EntryWriteBuffer(down.append, journal_path=str(journal))
+    first.submit(["1", "Leer"])
+    first.close()  # Sin arrancar: la fila queda en el journal
+
+    sheet = Sheet()
+    second = EntryWriteBuffer(sheet.append, journal_path=str(journal))
+    assert second.recovered_rows() == [["1", "Leer"]]
+    second.start()
+    assert second.flush(timeout=5)
+    assert sheet.rows == [["1", "Leer"]]
+    second.close()
+
+
+def test_each_journal_has_a_single_owner(journal):
+    sheet = Sheet()
+    first = EntryWriteBuffer(sheet.append, max_delay=60, journal_path=str(journal))
+    second = EntryWriteBuffer(sheet.append, max_delay=60, journal_path=str(journal))
+    assert first.journal_path != second.journal_path
+
+    second.submit(["2", "Correr"])
+    first.start()
+    first.submit(["1", "Leer"])
+    assert first.flush(timeout=5)
+
+    # El vaciado del primero no toca las filas pendientes del segundo
+    assert journal_rows(journal) == []
+    assert second.recovered_rows() == [["2", "Correr"]]
+    assert journal_rows(journal.with_name("journal.1.jsonl")) == [["2", "Correr"]]
+    first.close()
+    second.close()
+
+
+def test_orphan_journals_are_adopted_once(journal):
+    down = Sheet(failures=1000)
+    first = EntryWriteBuffer(down.append, journal_path=str(journal))
+    second = EntryWriteBuffer(down.append, journal_path=str(journal))
+    first.submit(["1", "Leer"])
+    second.submit(["2", "Correr"])
+    first.close()
+    second.close()
+
+    owner = EntryWriteBuffer(Sheet().append, journal_path=str(journal))
+    other = EntryWriteBuffer(Sheet().append, journal_path=str(journal))
+    assert owner.recovered_rows() == [["1", "Leer"], ["2", "Correr"]]
+    assert other.recovered_rows() == []
+    assert other.journal_path == str(journal.with_name("journal.1.jsonl"))
+    assert journal_rows(journal.with_name("journal.1.jsonl")) == []
+    assert journal_rows(journal) == [["1", "Leer"], ["2", "Correr"]]
+    owner.close()
+    other.close()
+
+
+class RejectingSheet(Sheet):
+    """Rechaza cualquier lote que contenga una fila marcada como mala"""
+
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def append(self, rows):
+        self.batches.append(len(rows))
+        if ["mala"] in rows:
+            raise ValueError("400")
+        self.rows.extend(rows)
+
+
+def test_rejected_row_is_isolated_and_dead_lettered(journal):
+    sheet = RejectingSheet()
+    buffer = EntryWriteBuffer(
+        sheet.append, max_batch=8, max_delay=60, journal_path=str(journal), retry_delay=0, max_retries=2
+    )
+    rows = [[str(n)] for n in range(8)]
+    rows[5] = ["mala"]
+    pending = [buffer.submit(row) for row in rows]
+    buffer.start()
+
+    assert buffer.flush(timeout=5)
+    assert [p.wait(1) for p in pending] == [True] * 5 + [False] + [True] * 2
+    assert sheet.rows == [row for row in rows if row != ["mala"]]
+    assert journal_rows(journal) == []
+    assert journal_rows(journal.with_name("journal.dead.jsonl")) == [["mala"]]
+    # Tras aislarla se vuelve al tamaño de lote normal
+    buffer.submit(["8"])
+    buffer.submit(["9"])
+    assert buffer.flush(timeout=5)
+    assert sheet.batches[-1] == 2
+    buffer.close()
+
+
+def test_transient_errors_are_never_dead_lettered(journal):
+    sheet = Sheet(failures=4)
+    buffer = EntryWriteBuffer(
+        sheet.append, max_delay=0.01, journal_path=str(journal), retry_delay=0.01,
+        max_retries=2, is_rejection=lambda error: False
+    )
+    buffer.start()
+
+    assert buffer.submit(["1", "Leer"]).wait(5)
+    assert sheet.rows == [["1", "Leer"]]
+    assert not journal.with_name("journal.dead.jsonl").exists()
+    buffer.close()
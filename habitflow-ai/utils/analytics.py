@@ -0,0 +1,134 @@
+"""
+Analíticas de hábitos vectorizadas
+
+Todas las métricas se calculan en una sola pasada de NumPy sobre columnas
+de entradas (services.entry_store), para un usuario o para varios a la vez:
+tasa de completación, tasas por día de la semana y por hábito, tasas de los
+últimos 7 y 30 días naturales, y rachas (utils.streaks).
+"""
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from models.schemas import HabitAnalytics
+from services.entry_store import EntryColumns
+from utils.config import WEEKDAY_NAMES
+from utils.streaks import grouped_streaks
+
+
+def _rates(completed: np.ndarray, total: np.ndarray) -> np.ndarray:
+    """completed / total con 0 donde no hay entradas"""
+    return np.divide(completed, total, out=np.zeros(total.shape), where=total > 0)
+
+
+def _analyze(
+    users: np.ndarray,
+    n_users: int,
+    days: np.ndarray,
+    completed: np.ndarray,
+    habits: np.ndarray,
+    habit_names: List[str],
+    today: int
+) -> Dict[str, np.ndarray]:
+    """Métricas por usuario en arrays (una fila por usuario)"""
+    users = users.astype(np.int64)
+    done = completed.astype(bool)
+    n_habits = len(habit_names)
+
+    def count(keys: np.ndarray, weights: Optional[np.ndarray] = None, size: int = n_users) -> np.ndarray:
+        return np.bincount(keys, weights=weights, minlength=size)[:size]
+
+    weekday_keys = users * 7 + EntryColumns.weekday_of(days)
+    habit_keys = users * n_habits + habits
+    last_7, last_30 = days >= today - 6, days >= today - 29
+
+    total = count(users)
+    current, longest = grouped_streaks(users, days, done, n_users, today)
+    return {
+        'total': total,
+        'rate': _rates(count(users, done), total),
+        'weekday_total': count(weekday_keys, size=n_users * 7).reshape(n_users, 7),
+        'weekday_rate': _rates(
+            count(weekday_keys, done, n_users * 7), count(weekday_keys, size=n_users * 7)
+        ).reshape(n_users, 7),
+        'habit_total': count(habit_keys, size=n_users * n_habits).reshape(n_users, n_habits),
+        'habit_rate': _rates(
+            count(habit_keys, done, n_users * n_habits), count(habit_keys, size=n_users * n_habits)
+        ).reshape(n_users, n_habits),
+        'rate_7d': _rates(count(users[last_7], done[last_7]), count(users[last_7])),
+        'rate_30d': _rates(count(users[last_30], done[last_30]), count(users[last_30])),
+        'current_streak': current,
+        'longest_streak': longest,
+    }
+
+
+def _to_model(user_id: str, metrics: Dict[str, np.ndarray], row: int, habit_names: List[str]) -> HabitAnalytics:
+    """Métricas de una fila como HabitAnalytics (solo días y hábitos con entradas)"""
+    weekday_total, habit_total = metrics['weekday_total'][row], metrics['habit_total'][row]
+    return HabitAnalytics(
+        user_id=user_id,
+        total_entries=int(metrics['total'][row]),
+        completion_rate=float(metrics['rate'][row]),
+        weekday_rates={
+            WEEKDAY_NAMES[day]: float(metrics['weekday_rate'][row, day])
+            for day in np.flatnonzero(weekday_total)
+        },
+        habit_rates={
+            habit_names[habit]: float(metrics['habit_rate'][row, habit])
+            for habit in np.flatnonzero(habit_total)
+        },
+        rolling_7d_rate=float(metrics['rate_7d'][row]),
+        rolling_30d_rate=float(metrics['rate_30d'][row]),
+        current_streak=int(metrics['current_streak'][row]),
+        longest_streak=int(metrics['longest_streak'][row])
+    )
+
+
+def analyze_user(user_id: str, columns: EntryColumns, today: Optional[int] = None) -> HabitAnalytics:
+    """Analíticas de un usuario sobre sus entradas en columnas"""
+    if today is None:
+        today = date.today().toordinal()
+    metrics = _analyze(
+        np.zeros(len(columns), dtype=np.int64), 1, columns.days, columns.completed,
+        columns.habits, columns.habit_names, today
+    )
+    return _to_model(user_id, metrics, 0, columns.habit_names)
+
+
+def analyze_all(columns_by_user: Dict[str, EntryColumns], today: Optional[int] = None) -> Dict[str, HabitAnalytics]:
+    """Analíticas de varios usuarios en una sola pasada
+
+    Los códigos de hábito de cada usuario se traducen a un vocabulario común
+    antes de concatenar las columnas.
+    """
+    if today is None:
+        today = date.today().toordinal()
+    user_ids = list(columns_by_user)
+    if not user_ids:
+        return {}
+    parts = [columns_by_user[user_id] for user_id in user_ids]
+    habit_names = sorted({name for columns in parts for name in columns.habit_names})
+    vocabulary = np.array(habit_names, dtype=object)
+
+    habits = np.concatenate([
+        np.searchsorted(vocabulary, np.array(columns.habit_names, dtype=object)).astype(np.int64)[columns.habits]
+        for columns in parts
+    ])
+    users = np.repeat(np.arange(len(user_ids), dtype=np.int64), [len(columns) for columns in parts])
+    metrics = _analyze(
+        users, len(user_ids),
+        np.concatenate([columns.days for columns in parts]),
+        np.concatenate([columns.completed for columns in parts]),
+        habits, habit_names, today
+    )
+    return {
+        user_id: _to_model(user_id, metrics, row, habit_names)
+        for row, user_id in enumerate(user_ids)
+    }
+
+
+def best_and_worst_weekday(analytics: HabitAnalytics) -> Tuple[Optional[str], Optional[str]]:
+    """Días de la semana con mayor y menor tasa de éxito"""
+    if not analytics.weekday_rates:
+        return None, None
+    rates = analytics.weekday_rates
+    return max(rates, key=rates.get), min(rates, key=rates.get)
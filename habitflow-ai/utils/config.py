@@ -24,12 +24,51 @@ MIN_HABIT_NAME_LENGTH = 2
 MAX_ENTRIES_PER_REQUEST = 1000
 DEFAULT_STATS_DAYS = 30
 MAX_STATS_DAYS = 365
+EXPORT_CHUNK_SIZE = 500  # entradas leídas por bloque al exportar
+
+# Días de la semana (nombres de strftime('%A'), indexados por datetime.weekday())
+WEEKDAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
 
 # Configuración de IA
 AI_MODEL = "gpt-3.5-turbo"
 AI_MAX_TOKENS = 800
 AI_TEMPERATURE = 0.7
 
+# Caché de insights (INSIGHT_CACHE_TTL / INSIGHT_CACHE_MAX_ENTRIES)
+DEFAULT_INSIGHT_CACHE_TTL = 3600  # segundos
+DEFAULT_INSIGHT_CACHE_MAX_ENTRIES = 1000
+
+# Insights persistidos (INSIGHT_STORE_PATH / INSIGHT_MAX_STALENESS)
+DEFAULT_INSIGHT_STORE_PATH = ""  # vacío desactiva el almacén
+DEFAULT_INSIGHT_MAX_STALENESS = 86400  # segundos sirviendo insights de datos ya cambiados
+DEFAULT_INSIGHT_BATCH_SIZE = 10  # usuarios por llamada al precalcular (INSIGHT_BATCH_SIZE)
+DEFAULT_INSIGHT_PROMPT_TOKEN_BUDGET = 200  # tokens máximos del resumen de cada usuario
+
+# Motor de insights (INSIGHTS_ENGINE) cuando no hay insights del modelo ya
+# generados (p. ej. por el planificador): rules calcula los insights localmente
+# sin llamar al modelo; hybrid responde con reglas y los enriquece con el modelo
+# en segundo plano; llm espera al modelo (las reglas solo como respaldo)
+INSIGHT_ENGINES = ("rules", "hybrid", "llm")
+DEFAULT_INSIGHTS_ENGINE = "rules"
+
+# Llamadas al modelo (AI_CALL_TIMEOUT, AI_CALL_DEADLINE, AI_MAX_ATTEMPTS, AI_BACKOFF_BASE,
+# AI_BACKOFF_MAX, AI_BREAKER_FAILURES, AI_BREAKER_RESET, GEMINI_API_ENDPOINT)
+DEFAULT_AI_CALL_TIMEOUT = 6.0  # segundos por intento
+DEFAULT_AI_CALL_DEADLINE = 10.0  # segundos por llamada, reintentos incluidos
+DEFAULT_AI_MAX_ATTEMPTS = 3
+DEFAULT_AI_BACKOFF_BASE = 0.5  # segundos; se dobla en cada reintento (con jitter)
+DEFAULT_AI_BACKOFF_MAX = 4.0
+DEFAULT_AI_BREAKER_FAILURES = 5  # fallos seguidos que abren el circuito
+DEFAULT_AI_BREAKER_RESET = 30.0  # segundos con el circuito abierto antes de probar
+DEFAULT_GEMINI_API_ENDPOINT = ""  # p. ej. http://127.0.0.1:8090 para un servidor falso (REST)
+
+# Planificador de insights (INSIGHT_SCHEDULER_WINDOW, INSIGHT_SCHEDULER_CONCURRENCY,
+# INSIGHT_SCHEDULER_RATE_PER_MINUTE, INSIGHT_SCHEDULER_INTERVAL)
+DEFAULT_INSIGHT_SCHEDULER_WINDOW = "02:00-06:00"  # hora local; vacío = siempre
+DEFAULT_INSIGHT_SCHEDULER_CONCURRENCY = 2
+DEFAULT_INSIGHT_SCHEDULER_RATE_PER_MINUTE = 10  # llamadas al modelo
+DEFAULT_INSIGHT_SCHEDULER_INTERVAL = 600  # segundos entre pasadas
+
 # Estados válidos para hábitos
 VALID_POSITIVE_STATUSES = [
     'completado', 'hecho', 'sí', 'si', 'yes', 'done', 
@@ -148,6 +187,51 @@ SHEET_HEADERS = {
     'entries': ["user_id", "habit_name", "completed", "date", "notes", "rating"]
 }
 
+# Motor de almacenamiento (STORAGE_BACKEND / SQLITE_DB_PATH)
+DEFAULT_STORAGE_BACKEND = "sheets"  # sheets | sqlite
+DEFAULT_SQLITE_DB_PATH = "habitflow.db"
+
+# Réplica en memoria de las hojas (SHEETS_REPLICA_ENABLED / SHEETS_REPLICA_SYNC_INTERVAL)
+DEFAULT_REPLICA_ENABLED = "true"
+DEFAULT_REPLICA_SYNC_INTERVAL = 60  # segundos; 0 desactiva la resincronización
+
+# Buffer de escrituras de entradas (SHEETS_WRITE_BUFFER_ENABLED, SHEETS_WRITE_BATCH_SIZE,
+# SHEETS_WRITE_MAX_DELAY, SHEETS_WRITE_JOURNAL, SHEETS_WRITE_WAIT_TIMEOUT,
+# SHEETS_WRITE_MAX_RETRIES)
+DEFAULT_WRITE_BUFFER_ENABLED = "true"
+DEFAULT_WRITE_BATCH_SIZE = 50
+DEFAULT_WRITE_MAX_DELAY = 2.0  # segundos
+DEFAULT_WRITE_JOURNAL_PATH = "sheets_write_journal.jsonl"
+DEFAULT_WRITE_WAIT_TIMEOUT = 10.0  # segundos esperando durabilidad
+DEFAULT_WRITE_MAX_RETRIES = 5  # rechazos de un lote antes de dividirlo para aislar la fila mala
+
+# Cuota de Google Sheets por proceso (SHEETS_READS_PER_MINUTE, SHEETS_WRITES_PER_MINUTE,
+# SHEETS_MAX_THROTTLE_RETRIES, SHEETS_THROTTLE_BACKOFF_MAX)
+DEFAULT_SHEETS_READS_PER_MINUTE = 60  # cuota por defecto de Sheets por usuario
+DEFAULT_SHEETS_WRITES_PER_MINUTE = 60
+DEFAULT_SHEETS_MAX_THROTTLE_RETRIES = 5  # reintentos tras un 429
+DEFAULT_SHEETS_THROTTLE_BACKOFF_MAX = 64.0  # segundos de pausa máxima tras un 429
+
+# Pools de hilos para las llamadas bloqueantes (STORAGE_MAX_WORKERS / AI_MAX_WORKERS)
+DEFAULT_STORAGE_MAX_WORKERS = 16
+DEFAULT_AI_MAX_WORKERS = 4
+
+# Estadísticas incrementales por usuario (STATS_AGGREGATOR_ENABLED)
+DEFAULT_STATS_AGGREGATOR_ENABLED = "true"
+
+# Caché compartida entre workers de un mismo host (SHARED_CACHE_PATH / SHARED_CACHE_TTL)
+DEFAULT_SHARED_CACHE_PATH = ""  # vacío desactiva la caché compartida
+DEFAULT_SHARED_CACHE_TTL = 60  # segundos
+
+# Eventos del dashboard (PUSH_HEARTBEAT_INTERVAL, PUSH_VERSION_CHECK_INTERVAL, PUSH_DEBOUNCE)
+DEFAULT_PUSH_HEARTBEAT_INTERVAL = 15  # segundos entre comentarios keep-alive
+DEFAULT_PUSH_VERSION_CHECK_INTERVAL = 5  # segundos; 0 solo avisa de escrituras de este proceso
+DEFAULT_PUSH_DEBOUNCE = 0.5  # segundos juntando escrituras en ráfaga
+
+# Concurrencia del bot (BOT_MAX_CONCURRENT_UPDATES / BOT_MAX_CONCURRENT_AI)
+DEFAULT_BOT_MAX_CONCURRENT_UPDATES = 32
+DEFAULT_BOT_MAX_CONCURRENT_AI = 4
+
 # URLs útiles para documentación
 DOCS_URLS = {
     'telegram_bot': 'https://t.me/BotFather',
@@ -14,33 +14,6 @@ def format_datetime(dt: datetime) -> str:
     return dt.strftime("%d/%m/%Y %H:%M")
 
 
-def calculate_completion_rate(entries: List[Dict[str, Any]]) -> float:
-    """Calcular tasa de completación"""
-    if not entries:
-        return 0.0
-    
-    completed = len([e for e in entries if str(e.get('completed', '')).lower() == 'true'])
-    return completed / len(entries)
-
-
-def get_week_progress(entries: List[Dict[str, Any]]) -> Dict[str, int]:
-    """Obtener progreso por día de la semana"""
-    from collections import defaultdict
-    
-    week_progress = defaultdict(int)
-    
-    for entry in entries:
-        try:
-            date = datetime.fromisoformat(entry['date'])
-            day_name = date.strftime('%A')
-            if str(entry.get('completed', '')).lower() == 'true':
-                week_progress[day_name] += 1
-        except (ValueError, KeyError):
-            continue
-    
-    return dict(week_progress)
-
-
 def generate_streak_message(streak_days: int) -> str:
     """Generar mensaje motivacional basado en la racha"""
     if streak_days == 0:
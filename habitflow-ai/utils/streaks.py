@@ -0,0 +1,80 @@
+"""
+Cálculo de rachas sobre días naturales
+
+Una racha es una serie de días naturales consecutivos con al menos un
+hábito completado. La racha actual sigue viva si su último día es hoy o
+ayer (el día de hoy aún puede registrarse); los días futuros no cuentan
+para ella. Todas las rachas de la aplicación (por usuario, por hábito, en
+lote y en los agregados incrementales) salen de grouped_streaks.
+"""
+from datetime import date
+from typing import Dict, Optional, Tuple
+import numpy as np
+from services.entry_store import EntryColumns
+
+
+def _runs(groups: np.ndarray, days: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Series de días consecutivos sobre pares (grupo, día) únicos y ordenados
+
+    Devuelve grupo, último día y longitud de cada serie.
+    """
+    breaks = np.flatnonzero((np.diff(days) != 1) | (np.diff(groups) != 0))
+    starts = np.concatenate(([0], breaks + 1))
+    ends = np.concatenate((breaks, [days.size - 1]))
+    return groups[ends], days[ends], ends - starts + 1
+
+
+def grouped_streaks(
+    groups: np.ndarray,
+    days: np.ndarray,
+    completed: np.ndarray,
+    n_groups: int,
+    today: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Racha actual y más larga de cada grupo (usuario o hábito) en una pasada
+
+    groups, days y completed son arrays paralelos (un elemento por entrada);
+    groups va de 0 a n_groups - 1. Puede haber varios elementos para el
+    mismo día y no necesitan estar ordenados.
+    """
+    if today is None:
+        today = date.today().toordinal()
+    current = np.zeros(n_groups, dtype=np.int64)
+    longest = np.zeros(n_groups, dtype=np.int64)
+
+    done = np.asarray(completed, dtype=bool)
+    keys = np.unique(
+        np.asarray(groups, dtype=np.int64)[done] << 32 | np.asarray(days, dtype=np.int64)[done]
+    )
+    if not keys.size:
+        return current, longest
+    key_groups, key_days = keys >> 32, keys & 0xFFFFFFFF
+
+    run_groups, _, run_lengths = _runs(key_groups, key_days)
+    np.maximum.at(longest, run_groups, run_lengths)
+
+    # La racha actual solo considera días hasta hoy y sigue viva si acaba hoy o ayer
+    past = key_days <= today
+    if past.any():
+        run_groups, run_ends, run_lengths = _runs(key_groups[past], key_days[past])
+        last = np.flatnonzero(np.append(run_groups[1:] != run_groups[:-1], True))
+        alive = today - run_ends[last] <= 1
+        current[run_groups[last][alive]] = run_lengths[last][alive]
+    return current, longest
+
+
+def compute_streaks(days: np.ndarray, completed: np.ndarray, today: Optional[int] = None) -> Tuple[int, int]:
+    """Racha actual y racha más larga de un usuario a partir de ordinales de día"""
+    current, longest = grouped_streaks(np.zeros(len(days), dtype=np.int64), days, completed, 1, today)
+    return int(current[0]), int(longest[0])
+
+
+def habit_streaks(columns: EntryColumns, today: Optional[int] = None) -> Dict[str, Tuple[int, int]]:
+    """Racha actual y más larga de cada hábito con entradas"""
+    current, longest = grouped_streaks(
+        columns.habits, columns.days, columns.completed, len(columns.habit_names), today
+    )
+    return {
+        columns.habit_names[habit]: (int(current[habit]), int(longest[habit]))
+        for habit in np.flatnonzero(columns.habit_counts())
+    }